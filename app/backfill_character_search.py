@@ -0,0 +1,57 @@
+from collections import defaultdict
+
+from sqlalchemy import select, update
+
+from app.models.models import Character, Tag
+from app.database.session import SessionLocal
+from app.services.character_search import search_vector
+
+INDEX_BATCH_SIZE = 500 # 한 번에 색인할 캐릭터 수
+
+def index_batch(db, characters) -> int:
+  """
+  캐릭터들의 search_vector를 이름/설명/태그로 채우고 색인한 캐릭터 수를 반환합니다.
+  """
+  tag_names = defaultdict(list)
+  for char_idx, tag_name in db.execute(
+    select(Tag.char_idx, Tag.tag_name)
+    .where(Tag.char_idx.in_([character.char_idx for character in characters]), Tag.is_deleted == False)
+  ).all():
+    tag_names[char_idx].append(tag_name)
+
+  for character in characters:
+    db.execute(
+      update(Character)
+      .where(Character.char_idx == character.char_idx)
+      .values(search_vector=search_vector(character.char_name, character.char_description, tag_names[character.char_idx]))
+    )
+  return len(characters)
+
+def backfill():
+  db = SessionLocal()
+  try:
+    total = 0
+    last_char_idx = 0
+    while True:
+      # search_vector가 없는 캐릭터만 (검색 기능 추가 전에 만든 캐릭터)
+      characters = db.execute(
+        select(Character.char_idx, Character.char_name, Character.char_description)
+        .where(Character.char_idx > last_char_idx, Character.search_vector.is_(None))
+        .order_by(Character.char_idx)
+        .limit(INDEX_BATCH_SIZE)
+      ).all()
+      if not characters:
+        break
+      try:
+        total += index_batch(db, characters)
+        db.commit()
+      except Exception as e:
+        db.rollback()
+        print(f"Error indexing characters {characters[0].char_idx}-{characters[-1].char_idx}: {str(e)}")
+      last_char_idx = characters[-1].char_idx
+    print(f"Indexed {total} characters for search.")
+  finally:
+    db.close()
+
+if __name__ == "__main__":
+  backfill()
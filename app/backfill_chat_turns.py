@@ -0,0 +1,144 @@
+from sqlalchemy import select, func, insert, update, bindparam, text
+
+from app.models.models import ChatLog, ChatRoom, ChatSummary, ChatTurn
+from app.database.session import SessionLocal
+from app.services.chat_history import parse_log_turns
+from app.utils.common_function import ngram_text
+
+SEARCH_TEXT_BATCH_SIZE = 1000 # 검색 텍스트를 채울 때 한 번에 처리할 행 수
+
+def shift_room_seqs(db, chat_id: str, offset: int):
+  """
+  채팅방의 모든 대화 순번을 offset만큼 뒤로 밀고, 요약이 가리키는 순번도 같이 옮깁니다.
+  """
+  # 채팅방 행을 잠가서 같은 채팅방을 동시에 옮기지 않도록 함
+  db.execute(select(ChatRoom.chat_id).where(ChatRoom.chat_id == chat_id).with_for_update())
+  min_seq, max_seq = db.execute(
+    select(func.min(ChatTurn.seq), func.max(ChatTurn.seq)).where(ChatTurn.chat_id == chat_id)
+  ).one()
+  if min_seq is None or offset <= 0:
+    return
+  # (chat_id, seq) 유니크 인덱스는 행마다 검사하므로, 기존 순번과 겹치지 않는 위치로 한 번 옮긴 뒤 제자리로 옮김
+  parking = max_seq - min_seq + offset + 1
+  db.execute(update(ChatTurn).where(ChatTurn.chat_id == chat_id).values(seq=ChatTurn.seq + parking))
+  db.execute(update(ChatTurn).where(ChatTurn.chat_id == chat_id).values(seq=ChatTurn.seq - parking + offset))
+  db.execute(
+    update(ChatSummary)
+    .where(ChatSummary.chat_id == chat_id)
+    .values(summarized_seq=ChatSummary.summarized_seq + offset)
+  )
+
+def repair_room_seqs(db) -> int:
+  """
+  순번이 1보다 작은 대화가 있는 채팅방(이전 backfill이 기존 대화 앞쪽 번호를 쓴 경우)을 1부터 시작하도록 고치고
+  고친 채팅방 수를 반환합니다.
+  """
+  rooms = db.execute(
+    select(ChatTurn.chat_id, func.min(ChatTurn.seq))
+    .group_by(ChatTurn.chat_id)
+    .having(func.min(ChatTurn.seq) < 1)
+  ).all()
+  for chat_id, min_seq in rooms:
+    try:
+      shift_room_seqs(db, chat_id, 1 - min_seq)
+      db.commit()
+    except Exception as e:
+      db.rollback()
+      print(f"Error repairing seqs of {chat_id}: {str(e)}")
+  return len(rooms)
+
+def backfill_room(db, chat_id: str) -> int:
+  """
+  채팅방 하나의 chat_logs를 chat_turns로 옮기고 옮긴 대화 수를 반환합니다.
+  """
+  # 이미 옮긴 채팅방은 건너뜀 (옮겨온 대화만 session_id가 있음)
+  migrated = db.execute(
+    select(ChatTurn.turn_idx)
+    .where(ChatTurn.chat_id == chat_id, ChatTurn.session_id.isnot(None))
+    .limit(1)
+  ).first()
+  if migrated:
+    return 0
+
+  # 백엔드가 chat_turns에 직접 저장하기 시작한 뒤의 세션은 이미 chat_turns에 있으므로 그 이전 세션만 옮김
+  first_seq, first_created_at = db.execute(
+    select(func.min(ChatTurn.seq), func.min(ChatTurn.created_at)).where(ChatTurn.chat_id == chat_id)
+  ).one()
+  query = select(ChatLog.session_id, ChatLog.log).where(ChatLog.chat_id == chat_id)
+  if first_created_at is not None:
+    query = query.where(ChatLog.start_time < first_created_at)
+  logs = db.execute(query.order_by(ChatLog.start_time, ChatLog.session_id)).all()
+
+  rows = []
+  for log in logs:
+    for speaker, content in parse_log_turns(log.log):
+      rows.append({
+        "chat_id": chat_id,
+        "session_id": log.session_id,
+        "speaker": speaker,
+        "content": content,
+        "search_text": ngram_text(content),
+      })
+  if not rows:
+    return 0
+
+  # 옮겨온 대화는 1번부터, 기존 대화는 그 뒤로 밀어 둠 (순번은 항상 1 이상)
+  if first_seq is not None:
+    shift_room_seqs(db, chat_id, len(rows))
+  for seq, row in enumerate(rows, start=1):
+    row["seq"] = seq
+  db.execute(insert(ChatTurn), rows)
+  return len(rows)
+
+def backfill_search_text(db) -> int:
+  """
+  search_text가 비어 있는 대화(검색 기능 추가 전에 저장된 대화)를 채우고 채운 행 수를 반환합니다.
+  """
+  total = 0
+  while True:
+    turns = db.execute(
+      select(ChatTurn.turn_idx, ChatTurn.content)
+      .where(ChatTurn.search_text.is_(None))
+      .order_by(ChatTurn.turn_idx)
+      .limit(SEARCH_TEXT_BATCH_SIZE)
+    ).all()
+    if not turns:
+      return total
+    db.execute(
+      update(ChatTurn.__table__).where(ChatTurn.turn_idx == bindparam("_turn_idx")).values(search_text=bindparam("_search_text")),
+      [{"_turn_idx": turn.turn_idx, "_search_text": ngram_text(turn.content or "")} for turn in turns]
+    )
+    db.commit()
+    total += len(turns)
+
+def backfill():
+  db = SessionLocal()
+  try:
+    print(f"Repaired seqs of {repair_room_seqs(db)} rooms.")
+    chat_ids = db.execute(
+      select(ChatRoom.chat_id).where(ChatRoom.chat_id.in_(select(ChatLog.chat_id))).order_by(ChatRoom.chat_id)
+    ).scalars().all()
+    print(f"Backfilling chat turns for {len(chat_ids)} rooms...")
+
+    total = 0
+    for chat_id in chat_ids:
+      # 채팅방 단위로 커밋 (중간에 실패해도 다시 실행하면 남은 채팅방부터 이어서 처리)
+      try:
+        count = backfill_room(db, chat_id)
+        db.commit()
+        total += count
+      except Exception as e:
+        db.rollback()
+        print(f"Error backfilling {chat_id}: {str(e)}")
+    print(f"Backfilled {total} turns.")
+    print(f"Indexed {backfill_search_text(db)} turns for search.")
+
+    # 모든 순번이 1 이상이 되었으므로 기존 행까지 제약 조건 검증 (init_db에서 NOT VALID로 추가됨)
+    if db.get_bind().dialect.name == "postgresql":
+      db.execute(text("ALTER TABLE chat_turns VALIDATE CONSTRAINT ck_chat_turns_seq_positive"))
+      db.commit()
+  finally:
+    db.close()
+
+if __name__ == "__main__":
+  backfill()
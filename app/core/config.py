@@ -6,12 +6,94 @@ load_dotenv()  # .env 파일 로딩
 class Settings:
   CLIENT_DOMAIN: str = os.getenv("CLIENT_DOMAIN", "http://localhost:3000")
   WS_SERVER_DOMAIN = os.getenv("WS_SERVER_DOMAIN", "ws://localhost:8001")
+  # LangChain 서버가 여러 대일 때 콤마로 구분 (없으면 WS_SERVER_DOMAIN 하나만 사용)
+  WS_SERVER_DOMAINS = [domain.strip() for domain in os.getenv("WS_SERVER_DOMAINS", WS_SERVER_DOMAIN).split(",") if domain.strip()]
   DB_HOST = os.getenv("DB_HOST")
   DB_USER = os.getenv("DB_USER")
   DB_PASS = os.getenv("DB_PASS")
   DB_PORT = os.getenv("DB_PORT")
   DB_NAME = os.getenv("DB_NAME")
   DATABASE_URL=f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+  ASYNC_DATABASE_URL=f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}" # async 엔드포인트용
   SECRET_KEY = os.getenv("SECRET_KEY", "default_key")
 
+  # LangChain WebSocket 커넥션 풀 설정
+  LANGCHAIN_POOL_SIZE = int(os.getenv("LANGCHAIN_POOL_SIZE", "4")) # 유지할 커넥션 수
+  LANGCHAIN_MAX_IN_FLIGHT = int(os.getenv("LANGCHAIN_MAX_IN_FLIGHT", "8")) # 커넥션당 동시 요청 수 (서버가 응답에 request_id를 돌려줄 때만, 아니면 1)
+  LANGCHAIN_TIMEOUT = float(os.getenv("LANGCHAIN_TIMEOUT", "60")) # 응답 대기 시간(초)
+  LANGCHAIN_RECONNECT_RETRIES = int(os.getenv("LANGCHAIN_RECONNECT_RETRIES", "3")) # 재연결 시도 횟수
+  LANGCHAIN_BACKOFF_BASE = float(os.getenv("LANGCHAIN_BACKOFF_BASE", "0.5")) # 재연결 대기 시작값(초)
+  LANGCHAIN_BACKOFF_MAX = float(os.getenv("LANGCHAIN_BACKOFF_MAX", "10")) # 재연결 대기 최대값(초)
+  LANGCHAIN_PROTOCOL_VERSION = int(os.getenv("LANGCHAIN_PROTOCOL_VERSION", "1")) # 1: 매 요청 전체 페르소나 전송, 채팅방은 연결 주소의 ?room_id=로 구분 (기존 서버) / 2: 페르소나 등록 후 변경분만 전송, room_id는 요청 데이터로만 보내고 커넥션을 채팅방끼리 공유 (register_persona/history_delta와 요청 데이터의 room_id를 지원하는 서버에서만 2로 설정)
+  LANGCHAIN_REGISTRY_SIZE = int(os.getenv("LANGCHAIN_REGISTRY_SIZE", "10000")) # 등록된 페르소나/채팅방 추적 개수
+  LANGCHAIN_VNODES = int(os.getenv("LANGCHAIN_VNODES", "100")) # 해시 링의 서버당 가상 노드 수
+  LANGCHAIN_EJECT_FAILURES = int(os.getenv("LANGCHAIN_EJECT_FAILURES", "3")) # 연속 실패 시 제외 기준
+  LANGCHAIN_EJECT_SECONDS = float(os.getenv("LANGCHAIN_EJECT_SECONDS", "30")) # 제외 유지 시간(초)
+
+  # 채팅 기록 캐시 설정
+  CHAT_HISTORY_CACHE_ROOMS = int(os.getenv("CHAT_HISTORY_CACHE_ROOMS", "1000")) # 캐시할 최대 채팅방 수
+  CHAT_HISTORY_MAX_TURNS = int(os.getenv("CHAT_HISTORY_MAX_TURNS", "100")) # 채팅방당 보관할 최대 대화 수
+  CHAT_HISTORY_CACHE_TTL = float(os.getenv("CHAT_HISTORY_CACHE_TTL", "30")) # DB에서 다시 읽기까지의 시간(초) - 다른 워커가 쓴 대화 반영용
+
+  # 페르소나 캐시 설정
+  PERSONA_CACHE_SIZE = int(os.getenv("PERSONA_CACHE_SIZE", "1000")) # 캐시할 최대 프롬프트/채팅방 수
+  PERSONA_CACHE_TTL = float(os.getenv("PERSONA_CACHE_TTL", "300")) # 캐시 유효 시간(초) - 다른 워커의 변경 반영용
+
+  # LLM 호출 동시성 제한 설정
+  LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32")) # 워커당 동시 LLM 호출 수
+  LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "256")) # 대기 가능한 최대 요청 수 (초과 시 503)
+  LLM_ROOM_QUEUE_DEPTH = int(os.getenv("LLM_ROOM_QUEUE_DEPTH", "4")) # 채팅방당 처리+대기 요청 수 (초과 시 429)
+  LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30")) # 최대 대기 시간(초, 초과 시 503)
+
+  # 장기 기억(비슷한 예전 대화 검색) 및 프롬프트 크기 설정
+  MEMORY_EMBEDDING = os.getenv("MEMORY_EMBEDDING", "app.services.memory_index:hashing_embedding") # 임베딩 함수 ("모듈:함수")
+  MEMORY_EMBEDDING_DIM = int(os.getenv("MEMORY_EMBEDDING_DIM", "256")) # 임베딩 차원
+  MEMORY_CACHE_ROOMS = int(os.getenv("MEMORY_CACHE_ROOMS", "200")) # 인덱스를 유지할 최대 채팅방 수
+  MEMORY_MAX_TURNS = int(os.getenv("MEMORY_MAX_TURNS", "2000")) # 채팅방당 인덱싱할 최대 대화 수
+  MEMORY_MAX_BYTES = int(os.getenv("MEMORY_MAX_BYTES", str(64 * 1024 * 1024))) # 워커당 인덱스 행렬 전체 최대 크기(바이트)
+  MEMORY_TOP_K = int(os.getenv("MEMORY_TOP_K", "4")) # 함께 보낼 예전 대화 수
+  MEMORY_MIN_SCORE = float(os.getenv("MEMORY_MIN_SCORE", "0.3")) # 최소 유사도
+  PROMPT_RECENT_TURNS = int(os.getenv("PROMPT_RECENT_TURNS", "10")) # 항상 보내는 최근 대화 수
+  PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "2000")) # 최근 대화 + 예전 대화의 최대 토큰 수(추정치)
+
+  # 예전 대화 롤링 요약 설정
+  SUMMARY_BACKEND = os.getenv("SUMMARY_BACKEND", "local") # local: 로컬 요약만 사용, langchain: LangChain 서버에 요약 요청 (실패 시 로컬, 서버에 summarize 요청 지원 필요)
+  SUMMARY_BATCH_TURNS = int(os.getenv("SUMMARY_BATCH_TURNS", "20")) # 이만큼 쌓이면 요약에 접어 넣음
+  SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "500")) # 요약 최대 토큰 수(추정치)
+  SUMMARY_CACHE_ROOMS = int(os.getenv("SUMMARY_CACHE_ROOMS", "1000")) # 캐시할 최대 채팅방 요약 수
+
+  # 그룹 채팅 설정
+  GROUP_CHAT_MAX_CONCURRENCY = int(os.getenv("GROUP_CHAT_MAX_CONCURRENCY", "4")) # 그룹당 동시에 요청하는 캐릭터 수
+  GROUP_CHAT_TIMEOUT = float(os.getenv("GROUP_CHAT_TIMEOUT", "30")) # 캐릭터별 응답 대기 시간(초)
+
+  # 채팅 턴/호감도 쓰기 지연 설정
+  WRITE_BEHIND_INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL", "1")) # 저장 주기(초)
+  WRITE_BEHIND_MAX_ROWS = int(os.getenv("WRITE_BEHIND_MAX_ROWS", "500")) # 이만큼 쌓이면 주기 전에 저장
+  WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "5000")) # 이만큼 쌓이면 요청에서 직접 저장
+  WRITE_BEHIND_MAX_RETRIES = int(os.getenv("WRITE_BEHIND_MAX_RETRIES", "5")) # 순번 충돌로 저장하지 못한 채팅방 재시도 횟수
+  WRITE_BEHIND_DEAD_LETTER_PATH = os.getenv("WRITE_BEHIND_DEAD_LETTER_PATH", "app/logs/chat_turns_dead_letter.jsonl") # 재시도해도 저장하지 못한 대화 기록 파일
+
+  # 채팅 전송 Idempotency-Key 설정
+  IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "120")) # 완료된 결과 보관 시간(초)
+  IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000")) # 보관할 최대 결과 수
+
+  # 대화 검색 설정
+  SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "postgres") # postgres: tsvector GIN 인덱스, memory: 메모리 역색인
+  SEARCH_CACHE_ROOMS = int(os.getenv("SEARCH_CACHE_ROOMS", "200")) # memory 백엔드에서 색인을 유지할 최대 채팅방 수
+  SEARCH_CHARACTER_REFRESH = float(os.getenv("SEARCH_CHARACTER_REFRESH", "60")) # memory 백엔드에서 캐릭터 색인을 다시 만드는 주기(초)
+
+  # 캐릭터 카탈로그 응답 캐시 설정
+  RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024))) # 캐시할 응답 본문 최대 크기 합
+  RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "30")) # 다른 워커의 변경을 반영하기 위한 최대 보관 시간(초)
+
+  # 이미지 업로드 설정
+  UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024))) # 업로드 이미지 최대 크기
+  UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024))) # 한 번에 읽고 쓰는 크기
+
+  # 캐릭터 이미지 저장소 정리 설정
+  IMAGE_GC_ENABLED = os.getenv("IMAGE_GC_ENABLED", "false").lower() == "true" # 이 워커에서 정리 작업을 돌릴지 (한 워커에서만 켜거나 sweep_images 스크립트 사용)
+  IMAGE_GC_INTERVAL = float(os.getenv("IMAGE_GC_INTERVAL", "600")) # 참조가 없는 이미지/파일을 정리하는 주기(초)
+  IMAGE_GC_GRACE = float(os.getenv("IMAGE_GC_GRACE", "3600")) # 참조가 없어진 뒤 지우기까지 기다리는 시간(초)
+  IMAGE_GC_BATCH_SIZE = int(os.getenv("IMAGE_GC_BATCH_SIZE", "500")) # 한 트랜잭션에서 지울 이미지 수
+
 settings = Settings()
@@ -1,10 +1,16 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
 engine = create_engine(settings.DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# async 엔드포인트용 엔진 (asyncpg) - 이벤트 루프를 막지 않음
+async_engine = create_async_engine(settings.ASYNC_DATABASE_URL)
+# commit 이후에도 속성 접근 시 지연 로딩(동기 I/O)이 일어나지 않도록 expire_on_commit=False
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 # FastAPI Dependency
 def get_db():
   db = SessionLocal()
@@ -12,3 +18,8 @@ def get_db():
     yield db
   finally:
     db.close()
+
+# FastAPI Dependency (async 엔드포인트용)
+async def get_async_db():
+  async with AsyncSessionLocal() as db:
+    yield db
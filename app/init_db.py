@@ -1,9 +1,92 @@
+from sqlalchemy import text
+
 from app.models import models
 from app.database.session import engine
+from app.backfill_character_search import backfill as backfill_character_search
+from app.reconcile_follower_counts import reconcile
+
+# create_all은 이미 있는 테이블에 컬럼을 추가하지 않으므로, 나중에 추가된 컬럼을 따로 추가
+ADDED_COLUMNS = [
+  "ALTER TABLE chat_turns ADD COLUMN IF NOT EXISTS search_text TEXT",
+  "ALTER TABLE characters ADD COLUMN IF NOT EXISTS current_prompt_id INTEGER REFERENCES char_prompts(char_prompt_id)",
+  "ALTER TABLE characters ADD COLUMN IF NOT EXISTS follower_count INTEGER NOT NULL DEFAULT 0",
+  "ALTER TABLE characters ADD COLUMN IF NOT EXISTS search_vector TSVECTOR",
+  "ALTER TABLE images ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+  "ALTER TABLE images ADD COLUMN IF NOT EXISTS ref_count INTEGER NOT NULL DEFAULT 0",
+  "ALTER TABLE images ADD COLUMN IF NOT EXISTS released_at TIMESTAMP",
+]
+
+# 나중에 추가된 제약 조건 (NOT VALID: 새로 쓰는 행부터 검사, 기존 행은 backfill_chat_turns가 고친 뒤 검증)
+ADDED_CONSTRAINTS = [
+  """
+  DO $$ BEGIN
+    ALTER TABLE chat_turns ADD CONSTRAINT ck_chat_turns_seq_positive CHECK (seq >= 1) NOT VALID;
+  EXCEPTION WHEN duplicate_object THEN NULL;
+  END $$
+  """,
+]
+
+# 추가된 컬럼의 기존 데이터 채우기 (비어 있는 행만 채우므로 여러 번 실행해도 됨)
+BACKFILLS = [
+  # 캐릭터별 가장 최근 프롬프트를 현재 프롬프트로 지정
+  """
+  UPDATE characters SET current_prompt_id = latest.char_prompt_id
+  FROM (
+    SELECT DISTINCT ON (char_idx) char_idx, char_prompt_id
+    FROM char_prompts
+    ORDER BY char_idx, created_at DESC, char_prompt_id DESC
+  ) AS latest
+  WHERE characters.char_idx = latest.char_idx AND characters.current_prompt_id IS NULL
+  """,
+  # 이미지 참조 수를 image_mapping 기준으로 맞춤 (다른 행만 갱신)
+  """
+  UPDATE images SET ref_count = counts.refs
+  FROM (
+    SELECT images.img_idx, COUNT(image_mapping.img_idx) AS refs
+    FROM images LEFT JOIN image_mapping ON image_mapping.img_idx = images.img_idx
+    GROUP BY images.img_idx
+  ) AS counts
+  WHERE images.img_idx = counts.img_idx AND images.ref_count <> counts.refs
+  """,
+  # 참조가 없는 이미지는 지금부터 정리 유예 시작
+  """
+  UPDATE images SET released_at = CURRENT_TIMESTAMP
+  WHERE ref_count = 0 AND released_at IS NULL
+  """,
+]
 
 def init():
   print("Creating tables...")
   models.Base.metadata.create_all(bind=engine)
 
+  print("Adding columns...")
+  with engine.begin() as connection:
+    for statement in ADDED_COLUMNS:
+      connection.execute(text(statement))
+
+  print("Adding constraints...")
+  with engine.begin() as connection:
+    for statement in ADDED_CONSTRAINTS:
+      connection.execute(text(statement))
+
+  print("Backfilling columns...")
+  with engine.begin() as connection:
+    for statement in BACKFILLS:
+      connection.execute(text(statement))
+
+  # 팔로워 수 카운터를 friends 테이블 기준으로 맞춤 (추가된 follower_count 컬럼은 0으로 시작)
+  print("Reconciling follower counts...")
+  reconcile()
+
+  # 검색 색인이 없는 캐릭터 색인 (n-gram은 파이썬에서 만들어서 SQL만으로 채울 수 없음)
+  print("Indexing characters for search...")
+  backfill_character_search()
+
+  # create_all은 이미 있는 테이블의 인덱스를 만들지 않으므로, 나중에 추가된 인덱스를 따로 생성
+  print("Creating indexes...")
+  for table in models.Base.metadata.sorted_tables:
+    for index in table.indexes:
+      index.create(bind=engine, checkfirst=True)
+
 if __name__ == "__main__":
   init()
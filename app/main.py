@@ -4,7 +4,12 @@ from fastapi.staticfiles import StaticFiles
 
 import os
 
-from app.routers import character, chat, auth, user, stable_diffusion, tts, rank
+from app.routers import character, chat, group_chat, auth, user, stable_diffusion, tts, rank, stats
+from app.services.image_store import image_store
+from app.services.langchain_balancer import langchain_balancer
+from app.services.summarizer import chat_summarizer
+from app.services.upload import UploadLimitMiddleware
+from app.services.write_behind import write_behind
 
 app = FastAPI()
 
@@ -28,14 +33,32 @@ app.add_middleware(
   expose_headers=["*"]
 )
 
+# multipart 업로드 요청 크기 제한 (Starlette가 본문을 다 받기 전에 거절)
+app.add_middleware(UploadLimitMiddleware)
+
 # 라우터 등록
 app.include_router(character.router, tags=["Characters"])
 app.include_router(chat.router, tags=["Chat"])
+app.include_router(group_chat.router, tags=["GroupChat"])
 app.include_router(auth.router, tags=["Auth"])
 app.include_router(user.router, tags=["Users"])
 app.include_router(stable_diffusion.router, tags=["Stable_Diffusion"])
 app.include_router(tts.router, tags=["TTS"])
 app.include_router(rank.router, tags=["Rank"])
+app.include_router(stats.router, tags=["Stats"])
+
+# 시작 시 참조가 없는 캐릭터 이미지 정리 작업 시작 (IMAGE_GC_ENABLED인 워커만)
+@app.on_event("startup")
+async def startup():
+  image_store.start()
+
+# 종료 시 남은 대화 저장, 백그라운드 요약/이미지 정리 작업과 LangChain 커넥션 정리
+@app.on_event("shutdown")
+async def shutdown():
+  await write_behind.close()
+  await image_store.close()
+  await chat_summarizer.close()
+  await langchain_balancer.close()
 
 @app.get("/")
 async def root():
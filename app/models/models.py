@@ -1,5 +1,7 @@
-from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Integer, Boolean, JSON, ARRAY, text, Index, and_
+from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Integer, Boolean, JSON, ARRAY, text, Index, CheckConstraint, and_, func
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import deferred
 
 # SQLAlchemy 설정
 Base = declarative_base()
@@ -33,6 +35,31 @@ class Character(Base):
     nullable=False,
     default=lambda: {30: "stranger", 70: "friend", 100: "best friend"}
 )
+  # 활성 팔로워 수 (friends 테이블을 매번 세지 않도록 팔로우/언팔로우 때 함께 증감, reconcile_follower_counts로 보정)
+  follower_count = Column(Integer, server_default=text("0"), nullable=False)
+  # 현재(최신) 프롬프트 버전 - 새 프롬프트를 저장하는 트랜잭션에서 함께 변경 (char_prompts와 서로 참조하므로 use_alter)
+  current_prompt_id = Column(
+    Integer,
+    ForeignKey("char_prompts.char_prompt_id", use_alter=True, name="fk_characters_current_prompt_id"),
+    nullable=True
+  )
+  # 캐릭터 검색용 (이름/설명/태그 n-gram에 가중치를 붙인 tsvector, 캐릭터/태그를 저장할 때 함께 갱신)
+  # 목록 조회 때는 읽지 않도록 deferred
+  search_vector = deferred(Column(TSVECTOR, nullable=True))
+
+# 캐릭터 검색용 GIN 인덱스
+Index("ix_characters_search", Character.search_vector, postgresql_using="gin")
+
+# 캐릭터 카탈로그 키셋 페이지네이션용 (활성 캐릭터만, 정렬 키 + char_idx)
+Index("ix_characters_active_created", Character.created_at, Character.char_idx, postgresql_where=Character.is_active == True)
+Index("ix_characters_active_followers", Character.follower_count, Character.char_idx, postgresql_where=Character.is_active == True)
+Index(
+  "ix_characters_active_field_created",
+  Character.field_idx,
+  Character.created_at,
+  Character.char_idx,
+  postgresql_where=Character.is_active == True
+)
 
 # Scenario 테이블
 class Scenario(Base):
@@ -61,6 +88,10 @@ class Tag(Base):
   tag_description = Column(Text, nullable=True)
   is_deleted = Column(Boolean, server_default=text("false"), nullable=False)
 
+# 캐릭터 카탈로그 태그 필터용 (태그 이름 -> 캐릭터), 캐릭터별 태그 일괄 조회용
+Index("ix_tags_name_char", Tag.tag_name, Tag.char_idx, postgresql_where=Tag.is_deleted == False)
+Index("ix_tags_char", Tag.char_idx, postgresql_where=Tag.is_deleted == False)
+
 # Voice 테이블
 class Voice(Base):
   __tablename__ = "voice"
@@ -79,12 +110,54 @@ class ChatLog(Base):
   start_time = Column(DateTime, nullable=False)
   end_time = Column(DateTime, server_default=text("CURRENT_TIMESTAMP"), nullable=False)
 
+# 채팅 로그 키셋 페이지네이션용 인덱스 (chat_id 범위에서 start_time, session_id 순서)
+Index("ix_chat_logs_chat_start_session", ChatLog.chat_id, ChatLog.start_time, ChatLog.session_id)
+
+# ChatTurns 테이블 (대화 한 건당 한 행)
+class ChatTurn(Base):
+  __tablename__ = "chat_turns"
+
+  turn_idx = Column(Integer, primary_key=True, autoincrement=True)
+  chat_id = Column(String(50), ForeignKey("chat_rooms.chat_id"), nullable=False)
+  session_id = Column(String(50), nullable=True) # chat_logs에서 옮겨온 대화만 세션 ID가 있음
+  seq = Column(Integer, nullable=False) # 채팅방 안에서의 대화 순번
+  speaker = Column(String(20), nullable=True) # user / chatbot (알 수 없으면 NULL)
+  content = Column(Text, nullable=False)
+  search_text = Column(Text, nullable=True) # 검색용 n-gram 토큰 (공백 구분)
+  created_at = Column(DateTime, server_default=text("CURRENT_TIMESTAMP"), nullable=False)
+
+# 최근 N개 대화 조회용 인덱스 (chat_id 범위에서 seq 역순 스캔), 순번 중복 방지
+Index("uq_chat_turns_chat_seq", ChatTurn.chat_id, ChatTurn.seq, unique=True)
+# 순번은 1부터 (캐시/요약/검색이 last_seq=0을 "대화 없음"으로 사용)
+ChatTurn.__table__.append_constraint(CheckConstraint("seq >= 1", name="ck_chat_turns_seq_positive"))
+
+# 대화 전문 검색용 GIN 인덱스 (검색 쿼리도 같은 표현식을 사용해야 인덱스를 탐)
+CHAT_SEARCH_VECTOR = func.to_tsvector(text("'simple'::regconfig"), ChatTurn.search_text)
+Index("ix_chat_turns_search", CHAT_SEARCH_VECTOR, postgresql_using="gin")
+
+# ChatSummaries 테이블 (채팅방별 예전 대화 요약)
+class ChatSummary(Base):
+  __tablename__ = "chat_summaries"
+
+  chat_id = Column(String(50), ForeignKey("chat_rooms.chat_id"), primary_key=True)
+  summary = Column(Text, nullable=False)
+  summarized_seq = Column(Integer, nullable=False) # 이 순번까지의 대화가 요약에 반영됨
+  version = Column(Integer, server_default=text("1"), nullable=False) # 요약을 갱신할 때마다 증가
+  updated_at = Column(DateTime, server_default=text("CURRENT_TIMESTAMP"), nullable=False)
+
 # Images 테이블
 class Image(Base):
   __tablename__ = "images"
 
   img_idx = Column(Integer, primary_key=True, autoincrement=True)
   file_path = Column(String(255), nullable=False)
+  content_hash = Column(String(64), nullable=True) # 파일 내용의 sha256 (같은 이미지는 행 하나를 같이 씀, 이전에 저장한 이미지는 NULL)
+  ref_count = Column(Integer, server_default=text("0"), nullable=False) # 이 이미지를 가리키는 image_mapping 행 수
+  released_at = Column(DateTime, nullable=True) # ref_count가 0이 된 시각 (정리 유예 기준)
+
+Index("uq_images_content_hash", Image.content_hash, unique=True, postgresql_where=Image.content_hash.isnot(None))
+# 참조가 없는 이미지 정리용
+Index("ix_images_released", Image.released_at, postgresql_where=Image.ref_count == 0)
 
 # 캐릭터 이미지 생성 프롬프트
 class ImagePrompt(Base):
@@ -188,3 +261,18 @@ class GroupChatCharacter(Base):
   group_chars_idx = Column(Integer, primary_key=True, autoincrement=True)
   group_chat_idx = Column(Integer, ForeignKey("group_chats.group_chat_idx"), nullable=False)
   char_idx = Column(Integer, ForeignKey("characters.char_idx"), nullable=False)
+
+# GroupChatTurns 테이블 (그룹 대화 한 건당 한 행)
+class GroupChatTurn(Base):
+  __tablename__ = "group_chat_turns"
+
+  turn_idx = Column(Integer, primary_key=True, autoincrement=True)
+  group_chat_idx = Column(Integer, ForeignKey("group_chats.group_chat_idx"), nullable=False)
+  seq = Column(Integer, nullable=False) # 그룹 안에서의 대화 순번
+  char_idx = Column(Integer, ForeignKey("characters.char_idx"), nullable=True) # 사용자 메시지는 NULL
+  speaker = Column(String(50), nullable=False) # user / 캐릭터 이름 (프롬프트에 쓰는 화자 표시)
+  content = Column(Text, nullable=False)
+  created_at = Column(DateTime, server_default=text("CURRENT_TIMESTAMP"), nullable=False)
+
+# 최근 N개 대화 조회용 인덱스, 순번 중복 방지
+Index("uq_group_chat_turns_group_seq", GroupChatTurn.group_chat_idx, GroupChatTurn.seq, unique=True)
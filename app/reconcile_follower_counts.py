@@ -0,0 +1,57 @@
+from sqlalchemy import select, update
+
+from app.models.models import Character
+from app.database.session import SessionLocal
+from app.services.character_loader import load_follower_counts
+
+RECONCILE_BATCH_SIZE = 500 # 한 트랜잭션에서 보정할 캐릭터 수
+
+def reconcile_batch(db, char_idxs) -> int:
+  """
+  캐릭터들의 follower_count를 friends 테이블 집계와 맞추고 보정한 캐릭터 수를 반환합니다.
+  """
+  # 캐릭터 행을 먼저 잠가서 집계하는 동안 팔로우/언팔로우의 증감이 끼어들지 않도록 함
+  stored = dict(db.execute(
+    select(Character.char_idx, Character.follower_count)
+    .where(Character.char_idx.in_(char_idxs))
+    .with_for_update()
+  ).all())
+  counts = load_follower_counts(db, char_idxs)
+
+  drifted = [
+    {"char_idx": char_idx, "follower_count": count}
+    for char_idx, count in counts.items() if stored.get(char_idx) != count
+  ]
+  if drifted:
+    # 기본 키 기준 ORM 일괄 UPDATE (executemany)
+    db.execute(update(Character), drifted)
+  return len(drifted)
+
+def reconcile():
+  db = SessionLocal()
+  try:
+    total = 0
+    last_char_idx = 0
+    while True:
+      char_idxs = db.execute(
+        select(Character.char_idx)
+        .where(Character.char_idx > last_char_idx)
+        .order_by(Character.char_idx)
+        .limit(RECONCILE_BATCH_SIZE)
+      ).scalars().all()
+      if not char_idxs:
+        break
+      # 배치 단위로 커밋 (행 잠금을 오래 잡지 않도록)
+      try:
+        total += reconcile_batch(db, char_idxs)
+        db.commit()
+      except Exception as e:
+        db.rollback()
+        print(f"Error reconciling characters {char_idxs[0]}-{char_idxs[-1]}: {str(e)}")
+      last_char_idx = char_idxs[-1]
+    print(f"Reconciled follower counts for {total} characters.")
+  finally:
+    db.close()
+
+if __name__ == "__main__":
+  reconcile()
@@ -3,13 +3,12 @@ from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from jose import jwt, JWTError
 from fastapi.security import OAuth2PasswordBearer
 from datetime import datetime, timedelta
-import os
-import shutil
 
 from app.core.config import Settings
 from app.database.session import get_db
 from app.models.models import User
 from app.schemas.user import SignInRequest, SignupRequest
+from app.services.upload import upload_service
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="signin")
 SECRET_KEY = Settings.SECRET_KEY
@@ -102,13 +101,8 @@ def upload_profile_img(
   db: Session = Depends(get_db),
 ):
   try:
-    # 업로드 디렉토리 생성
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-    # 파일 저장 경로 설정
-    file_location = f"{UPLOAD_DIR}/{file.filename}"
-    with open(file_location, "wb") as f:
-      shutil.copyfileobj(file.file, f)
+    # 파일 저장 (청크 단위로 임시 파일에 쓴 뒤 rename, 크기 제한만 확인 - 형식은 이전처럼 확인하지 않음)
+    file_location = upload_service.save_image_sync(file, UPLOAD_DIR, file.filename, check_type=False)
 
     # 사용자 조회
     user = db.query(User).filter(User.user_id == user_id).first()
@@ -122,6 +116,8 @@ def upload_profile_img(
 
     # 성공 메시지 반환
     return {"message": f"사용자의 프로필 사진이 저장되었습니다.", "profile_img": file_location}
+  except HTTPException:
+    raise
   except Exception as e:
     print(f"파일 업로드 중 오류: {e}")  # 디버깅용 로그
     raise HTTPException(status_code=500, detail=f"파일 업로드 실패: {str(e)}")
\ No newline at end of file
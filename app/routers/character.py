@@ -1,21 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request, Form
-from sqlalchemy import select
-from sqlalchemy.sql import func
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request, Response, Form, Query
+from sqlalchemy import select, tuple_
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 from typing import List, Optional
 import os
-import uuid
 import json
 
-from app.database.session import get_db
+from app.database.session import get_db, get_async_db
 from app.schemas.character import CharacterResponseSchema, CreateCharacterSchema
 from app.models.models import Character, CharacterPrompt, ChatRoom, Image, ImageMapping, Tag, Friend, Field as DBField
-from app.utils.common_function import clean_json_string
+from app.services.character_loader import CharacterExtras, select_current_prompt
+from app.services.character_search import character_search, search_vector
+from app.services.image_store import image_store
+from app.services.persona_cache import persona_cache
+from app.services.response_cache import catalog_cache
+from app.utils.common_function import clean_json_string, encode_cursor, decode_cursor
 
 router = APIRouter()
 
-UPLOAD_DIR = "app/uploads/characters/"  # 캐릭터 이미지 파일 저장 경로
+CATALOG_PAGE_SIZE = 20 # 캐릭터 카탈로그 기본 페이지 크기
+CATALOG_MAX_PAGE_SIZE = 100 # 캐릭터 카탈로그 최대 페이지 크기
+
+# 카탈로그 정렬 키 (정렬 기준 컬럼, 커서 값 변환 함수) - 두 번째 키는 항상 char_idx
+CATALOG_SORTS = {
+  "new": (Character.created_at, datetime.fromisoformat), # 최신 생성 순
+  "popular": (Character.follower_count, int), # 팔로워 많은 순
+}
 
 # ------------------------------POST METHOD------------------------------
 # 캐릭터 생성 API
@@ -23,10 +34,10 @@ UPLOAD_DIR = "app/uploads/characters/"  # 캐릭터 이미지 파일 저장 경
 async def create_character(
   character_image: UploadFile = File(...),
   character_data: str = Form(...),
-  db: Session = Depends(get_db)
+  db: AsyncSession = Depends(get_async_db)
 ):
   try:
-    with db.begin():
+    async with db.begin():
       print("Received character data:", character_data)  # 디버깅용 로그
       character_dict = json.loads(character_data)
       character = CreateCharacterSchema(**character_dict)
@@ -38,10 +49,16 @@ async def create_character(
         voice_idx=character.voice_idx,
         char_name=character.char_name,
         char_description=character.char_description,
-        nicknames=json.dumps(character.nicknames)
+        nicknames=json.dumps(character.nicknames),
+        search_vector=search_vector(
+          character.char_name,
+          character.char_description,
+          [tag["tag_name"] for tag in character.tags or []]
+        )
       )
       db.add(new_character)
-      db.flush()  # `new_character.char_idx`를 사용하기 위해 flush 실행
+      await db.flush()  # `new_character.char_idx`를 사용하기 위해 flush 실행
+      await db.refresh(new_character, ["created_at"])  # 응답에 쓰는 서버 기본값 로딩
       
       # 캐릭터 프롬프트 생성
       new_prompt = CharacterPrompt(
@@ -57,28 +74,11 @@ async def create_character(
       )
 
       db.add(new_prompt)
+      await db.flush()  # `new_prompt.char_prompt_id`를 현재 프롬프트로 지정하기 위해 flush 실행
+      new_character.current_prompt_id = new_prompt.char_prompt_id
 
-      # 이미지 파일 저장
-      file_extension = character_image.filename.split(".")[-1]
-      timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
-      unique_filename = f"{timestamp}_{uuid.uuid4().hex}.{file_extension}"
-      file_path = os.path.join(UPLOAD_DIR, unique_filename)
-
-      # 파일 저장
-      with open(file_path, "wb") as f:
-        f.write(await character_image.read())
-
-        # 이미지 테이블에 저장
-      new_image = Image(file_path=file_path)
-      db.add(new_image)
-      db.flush()  # `new_image.img_idx` 사용하기 위해 flush 실행
-      
-      # 이미지와 캐릭터 매핑
-      image_mapping = ImageMapping(
-        char_idx=new_character.char_idx,
-        img_idx=new_image.img_idx
-      )
-      db.add(image_mapping)
+      # 이미지 저장 후 캐릭터와 매핑 (같은 내용의 이미지가 이미 있으면 그 파일과 행을 같이 씀)
+      file_path = await image_store.attach(db, new_character.char_idx, character_image)
 
       if character.tags:
         for tag in character.tags:
@@ -90,7 +90,9 @@ async def create_character(
           db.add(new_tag)
 
     # 트랜잭션 커밋 (with 블록 종료 시 자동으로 커밋됨, 명시적으로 작성)
-    db.commit()
+    await db.commit()
+    character_search.invalidate()
+    catalog_cache.bump()
 
     return CharacterResponseSchema(
         char_idx=new_character.char_idx,
@@ -107,9 +109,12 @@ async def create_character(
         ] if new_prompt.example_dialogues else None,
         character_image=file_path
     )
+  except HTTPException:
+    await db.rollback()
+    raise
   except Exception as e:
     print(f"Error in create_character: {str(e)}")
-    db.rollback() # 트랜잭션 롤백
+    await db.rollback() # 트랜잭션 롤백
     raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -129,43 +134,28 @@ async def create_character(
 # ------------------------------GET METHOD------------------------------
 # 모든 캐릭터 목록 조회 API
 @router.get("/api/characters", response_model=List[dict])
-def get_characters(db: Session = Depends(get_db), request: Request = None):
-  # 각 캐릭터에 대한 최신 char_prompt_id를 가져오는 subquery
-  subquery = (
-    select(
-      CharacterPrompt.char_idx,
-      func.max(CharacterPrompt.created_at).label("latest_created_at")
-    )
-    .group_by(CharacterPrompt.char_idx)
-    .subquery()
-  )
+def get_characters(request: Request, db: Session = Depends(get_db)):
+  # 캐릭터가 바뀌기 전까지 만들어 둔 응답을 재사용 (If-None-Match가 ETag와 같으면 304)
+  return catalog_cache.respond(request, lambda headers: list_characters(db, request))
 
-  # 캐릭터를 최신 프롬프트와 join하고 이미지 정보를 포함하는 query
+# 모든 캐릭터 목록 (get_characters 응답 데이터)
+def list_characters(db: Session, request: Request):
+  # 캐릭터를 현재 프롬프트와 join하고 이미지 정보를 포함하는 query
   query = (
-    db.query(Character, CharacterPrompt, Image.file_path)
-    .join(subquery, subquery.c.char_idx == Character.char_idx)
-    .join(
-      CharacterPrompt,
-      (CharacterPrompt.char_idx == subquery.c.char_idx) &
-      (CharacterPrompt.created_at == subquery.c.latest_created_at)
-    )
+    select_current_prompt(Image.file_path)
     .outerjoin(ImageMapping, ImageMapping.char_idx == Character.char_idx)
     .outerjoin(Image, Image.img_idx == ImageMapping.img_idx)
-    .filter(Character.is_active == True)  # is_active가 True인 캐릭터만 가져오기
+    .where(Character.is_active == True)  # is_active가 True인 캐릭터만 가져오기
   )
 
-  characters_info = query.all()
+  characters_info = db.execute(query).all()
   base_url = f"{request.base_url.scheme}://{request.base_url.netloc}" if request else ""
   results = []
 
+  # 태그는 목록 전체를 한 번에 조회
+  extras = CharacterExtras(db, [char.char_idx for char, _, _ in characters_info])
+
   for char, prompt, image_path in characters_info:
-    # 팔로워 수 구하기
-    follower_count = (
-      db.query(func.count(Friend.friend_idx))
-      .filter(Friend.char_idx == char.char_idx, Friend.is_active == True)
-      .scalar()
-    )
-    print(f"Character: {char.char_name}, field_idx: {char.field_idx}, type: {type(char.field_idx)}")
     if prompt:
       example_dialogues = [json.loads(clean_json_string(dialogue)) if dialogue else {} for dialogue in prompt.example_dialogues] if prompt.example_dialogues else []
       nicknames = json.loads(char.nicknames) if char.nicknames else {'30': '', '70': '', '100': ''}
@@ -177,13 +167,6 @@ def get_characters(db: Session = Depends(get_db), request: Request = None):
     # 이미지 URL 생성
     image_url = f"{base_url}/static/{os.path.basename(image_path)}" if image_path else None
 
-    tags = db.query(Tag).filter(
-      Tag.char_idx == char.char_idx,
-      Tag.is_deleted == False
-    ).all()
-    
-    tag_list = [{"tag_name": tag.tag_name, "tag_description": tag.tag_description} for tag in tags]
-
     results.append({
       "char_idx": char.char_idx,
       "char_name": char.char_name,
@@ -195,34 +178,157 @@ def get_characters(db: Session = Depends(get_db), request: Request = None):
       "character_background": prompt.character_background if prompt else "",
       "character_speech_style": prompt.character_speech_style if prompt else "",
       "example_dialogues": example_dialogues,
-      "tags": tag_list,
+      "tags": extras.tag_list(char.char_idx),
       "character_image": image_url,
       "field_idx": char.field_idx,
-      "follower_count": follower_count
+      "follower_count": char.follower_count
     })
 
   return results
 
 
+# 커서 문자열을 (정렬 키, char_idx)로 변환
+def parse_catalog_cursor(cursor: str, sort: str):
+  try:
+    sort_value, char_idx = decode_cursor(cursor)
+    return CATALOG_SORTS[sort][1](sort_value), int(char_idx)
+  except (ValueError, TypeError):
+    raise HTTPException(status_code=400, detail="잘못된 커서입니다.")
+
+# 캐릭터 카탈로그 조회 API ({char_idx} 경로보다 먼저 등록해야 함)
+@router.get("/api/characters/catalog", response_model=List[dict])
+def get_character_catalog(
+  request: Request,
+  fields: Optional[List[int]] = Query(default=None),
+  tags: Optional[List[str]] = Query(default=None),
+  sort: str = Query(default="new", pattern="^(new|popular)$"),
+  limit: int = Query(default=CATALOG_PAGE_SIZE, ge=1, le=CATALOG_MAX_PAGE_SIZE),
+  cursor: Optional[str] = None,
+  db: Session = Depends(get_db)
+):
+  """
+  캐릭터 카드 목록을 페이지 단위로 반환합니다. (프롬프트 본문은 포함하지 않음)
+  - fields: 필드 필터 (여러 개면 하나라도 해당하는 캐릭터)
+  - tags: 태그 이름 필터 (여러 개면 하나라도 가진 캐릭터)
+  - sort: new(최신 생성 순) / popular(팔로워 많은 순)
+  (정렬 키, char_idx) 키셋 페이지네이션을 사용하며, 다음 페이지 커서는 X-Next-Cursor 헤더로 반환합니다.
+  응답에 ETag가 있으며, If-None-Match가 같으면 304를 반환합니다.
+  """
+  return catalog_cache.respond(
+    request,
+    lambda headers: list_catalog(db, request, headers, fields, tags, sort, limit, cursor)
+  )
+
+# 캐릭터 카탈로그 한 페이지 (get_character_catalog 응답 데이터, 다음 페이지 커서는 headers에 추가)
+def list_catalog(db: Session, request: Request, headers: dict, fields, tags, sort: str, limit: int, cursor: Optional[str]):
+  sort_column = CATALOG_SORTS[sort][0]
+  query = (
+    select(Character, Image.file_path)
+    .outerjoin(ImageMapping, (ImageMapping.char_idx == Character.char_idx) & (ImageMapping.is_active == True))
+    .outerjoin(Image, Image.img_idx == ImageMapping.img_idx)
+    .where(Character.is_active == True)
+  )
+  if fields:
+    query = query.where(Character.field_idx.in_(fields))
+  if tags:
+    query = query.where(Character.char_idx.in_(
+      select(Tag.char_idx).where(Tag.tag_name.in_(tags), Tag.is_deleted == False)
+    ))
+  if cursor:
+    query = query.where(tuple_(sort_column, Character.char_idx) < parse_catalog_cursor(cursor, sort))
+
+  # limit + 1개를 읽어 다음 페이지 존재 여부 확인
+  rows = db.execute(query.order_by(sort_column.desc(), Character.char_idx.desc()).limit(limit + 1)).all()
+  page = rows[:limit]
+  if len(rows) > limit:
+    last = page[-1].Character
+    headers["X-Next-Cursor"] = encode_cursor(getattr(last, sort_column.key), last.char_idx)
+
+  base_url = f"{request.base_url.scheme}://{request.base_url.netloc}" if request else ""
+  extras = CharacterExtras(db, [char.char_idx for char, _ in page])
+  return [
+    {
+      "char_idx": char.char_idx,
+      "character_owner": char.character_owner,
+      "char_name": char.char_name,
+      "char_description": char.char_description,
+      "created_at": char.created_at.isoformat(),
+      "field_idx": char.field_idx,
+      "tags": extras.tag_list(char.char_idx),
+      "character_image": f"{base_url}/static/{os.path.basename(image_path)}" if image_path else None,
+      "follower_count": char.follower_count,
+    }
+    for char, image_path in page
+  ]
+
+
+# 검색 커서 문자열을 (점수, char_idx)로 변환
+def parse_search_cursor(cursor: str):
+  try:
+    rank, char_idx = decode_cursor(cursor)
+    return float(rank), int(char_idx)
+  except (ValueError, TypeError):
+    raise HTTPException(status_code=400, detail="잘못된 커서입니다.")
+
+# 캐릭터 이름/설명/태그로 검색해서 목록을 반환하는 API ({char_idx} 경로보다 먼저 등록해야 함)
+@router.get("/api/characters/search", response_model=list)
+def search_characters(
+  query: str,
+  response: Response,
+  limit: int = Query(default=CATALOG_PAGE_SIZE, ge=1, le=CATALOG_MAX_PAGE_SIZE),
+  cursor: Optional[str] = None,
+  db: Session = Depends(get_db)
+):
+  """
+  활성 캐릭터를 관련도(점수) 순으로 반환합니다. 이름에서 찾은 검색어는 설명/태그보다 가중치가 높지만,
+  순서는 점수로만 정하므로 설명/태그에 검색어가 많은 캐릭터가 이름에서 찾은 캐릭터보다 앞에 올 수도 있습니다.
+  다음 페이지는 X-Next-Cursor 헤더 값을 cursor로 전달합니다.
+  """
+  after = parse_search_cursor(cursor) if cursor else None
+  results = character_search.search(db, query, limit, after)
+
+  if not results and not cursor:
+    raise HTTPException(status_code=404, detail="검색 결과가 없습니다.")
+  if len(results) == limit:
+    response.headers["X-Next-Cursor"] = encode_cursor(results[-1]["rank"], results[-1]["id"])
+  return results
+
+# 캐릭터 이름 자동완성 API
+@router.get("/api/characters/autocomplete", response_model=list)
+def autocomplete_characters(
+  query: str,
+  limit: int = Query(default=10, ge=1, le=CATALOG_MAX_PAGE_SIZE),
+  db: Session = Depends(get_db)
+):
+  """
+  입력 중인 검색어로 캐릭터 이름을 찾습니다. 마지막 글자는 접두어로 찾아서 입력하는 도중에도 결과가 나옵니다.
+  """
+  return [
+    {"id": result["id"], "name": result["name"]}
+    for result in character_search.autocomplete(db, query, limit)
+  ]
+
+
 # 특정 캐릭터 조회
 @router.get("/api/characters/{char_idx}", response_model=dict)
-def get_character_by_id(char_idx: int, db: Session = Depends(get_db), request: Request = None):
-    character_data = (
-        db.query(Character, CharacterPrompt, Image.file_path, DBField.field_category)
-        .join(CharacterPrompt, Character.char_idx == CharacterPrompt.char_idx)
+def get_character_by_id(char_idx: int, request: Request, db: Session = Depends(get_db)):
+    return catalog_cache.respond(request, lambda headers: load_character(db, request, char_idx))
+
+# 특정 캐릭터 정보 (get_character_by_id 응답 데이터)
+def load_character(db: Session, request: Request, char_idx: int):
+    character_data = db.execute(
+        select_current_prompt(Image.file_path, DBField.field_category)
         .outerjoin(ImageMapping, ImageMapping.char_idx == Character.char_idx)
         .outerjoin(Image, Image.img_idx == ImageMapping.img_idx)
         .join(DBField, DBField.field_idx == Character.field_idx)
-        .filter(Character.char_idx == char_idx, Character.is_active == True)
-        .first()
-    )
-
-    follower_count = db.query(Friend).filter(Friend.char_idx == char_idx, Friend.is_active == True).count()
+        .where(Character.char_idx == char_idx, Character.is_active == True)
+    ).first()
 
     if not character_data:
         raise HTTPException(status_code=404, detail="해당 캐릭터를 찾을 수 없습니다.")
     
     character, prompt, image_path, field_category = character_data
+    extras = CharacterExtras(db, [character.char_idx])
 
     # 이미지 URL 생성
     base_url = f"{request.base_url.scheme}://{request.base_url.netloc}" if request else ""
@@ -241,51 +347,33 @@ def get_character_by_id(char_idx: int, db: Session = Depends(get_db), request: R
         "character_background": prompt.character_background,
         "character_speech_style": prompt.character_speech_style,
         "example_dialogues": prompt.example_dialogues,
-        "tags": [
-            {"tag_name": tag.tag_name, "tag_description": tag.tag_description}
-            for tag in db.query(Tag).filter(Tag.char_idx == character.char_idx, Tag.is_deleted == False).all()
-        ],
+        "tags": extras.tag_list(character.char_idx),
         "character_image": image_url,
         "field_idx": character.field_idx,  # 필드 카테고리 추가
         "nicknames": nicknames,  # 호칭 정보 추가
-        "follower_count": follower_count
+        "follower_count": character.follower_count
     }
 
 
 # 특정 유저가 생성한 캐릭터 목록 조회 API
 @router.get("/api/characters/user/{user_id}", response_model=List[dict])
 def get_characters(user_id: int, db: Session = Depends(get_db), request: Request = None):
-  # 각 캐릭터에 대한 최신 char_prompt_id를 가져오는 subquery
-  subquery = (
-    select(
-      CharacterPrompt.char_idx,
-      func.max(CharacterPrompt.created_at).label("latest_created_at")
-    )
-    .group_by(CharacterPrompt.char_idx)
-    .subquery()
-  )
-
-  # 캐릭터를 최신 프롬프트와 join하고 이미지 정보를 포함하는 query
+  # 캐릭터를 현재 프롬프트와 join하고 이미지 정보를 포함하는 query
   query = (
-    db.query(Character, CharacterPrompt, Image.file_path)
-    .join(subquery, subquery.c.char_idx == Character.char_idx)
-    .join(
-      CharacterPrompt,
-      (CharacterPrompt.char_idx == subquery.c.char_idx) &
-      (CharacterPrompt.created_at == subquery.c.latest_created_at)
-    )
+    select_current_prompt(Image.file_path)
     .outerjoin(ImageMapping, ImageMapping.char_idx == Character.char_idx)
     .outerjoin(Image, Image.img_idx == ImageMapping.img_idx)
-    .filter(
+    .where(
       Character.is_active == True,
       Character.character_owner == user_id
     )
   )
 
-  characters_info = query.all()
+  characters_info = db.execute(query).all()
 
   base_url = f"{request.base_url.scheme}://{request.base_url.netloc}" if request else ""
   results = []
+  extras = CharacterExtras(db, [char.char_idx for char, _, _ in characters_info])
   for char, prompt, image_path in characters_info:
     if prompt:
       example_dialogues = [json.loads(clean_json_string(dialogue)) if dialogue else {} for dialogue in prompt.example_dialogues] if prompt.example_dialogues else []
@@ -309,7 +397,9 @@ def get_characters(user_id: int, db: Session = Depends(get_db), request: Request
       "character_background": prompt.character_background if prompt else "",
       "character_speech_style": prompt.character_speech_style if prompt else "",
       "example_dialogues": example_dialogues,
+      "tags": extras.tag_list(char.char_idx),
       "character_image": image_url,
+      "follower_count": char.follower_count,
     })
   return results
 
@@ -360,58 +450,26 @@ def get_chat_room_info(room_id: str, db: Session = Depends(get_db)):
     raise HTTPException(status_code=500, detail=f"채팅방 정보를 가져오는 중 오류가 발생했습니다: {str(e)}")
 
 
-# 캐릭터 이름과 설명으로 검색해서 목록을 반환하는 API
-@router.get("/api/characters/search", response_model=list)
-def search_characters(query: str, db: Session = Depends(get_db)):
-
-  characters = db.query(Character).filter(
-    (Character.char_name.like(f"%{query}%")) | 
-    (Character.char_description.like(f"%{query}%"))
-  ).all()
-
-  if not characters:
-    raise HTTPException(status_code=404, detail="검색 결과가 없습니다.")
-
-  return [
-    {"id": char.char_idx, "name": char.char_name, "description": char.char_description}
-    for char in characters
-  ]
-
-
 # 특정 유저가 팔로우한 캐릭터 목록 반환하는 API
 @router.get("/api/friends/{user_idx}/characters", response_model=List[dict])
 def get_followed_characters(user_idx: int, db: Session = Depends(get_db), request: Request = None):
-  subquery = (
-    select(
-      CharacterPrompt.char_idx,
-      func.max(CharacterPrompt.created_at).label("latest_created_at")
-    )
-    .group_by(CharacterPrompt.char_idx)
-    .subquery()
-  )
-
   # Friend 테이블을 사용하여 특정 사용자가 팔로우한 캐릭터 조회
   query = (
-    db.query(Character, CharacterPrompt, Image.file_path)
-    .join(subquery, subquery.c.char_idx == Character.char_idx)
-    .join(
-      CharacterPrompt,
-      (CharacterPrompt.char_idx == subquery.c.char_idx) &
-      (CharacterPrompt.created_at == subquery.c.latest_created_at)
-    )
+    select_current_prompt(Image.file_path)
     .outerjoin(ImageMapping, ImageMapping.char_idx == Character.char_idx)
     .outerjoin(Image, Image.img_idx == ImageMapping.img_idx)
     .join(Friend, Friend.char_idx == Character.char_idx)
-    .filter(
+    .where(
       Friend.user_idx == user_idx,
       Friend.is_active == True,
       Character.is_active == True
     )
   )
 
-  followed_characters = query.all()
+  followed_characters = db.execute(query).all()
   base_url = f"{request.base_url.scheme}://{request.base_url.netloc}" if request else ""
   results = []
+  extras = CharacterExtras(db, [char.char_idx for char, _, _ in followed_characters])
 
   for char, prompt, image_path in followed_characters:
     image_url = f"{base_url}/static/{os.path.basename(image_path)}" if image_path else None
@@ -426,7 +484,9 @@ def get_followed_characters(user_idx: int, db: Session = Depends(get_db), reques
       "character_personality": prompt.character_personality if prompt else "",
       "character_background": prompt.character_background if prompt else "",
       "character_speech_style": prompt.character_speech_style if prompt else "",
+      "tags": extras.tag_list(char.char_idx),
       "character_image": image_url,
+      "follower_count": char.follower_count,
     })
 
   return results
@@ -456,11 +516,11 @@ async def update_character(
   char_idx: int,
   character_image: Optional[UploadFile] = None,
   character_data: str = Form(...),
-  db: Session = Depends(get_db)
+  db: AsyncSession = Depends(get_async_db)
 ):
   try:
     print(f"Received character data for update: {character_data}")  # 로깅 추가
-    with db.begin():
+    async with db.begin():
       character_dict = json.loads(character_data)
       print(f"Parsed character dict: {character_dict}")  # 로깅 추가
       
@@ -475,7 +535,7 @@ async def update_character(
       print(f"Created schema object: {character}")  # 로깅 추가
 
       # 기존 캐릭터 조회
-      existing_character = db.query(Character).filter(Character.char_idx == char_idx).first()
+      existing_character = await db.get(Character, char_idx)
       if not existing_character:
         raise HTTPException(status_code=404, detail="캐릭터를 찾을 수 없습니다.")
 
@@ -501,68 +561,26 @@ async def update_character(
         ),
       )
       db.add(new_prompt)
+      await db.flush()  # 새 프롬프트를 같은 트랜잭션에서 현재 프롬프트로 지정
+      existing_character.current_prompt_id = new_prompt.char_prompt_id
       print("Added new prompt")  # 로깅 추가
 
       # 이미지 업데이트 로직
       if character_image:
         print("Updating character image...")  # 로깅 추가
 
-        # 기존 이미지 매핑 및 이미지 가져오기
-        existing_image_mapping = db.query(ImageMapping).filter(
-          ImageMapping.char_idx == char_idx,
-          ImageMapping.is_active == True
-        ).first()
-
-        if existing_image_mapping:
-          # 기존 이미지 레코드를 가져옴
-          existing_image = db.query(Image).filter(
-            Image.img_idx == existing_image_mapping.img_idx
-          ).first()
-
-          if existing_image:
-            # 새 이미지 파일 저장
-            file_extension = character_image.filename.split(".")[-1]
-            timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
-            unique_filename = f"{timestamp}_{uuid.uuid4().hex}.{file_extension}"
-            file_path = os.path.join(UPLOAD_DIR, unique_filename)
-
-            # 파일 저장
-            with open(file_path, "wb") as f:
-                f.write(await character_image.read())
-
-            # 기존 이미지 경로 교체
-            existing_image.file_path = file_path
-            print("Image file path updated successfully.")  # 로깅 추가
-
-        else:
-          # 기존 이미지가 없는 경우 새 이미지 레코드를 생성
-          file_extension = character_image.filename.split(".")[-1]
-          timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
-          unique_filename = f"{timestamp}_{uuid.uuid4().hex}.{file_extension}"
-          file_path = os.path.join(UPLOAD_DIR, unique_filename)
-
-          # 파일 저장
-          with open(file_path, "wb") as f:
-              f.write(await character_image.read())
-
-          new_image = Image(file_path=file_path)
-          db.add(new_image)
-          db.flush()
-
-          # 새로운 이미지 매핑 추가
-          new_mapping = ImageMapping(
-              char_idx=char_idx,
-              img_idx=new_image.img_idx,
-              is_active=True
-          )
-          db.add(new_mapping)
+        # 새 이미지로 매핑을 교체하고 기존 이미지의 참조를 해제
+        # (기존 이미지 행의 경로를 덮어쓰지 않음 - 같은 이미지를 쓰는 다른 캐릭터가 있을 수 있고, 파일은 정리 작업이 지움)
+        await image_store.attach(db, char_idx, character_image)
+        print("Image updated successfully.")  # 로깅 추가
 
       # 태그 업데이트
       if character.tags:
         print("Updating tags")  # 로깅 추가
 
         # 기존 태그 비활성화
-        existing_tags = db.query(Tag).filter(Tag.char_idx == char_idx).all()
+        result = await db.execute(select(Tag).where(Tag.char_idx == char_idx))
+        existing_tags = result.scalars().all()
         for tag in existing_tags:
           tag.is_deleted = True
 
@@ -575,16 +593,31 @@ async def update_character(
           )
           db.add(new_tag)
         print("Successfully updated tags")  # 로깅 추가
-
-    db.commit()
+        tag_names = [tag["tag_name"] for tag in character.tags]
+      else:
+        tag_names = (await db.execute(
+          select(Tag.tag_name).where(Tag.char_idx == char_idx, Tag.is_deleted == False)
+        )).scalars().all()
+
+      # 검색 색인 갱신 (이름/설명/태그)
+      existing_character.search_vector = search_vector(character.char_name, character.char_description, tag_names)
+
+    await db.commit()
+    # 캐릭터 이름/호칭이 바뀌었으므로 기존 채팅방의 페르소나 캐시 무효화
+    persona_cache.invalidate_character(char_idx)
+    character_search.invalidate()
+    catalog_cache.bump()
     return {"message": "캐릭터가 성공적으로 업데이트되었습니다."}
 
+  except HTTPException:
+    await db.rollback()
+    raise
   except Exception as e:
     print(f"Detailed error in update_character: {str(e)}")  # 상세 에러 로깅
     print(f"Error type: {type(e)}")  # 에러 타입 출력
     import traceback
     print(f"Full traceback: {traceback.format_exc()}")  # 전체 스택 트레이스 출력
-    db.rollback()
+    await db.rollback()
     raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -618,6 +651,9 @@ def delete_character(char_idx: int, db: Session = Depends(get_db)):
     # 캐릭터 숨김 처리
     character.is_active = False
     db.commit()
+    persona_cache.invalidate_character(char_idx)
+    character_search.invalidate()
+    catalog_cache.bump()
     return {"message": f"캐릭터 {char_idx}이(가) 성공적으로 삭제되었습니다."}
 
 
@@ -1,70 +1,228 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy import select
-from sqlalchemy.sql import func
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from starlette.websockets import WebSocketState
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import datetime
 import os
 import uuid
+import hashlib
 import json
 import asyncio
 import websockets
 
 from app.core.config import settings
-from app.database.session import get_db
+from app.database.session import get_db, get_async_db, AsyncSessionLocal
 from app.schemas.chat import CreateRoomSchema, MessageSchema
-from app.models.models import ChatRoom, ChatLog, Character, CharacterPrompt, Image, ImageMapping
-from app.utils.common_function import clean_json_string
+from app.models.models import ChatRoom, ChatLog, ChatTurn, Character, CharacterPrompt, Image, ImageMapping
+from app.services.admission import AdmittedStreamingResponse, chat_admission
+from app.services.idempotency import idempotency_store
+from app.services.character_loader import select_current_prompt
+from app.services.chat_search import chat_search
+from app.services.chat_history import chat_history_cache, parse_log_turns, estimate_tokens, fit_recent_turns, render_history
+from app.services.langchain_balancer import langchain_balancer
+from app.services.langchain_client import LangChainError
+from app.services.langchain_protocol import langchain_protocol
+from app.services.memory_index import memory_index
+from app.services.persona_cache import persona_cache, build_persona
+from app.services.summarizer import chat_summarizer
+from app.services.write_behind import write_behind
+from app.utils.common_function import encode_cursor, decode_cursor, sse_event, ngram_text
 
 router = APIRouter()
 
 WS_SERVER_DOMAIN = settings.WS_SERVER_DOMAIN
 UPLOAD_DIR = "app/uploads/characters/"  # 캐릭터 이미지 파일 저장 경로
 os.makedirs(UPLOAD_DIR, exist_ok=True) # 디렉토리 생성
-
-# 최근 10개의 대화내역 가져오는 함수
-def get_chat_history(db: Session, room_id: str, limit: int = 10) -> str:
+CHAT_LOG_PAGE_SIZE = 50 # 채팅 로그 기본 페이지 크기
+CHAT_LOG_MAX_PAGE_SIZE = 200 # 채팅 로그 최대 페이지 크기
+CHAT_LOG_STREAM_BATCH = 500 # NDJSON 스트리밍 시 한 번에 읽는 행 수
+IDEMPOTENCY_KEY_MAX_LENGTH = 255 # Idempotency-Key 최대 길이
+CHAT_SEARCH_PAGE_SIZE = 20 # 대화 검색 기본 페이지 크기
+
+# 최근 대화내역 가져오는 함수
+async def get_chat_history(db: AsyncSession, room_id: str, limit: int = settings.CHAT_HISTORY_MAX_TURNS) -> dict:
   """
-  채팅방의 최근 대화 내역을 가져옵니다.
+  채팅방의 최근 대화 내역 스냅샷({"epoch", "last_seq", "turns"})을 가져옵니다.
+  캐시에 없는 채팅방만 DB에서 최근 limit개의 대화를 읽어 캐시를 채웁니다.
   """
-  logs = db.query(ChatLog).filter(
-    ChatLog.chat_id == room_id
-  ).order_by(ChatLog.end_time.desc()).limit(limit).all()
-  
-  # 시간순으로 정렬
-  logs = logs[::-1]
-  
-  # 대화 내역을 문자열로 포맷팅
-  history = ""
-  for log in logs:
-    # ChatLog의 log 필드에서 대화 내용 파싱
-    log_lines = log.log.split('\n')
-    for line in log_lines:
-      if 'user:' in line or 'chatbot:' in line:
-        history += line + '\n'
+  history = chat_history_cache.get(room_id)
+  if history is None:
+    await write_behind.flush_room(room_id) # 아직 저장되지 않은 대화까지 DB에서 보이도록
+    # (chat_id, seq) 인덱스 역순 스캔으로 최근 limit개만 조회
+    result = await db.execute(
+      select(ChatTurn.seq, ChatTurn.speaker, ChatTurn.content)
+      .where(ChatTurn.chat_id == room_id)
+      .order_by(ChatTurn.seq.desc())
+      .limit(limit)
+    )
+    rows = result.all()
+    if rows:
+      turns = [(row.speaker, row.content) for row in rows[::-1]]
+      history = chat_history_cache.load(room_id, turns, last_seq=rows[0].seq)
+    else:
+      history = chat_history_cache.load(room_id, await get_legacy_chat_turns(db, room_id), last_seq=0)
   
   return history
 
+# chat_turns로 옮겨지지 않은 채팅방은 기존 로그에서 최근 대화를 가져옴 (backfill_chat_turns 실행 전 호환용)
+async def get_legacy_chat_turns(db: AsyncSession, room_id: str, limit: int = 10) -> list:
+  result = await db.execute(
+    select(ChatLog.log)
+    .where(ChatLog.chat_id == room_id)
+    .order_by(ChatLog.end_time.desc())
+    .limit(limit)
+  )
+  logs = result.scalars().all()
+
+  # 시간순으로 정렬 후 대화 단위로 파싱
+  turns = []
+  for log in logs[::-1]:
+    turns.extend(parse_log_turns(log))
+  return turns[-settings.CHAT_HISTORY_MAX_TURNS:]
+
+# 새 대화를 대화 내역 캐시에 반영
+def append_chat_history(room_id: str, user_message: str, bot_message: str):
+  chat_history_cache.append(room_id, "user", user_message)
+  chat_history_cache.append(room_id, "chatbot", bot_message)
+
 # LangChain WebSocket 서버에 데이터를 전송하고 응답을 반환하는 함수
-async def send_to_langchain(request_data: dict, room_id: str):
+async def send_to_langchain(context: dict, room_id: str, user_message: str):
   try:
-    uri = f"{WS_SERVER_DOMAIN}/ws/generate/?room_id={room_id}"
-    async with websockets.connect(uri) as websocket:
-      # 요청 데이터 전송
-      await websocket.send(json.dumps(request_data))
-      
-      # 서버 응답 수신
-      response = await websocket.recv()
-      return json.loads(response)
+    response = None
+    async for message in stream_chat_turn(context, room_id, user_message):
+      response = message
+    return response
   except asyncio.TimeoutError:
     print("WebSocket 응답 시간이 초과되었습니다.")
     raise HTTPException(status_code=504, detail="LangChain 서버 응답 시간 초과.")
-  except websockets.exceptions.ConnectionClosedError as e:
+  except (LangChainError, websockets.exceptions.ConnectionClosedError) as e:
     print(f"WebSocket closed with error: {str(e)}")
     raise HTTPException(status_code=500, detail="WebSocket 연결이 닫혔습니다.")
   except Exception as e:
     print(f"Error in send_to_langchain: {str(e)}")
     raise HTTPException(status_code=500, detail="LangChain 서버와 통신 중 오류가 발생했습니다.")
 
+# 한 턴(사용자 메시지 + 캐릭터 응답)과 호감도 저장 (쓰기 지연 버퍼에 모아 일괄 저장)
+async def save_chat_turn(room_id: str, last_seq: int, user_message: str, bot_message: str, favorability: int):
+  await write_behind.add(room_id, [
+    {"chat_id": room_id, "seq": last_seq + 1, "speaker": "user", "content": user_message, "search_text": ngram_text(user_message)},
+    {"chat_id": room_id, "seq": last_seq + 2, "speaker": "chatbot", "content": bot_message, "search_text": ngram_text(bot_message)},
+  ], favorability)
+  persona_cache.set_favorability(room_id, favorability)
+
+# 채팅방 정보와 페르소나 조회 (캐시에 없을 때만 DB 조회)
+async def get_room_persona(db: AsyncSession, room_id: str):
+  cached = persona_cache.get(room_id)
+  if cached:
+    return cached
+  await write_behind.flush_room(room_id) # 아직 저장되지 않은 호감도 반영
+
+  result = await db.execute(
+    select(ChatRoom, CharacterPrompt, Character)
+    .join(CharacterPrompt, ChatRoom.char_prompt_id == CharacterPrompt.char_prompt_id)
+    .join(Character, CharacterPrompt.char_idx == Character.char_idx)
+    .where(ChatRoom.chat_id == room_id, ChatRoom.is_active == True)
+  )
+  chat_data = result.first()
+
+  if not chat_data:
+    raise HTTPException(status_code=404, detail="해당 채팅방 정보를 찾을 수 없습니다.")
+  
+  chat, prompt, character = chat_data
+  room = {
+    "char_prompt_id": prompt.char_prompt_id,
+    "char_idx": character.char_idx,
+    "user_unique_name": chat.user_unique_name,
+    "user_introduction": chat.user_introduction,
+    "favorability": chat.favorability,
+  }
+  persona = build_persona(prompt, character)
+  persona_cache.put(room_id, room, persona)
+  return room, persona
+
+# 새 메시지와 비슷한 예전 대화 검색 (인덱스가 없는 채팅방은 chat_turns에서 만듦)
+async def get_related_memories(db: AsyncSession, room_id: str, user_message: str, max_seq: int, budget: int) -> list:
+  if budget <= 0:
+    return []
+  if not memory_index.has(room_id):
+    await write_behind.flush_room(room_id)
+    result = await db.execute(
+      select(ChatTurn.seq, ChatTurn.speaker, ChatTurn.content)
+      .where(ChatTurn.chat_id == room_id)
+      .order_by(ChatTurn.seq.desc())
+      .limit(settings.MEMORY_MAX_TURNS)
+    )
+    rows = [tuple(row) for row in result.all()][::-1]
+    await memory_index.load(room_id, rows)
+
+  # 유사도 순으로 예산 안에 들어가는 것만 고른 뒤 시간순으로 정렬
+  memories = []
+  used = 0
+  for _, seq, (speaker, text) in await memory_index.search(room_id, user_message, settings.MEMORY_TOP_K, max_seq):
+    tokens = estimate_tokens(text)
+    if used + tokens > budget:
+      continue
+    memories.append((seq, speaker, text))
+    used += tokens
+  return [(speaker, text) for _, speaker, text in sorted(memories)]
+
+# 프롬프트에 넣을 대화 구성: 요약 + 최근 대화 + 새 메시지와 관련된 예전 대화 (토큰 예산 안에서)
+async def get_prompt_history(db: AsyncSession, room_id: str, user_message: str) -> dict:
+  history = await get_chat_history(db, room_id)
+  summary = await chat_summarizer.get(db, room_id)
+  budget = settings.PROMPT_TOKEN_BUDGET - (estimate_tokens(summary["summary"]) if summary["summary"] else 0)
+  recent, used = fit_recent_turns(history["turns"], settings.PROMPT_RECENT_TURNS, budget)
+  memories = await get_related_memories(db, room_id, user_message, history["last_seq"] - len(recent), budget - used)
+  return {"history": {**history, "turns": recent}, "summary": summary["summary"], "memories": memories}
+
+# 채팅방 정보, 페르소나, 대화 내역 조회
+async def load_chat_context(db: AsyncSession, room_id: str, user_message: str) -> dict:
+  room, persona = await get_room_persona(db, room_id)
+
+  # --------------------대화 내역 가져오기--------------------
+  return {"room": room, "persona": persona, **await get_prompt_history(db, room_id, user_message)}
+
+# 한 턴의 요청을 LangChain 서버로 보내고 응답 메시지를 차례로 반환
+def stream_chat_turn(context: dict, room_id: str, user_message: str, stream: bool = False):
+  # 같은 채팅방은 같은 LangChain 서버로 보내 서버 쪽 캐시를 유지
+  return langchain_protocol.stream(
+    langchain_balancer.backend_for(room_id), room_id, context["room"], context["persona"], context["history"], user_message,
+    stream=stream, memories=context["memories"], summary=context["summary"]
+  )
+
+# 최종 응답 메시지로 대화 내역/호감도를 반영하고 클라이언트 응답을 구성
+async def complete_chat_turn(room_id: str, context: dict, user_message: str, response_data: dict, streamed_text: str = "") -> dict:
+  bot_response_text = response_data.get("text") or streamed_text or "openai_api 에러가 발생했습니다."
+  predicted_emotion = response_data.get("emotion", "Neutral")
+  updated_favorability = response_data.get("favorability", context["room"]["favorability"])
+
+  # 데이터베이스에 대화와 업데이트된 호감도 반영
+  last_seq = context["history"]["last_seq"]
+  await save_chat_turn(room_id, last_seq, user_message, bot_response_text, updated_favorability)
+  append_chat_history(room_id, user_message, bot_response_text)
+  await memory_index.add(room_id, [(last_seq + 1, "user", user_message), (last_seq + 2, "chatbot", bot_response_text)])
+  chat_summarizer.schedule(room_id, last_seq + 2)
+  # room.character_emotion = predicted_emotion (기분은 어떻게???)
+
+  return {
+    "user": user_message,
+    "bot": bot_response_text,
+    "updated_favorability": updated_favorability,
+    "emotion": predicted_emotion
+  }
+
+# LangChain 커넥션 풀 상태 조회 API (다른 서비스 통계는 /api/stats)
+@router.get("/api/langchain/stats")
+def get_langchain_stats():
+  return {
+    **langchain_balancer.stats(),
+    "protocol": langchain_protocol.stats(),
+  }
+
 
 
 
@@ -78,30 +236,14 @@ def create_chat_room(room: CreateRoomSchema, db: Session = Depends(get_db)):
   try:
     # 트랜잭션 시작
     with db.begin():
-      # 각 캐릭터에 대한 최신 char_prompt_id를 가져오는 subquery
-      subquery = (
-        select(
-          CharacterPrompt.char_idx,
-          func.max(CharacterPrompt.created_at).label("latest_created_at")
-        )
-        .group_by(CharacterPrompt.char_idx)
-        .subquery()
-      )
-      # 캐릭터 정보 가져오기
-      character_data = (
-        db.query(Character, CharacterPrompt)
-        .join(subquery, subquery.c.char_idx == Character.char_idx)
-        .join(
-          CharacterPrompt,
-          (CharacterPrompt.char_idx == subquery.c.char_idx) &
-          (CharacterPrompt.created_at == subquery.c.latest_created_at)
-        )
-        .filter(
+      # 캐릭터와 현재 프롬프트 가져오기
+      character_data = db.execute(
+        select_current_prompt()
+        .where(
           Character.char_idx == room.character_id, 
           Character.is_active == True
         )
-        .first()
-      )
+      ).first()
       
       if not character_data:
         raise HTTPException(status_code=404, detail="해당 캐릭터를 찾을 수 없습니다.")
@@ -164,85 +306,174 @@ def create_chat_room(room: CreateRoomSchema, db: Session = Depends(get_db)):
     raise HTTPException(status_code=500, detail=f"채팅방 생성 중 오류가 발생했습니다: {str(e)}")
 
 
+# 한 턴 처리: 입장 제어 → 컨텍스트 조회 → LangChain 요청 → 결과 반영
+async def run_chat_turn(db: AsyncSession, room_id: str, user_message: str) -> dict:
+  # 같은 채팅방의 메시지는 순서대로 하나씩 처리 (호감도/대화 내역 경쟁 방지)
+  async with chat_admission.admit(room_id):
+    context = await load_chat_context(db, room_id, user_message)
+
+    # LangChain 서버와 WebSocket 통신
+    response_data = await send_to_langchain(context, room_id, user_message)
+    return await complete_chat_turn(room_id, context, user_message, response_data)
+
 # 채팅 전송 및 캐릭터 응답 - LangChain 서버 이용
 @router.post("/api/chat/{room_id}")
-async def query_langchain(room_id: str, message: MessageSchema, db: Session = Depends(get_db)):
+async def query_langchain(
+  room_id: str,
+  message: MessageSchema,
+  response: Response,
+  db: AsyncSession = Depends(get_async_db),
+  idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
   """
   LangChain 서버에 요청을 보내고 응답을 처리합니다.
+  Idempotency-Key 헤더가 있으면 같은 키의 재시도는 새로 생성하지 않고 처리 중인 요청에 합류하거나
+  저장된 결과를 돌려받습니다 (Idempotent-Replayed: true 헤더).
   """
   try:
-    chat_data = (
-      db.query(ChatRoom, CharacterPrompt, Character)
-      .join(CharacterPrompt, ChatRoom.char_prompt_id == CharacterPrompt.char_prompt_id)
-      .join(Character, CharacterPrompt.char_idx == Character.char_idx)
-      .filter(ChatRoom.chat_id == room_id, ChatRoom.is_active == True)
-      .first()
-    )
-
-    if not chat_data:
-      raise HTTPException(status_code=404, detail="해당 채팅방 정보를 찾을 수 없습니다.")
-    
-    chat, prompt, character = chat_data
+    if not idempotency_key:
+      return await run_chat_turn(db, room_id, message.content)
+    if len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+      raise HTTPException(status_code=400, detail="Idempotency-Key가 너무 깁니다.")
+
+    async def produce():
+      # 처음 요청한 클라이언트가 끊겨도 끝까지 처리하도록 요청과 별개의 세션 사용
+      async with AsyncSessionLocal() as session:
+        return await run_chat_turn(session, room_id, message.content)
+
+    fingerprint = hashlib.sha256(message.content.encode("utf-8")).hexdigest()
+    result, replayed = await idempotency_store.run((room_id, idempotency_key), fingerprint, produce)
+    if replayed:
+      response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+  except HTTPException:
+    raise
+  except Exception as e:
+    print(f"Error in query_langchain: {str(e)}")  # 디버깅용
+    raise HTTPException(status_code=500, detail=str(e))
 
-    if prompt:
-      example_dialogues = [json.loads(clean_json_string(dialogue)) if dialogue else {} for dialogue in prompt.example_dialogues] if prompt.example_dialogues else []
-      nicknames = json.loads(character.nicknames) if character.nicknames else {'30': '', '70': '', '100': ''}
-    else:
-      # 기본값 설정
-      example_dialogues = []
-      nicknames = {'30': '', '70': '', '100': ''}
-
-    # --------------------대화 내역 가져오기--------------------
-    chat_history = get_chat_history(db, room_id)
-    # print("Chat History being sent to LangChain:", chat_history)
-
-    # LangChain 서버로 보낼 요청 데이터 준비
-    request_data = {
-      "user_message": message.content,
-      "character_name": character.char_name, # 캐릭터 이름
-      "nickname": nicknames, # 호감도에 따른 호칭 명
-      "user_unique_name": chat.user_unique_name, # 캐릭터가 사용자에게 부르는 이름 (nickname보다 우선순위)
-      "user_introduction": chat.user_introduction, # 캐릭터한테 사용자를 소개하는 글
-      "favorability": chat.favorability, # 호감도
-      "character_appearance": prompt.character_appearance, # 캐릭터 외형
-      "character_personality": prompt.character_personality, # 캐릭터 성격
-      "character_background": prompt.character_background, # 캐릭터 배경
-      "character_speech_style": prompt.character_speech_style, # 캐릭터 말투
-      "example_dialogues": example_dialogues, # 예시 대화
-      "chat_history": chat_history # 채팅 기록
-    }
 
-    # print("Sending request to LangChain:", request_data)  # 디버깅용
+# 채팅 전송 및 캐릭터 응답 (스트리밍) - SSE로 토큰 단위 전달
+@router.post("/api/chat/{room_id}/stream")
+async def stream_langchain(room_id: str, message: MessageSchema, db: AsyncSession = Depends(get_async_db)):
+  """
+  LangChain 서버가 생성하는 토큰을 도착하는 대로 SSE(text/event-stream)로 전달합니다.
+  token 이벤트로 부분 응답을, 마지막 done 이벤트로 전체 응답과 호감도/감정을 보냅니다.
+  """
+  # 입장 제어는 응답 시작 전에 처리해야 429/503 상태 코드를 돌려줄 수 있음
+  ticket = await chat_admission.acquire(room_id)
+  try:
+    context = await load_chat_context(db, room_id, message.content)
+  except BaseException:
+    chat_admission.release(ticket)
+    raise
+
+  async def event_stream():
+    chunks = []
+    try:
+      async for data in stream_chat_turn(context, room_id, message.content, stream=True):
+        if data.get("type") == "token":
+          chunks.append(data.get("text", ""))
+          yield sse_event("token", {"text": data.get("text", "")})
+          continue
+
+        # 마지막 메시지: 호감도/감정 포함, 호감도는 응답이 끝난 뒤 한 번만 반영
+        result = await complete_chat_turn(room_id, context, message.content, data, "".join(chunks))
+        yield sse_event("done", result)
+    except asyncio.TimeoutError:
+      print("WebSocket 응답 시간이 초과되었습니다.")
+      yield sse_event("error", {"detail": "LangChain 서버 응답 시간 초과."})
+    except Exception as e:
+      print(f"Error in stream_langchain: {str(e)}")
+      yield sse_event("error", {"detail": "LangChain 서버와 통신 중 오류가 발생했습니다."})
+    finally:
+      chat_admission.release(ticket)
+
+  # 본문을 보내기 전에 연결이 끊겨 event_stream이 실행되지 않아도 티켓은 응답에서 반납
+  return AdmittedStreamingResponse(
+    event_stream(),
+    chat_admission,
+    ticket,
+    media_type="text/event-stream",
+    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+  )
 
-    # LangChain 서버와 WebSocket 통신
-    response_data = await send_to_langchain(request_data, room_id)
 
-    bot_response_text = response_data.get("text", "openai_api 에러가 발생했습니다.")
-    predicted_emotion = response_data.get("emotion", "Neutral")
-    updated_favorability = response_data.get("favorability", chat.favorability)
 
-    # 캐릭터 상태 업데이트
-    chat.favorability = updated_favorability
-    # 데이터베이스에 업데이트된 호감도 반영
-    db.commit()
-    # room.character_emotion = predicted_emotion (기분은 어떻게???)
 
-    return {
-      "user": message.content,
-      "bot": bot_response_text,
-      "updated_favorability": updated_favorability,
-      "emotion": predicted_emotion
-    }
 
-  except Exception as e:
-    print(f"Error in query_langchain: {str(e)}")  # 디버깅용
-    raise HTTPException(status_code=500, detail=str(e))
 
 
 
 
 
+# 채팅 WebSocket API - 연결 하나로 메시지 송수신 및 서버 푸시
+@router.websocket("/ws/chat/{room_id}")
+async def chat_websocket(websocket: WebSocket, room_id: str):
+  """
+  클라이언트와의 양방향 채팅 연결.
+  채팅방 정보는 연결 시 한 번만 조회하고, 메시지({"content": ...})를 받을 때마다
+  typing → token(부분 응답) → message(전체 응답, 감정, 호감도) 순서로 푸시합니다.
+  DB 세션은 조회할 때만 잠깐 열고 닫습니다. (연결마다 커넥션을 계속 잡고 있으면 풀이 금방 바닥남)
+  """
+  await websocket.accept()
+  try:
+    async with AsyncSessionLocal() as db:
+      room, persona = await get_room_persona(db, room_id)
+  except HTTPException as e:
+    await websocket.close(code=4404, reason=e.detail)
+    return
+  except Exception as e:
+    print(f"Error in chat_websocket: {str(e)}")
+    await websocket.close(code=1011, reason="채팅방 정보를 불러오지 못했습니다.")
+    return
 
+  try:
+    while True:
+      data = await websocket.receive_json()
+      content = data.get("content") if isinstance(data, dict) else None
+      if not content:
+        await websocket.send_json({"type": "error", "detail": "content 필드가 필요합니다."})
+        continue
+
+      try:
+        async with chat_admission.admit(room_id):
+          await websocket.send_json({"type": "typing", "state": True})
+          # 대화 내역 조회가 끝나면 세션을 닫고 LangChain 응답을 기다림 (저장은 쓰기 지연 버퍼가 별도 세션으로 처리)
+          async with AsyncSessionLocal() as db:
+            context = {"room": room, "persona": persona, **await get_prompt_history(db, room_id, content)}
+          chunks = []
+          async for message in stream_chat_turn(context, room_id, content, stream=True):
+            if message.get("type") == "token":
+              chunks.append(message.get("text", ""))
+              await websocket.send_json({"type": "token", "text": message.get("text", "")})
+              continue
+            result = await complete_chat_turn(room_id, context, content, message, "".join(chunks))
+            room["favorability"] = result["updated_favorability"]
+            await websocket.send_json({"type": "message", **result})
+      except HTTPException as e:
+        await websocket.send_json({"type": "error", "status": e.status_code, "detail": e.detail})
+      except asyncio.TimeoutError:
+        print("WebSocket 응답 시간이 초과되었습니다.")
+        await websocket.send_json({"type": "error", "status": 504, "detail": "LangChain 서버 응답 시간 초과."})
+      except WebSocketDisconnect:
+        raise
+      except Exception as e:
+        print(f"Error in chat_websocket: {str(e)}")
+        await websocket.send_json({"type": "error", "status": 500, "detail": "LangChain 서버와 통신 중 오류가 발생했습니다."})
+      finally:
+        if websocket.client_state == WebSocketState.CONNECTED:
+          await websocket.send_json({"type": "typing", "state": False})
+  except WebSocketDisconnect:
+    pass
+  except Exception as e:
+    print(f"Error in chat_websocket: {str(e)}")
+    if websocket.client_state == WebSocketState.CONNECTED:
+      await websocket.close(code=1011)
+  finally:
+    # 연결이 끝나면 남은 대화를 바로 저장
+    await write_behind.flush_room(room_id)
 
 
 
@@ -320,27 +551,165 @@ def get_user_chat_rooms(user_idx: int, request: Request, db: Session = Depends(g
   return result
 
 
+# 채팅 로그 한 행을 응답 형식으로 변환
+def serialize_chat_log(log: ChatLog) -> dict:
+  return {
+    "session_id": log.session_id,
+    "log": log.log,
+    "start_time": log.start_time,
+    "end_time": log.end_time,
+  }
+
+# 대화 한 건을 chat_logs 응답과 같은 형식으로 변환 (log는 "화자: 내용" 한 줄, 순번 추가)
+def serialize_chat_turn(turn: ChatTurn) -> dict:
+  return {
+    "session_id": turn.session_id,
+    "seq": turn.seq,
+    "log": render_history([(turn.speaker, turn.content)]),
+    "start_time": turn.created_at,
+    "end_time": turn.created_at,
+  }
+
+# 채팅 로그를 읽을 테이블과 정렬 키: chat_turns에 대화가 있으면 대화 단위(seq 순), 없으면(backfill_chat_turns 실행 전) chat_logs의 세션 단위
+async def get_chat_log_source(db: AsyncSession, room_id: str):
+  migrated = (await db.execute(select(ChatTurn.turn_idx).where(ChatTurn.chat_id == room_id).limit(1))).first()
+  if migrated:
+    return ChatTurn, (ChatTurn.seq,), serialize_chat_turn
+  return ChatLog, (ChatLog.start_time, ChatLog.session_id), serialize_chat_log
+
+def encode_log_cursor(row, columns) -> str:
+  return encode_cursor(*(getattr(row, column.key) for column in columns))
+
+# 커서 문자열을 정렬 키 값으로 변환 (다른 테이블 기준으로 만든 커서면 400)
+def parse_log_cursor(cursor: str, columns):
+  try:
+    values = decode_cursor(cursor)
+    if len(values) != len(columns):
+      raise ValueError(cursor)
+    return tuple(
+      datetime.fromisoformat(value) if column.type.python_type is datetime else column.type.python_type(value)
+      for column, value in zip(columns, values)
+    )
+  except (ValueError, TypeError):
+    raise HTTPException(status_code=400, detail="잘못된 커서입니다.")
+
 # 채팅 로그 반환 API
 @router.get("/api/chat/{room_id}")
-def get_chat_logs(room_id: str, db: Session = Depends(get_db)):
+async def get_chat_logs(
+  room_id: str,
+  response: Response,
+  limit: Optional[int] = Query(default=None, ge=1, le=CHAT_LOG_MAX_PAGE_SIZE),
+  before: Optional[str] = None,
+  after: Optional[str] = None,
+  stream: bool = False,
+  db: AsyncSession = Depends(get_async_db)
+):
   """
   특정 채팅방의 메시지 로그를 반환하는 API 엔드포인트.
+  chat_turns로 옮겨진 채팅방은 대화 단위(seq 순), 아직 옮겨지지 않은 채팅방은 chat_logs의 세션 단위((start_time, session_id) 순)로 반환합니다.
+  키셋 페이지네이션을 사용하며, 결과는 항상 시간순입니다.
+  - 커서 없음: 가장 최근 limit개
+  - before: 커서보다 이전 limit개 / after: 커서보다 이후 limit개
+  이전/다음 페이지 커서는 X-Prev-Cursor / X-Next-Cursor 헤더로 반환합니다.
+  stream=true면 after 이후(없으면 처음부터)의 로그를 서버 사이드 커서로 읽어 NDJSON으로 전송합니다. (before는 사용할 수 없음)
   """
-  logs = (
-    db.query(ChatLog)
-    .filter(ChatLog.chat_id == room_id)
-    .order_by(ChatLog.start_time)
-    .all()
-  )
-  return [
-    {
-      "session_id": log.session_id,
-      "log": log.log,
-      "start_time": log.start_time,
-      "end_time": log.end_time,
-    }
-    for log in logs
-  ]
+  if before and after:
+    raise HTTPException(status_code=400, detail="before와 after는 함께 사용할 수 없습니다.")
+  if stream and before:
+    raise HTTPException(status_code=400, detail="stream은 before와 함께 사용할 수 없습니다. (after만 지원)")
+
+  await write_behind.flush_room(room_id) # 버퍼에만 있는 최근 대화도 포함되도록
+  model, columns, serialize = await get_chat_log_source(db, room_id)
+
+  if stream:
+    after_key = parse_log_cursor(after, columns) if after else None
+    return StreamingResponse(stream_chat_logs(room_id, model, columns, serialize, after_key, limit), media_type="application/x-ndjson")
+
+  page_size = limit or CHAT_LOG_PAGE_SIZE
+  sort_key = tuple_(*columns)
+  query = select(model).where(model.chat_id == room_id)
+  if after:
+    # 커서 이후: 오름차순으로 page_size + 1개를 읽어 다음 페이지 존재 여부 확인
+    query = query.where(sort_key > parse_log_cursor(after, columns)).order_by(*columns)
+    rows = (await db.execute(query.limit(page_size + 1))).scalars().all()
+    has_next, has_prev = len(rows) > page_size, True
+    logs = rows[:page_size]
+  else:
+    # 최근 페이지 또는 커서 이전: 내림차순으로 읽은 뒤 시간순으로 뒤집음
+    if before:
+      query = query.where(sort_key < parse_log_cursor(before, columns))
+    query = query.order_by(*(column.desc() for column in columns))
+    rows = (await db.execute(query.limit(page_size + 1))).scalars().all()
+    has_prev, has_next = len(rows) > page_size, bool(before)
+    logs = rows[:page_size][::-1]
+
+  if logs and has_prev:
+    response.headers["X-Prev-Cursor"] = encode_log_cursor(logs[0], columns)
+  if logs and has_next:
+    response.headers["X-Next-Cursor"] = encode_log_cursor(logs[-1], columns)
+  return [serialize(log) for log in logs]
+
+# 검색 결과 페이지 응답 (다음 페이지 커서는 X-Next-Cursor 헤더)
+def search_page(response: Response, results: List[dict], limit: int) -> List[dict]:
+  if len(results) == limit:
+    response.headers["X-Next-Cursor"] = encode_cursor(results[-1]["rank"], results[-1]["turn_idx"])
+  return results
+
+def parse_search_cursor(cursor: str):
+  try:
+    rank, turn_idx = decode_cursor(cursor)
+    return float(rank), int(turn_idx)
+  except (ValueError, TypeError):
+    raise HTTPException(status_code=400, detail="잘못된 커서입니다.")
+
+# 채팅방 대화 검색 API
+@router.get("/api/chat/{room_id}/search")
+async def search_chat_room(
+  room_id: str,
+  response: Response,
+  q: str = Query(..., min_length=1, max_length=100),
+  limit: int = Query(default=CHAT_SEARCH_PAGE_SIZE, ge=1, le=CHAT_LOG_MAX_PAGE_SIZE),
+  cursor: Optional[str] = None,
+  db: AsyncSession = Depends(get_async_db),
+):
+  """
+  채팅방 대화를 검색어 n-gram으로 검색해 관련도 순으로 반환합니다.
+  다음 페이지는 X-Next-Cursor 헤더 값을 cursor로 전달합니다.
+  """
+  await write_behind.flush_room(room_id) # 방금 보낸 대화도 검색되도록
+  after = parse_search_cursor(cursor) if cursor else None
+  results = await chat_search.search(db, q, limit, after, room_id=room_id)
+  return search_page(response, results, limit)
+
+# 사용자 전체 대화 검색 API
+@router.get("/api/chat/user/{user_idx}/search")
+async def search_user_chats(
+  user_idx: int,
+  response: Response,
+  q: str = Query(..., min_length=1, max_length=100),
+  limit: int = Query(default=CHAT_SEARCH_PAGE_SIZE, ge=1, le=CHAT_LOG_MAX_PAGE_SIZE),
+  cursor: Optional[str] = None,
+  db: AsyncSession = Depends(get_async_db),
+):
+  """
+  사용자의 활성 채팅방 전체에서 검색합니다. 결과의 room_id로 채팅방을 구분합니다.
+  """
+  after = parse_search_cursor(cursor) if cursor else None
+  results = await chat_search.search(db, q, limit, after, user_idx=user_idx)
+  return search_page(response, results, limit)
+
+# 채팅 로그 NDJSON 스트림 (서버 사이드 커서로 일정 개수씩 읽어 메모리 사용량 고정)
+async def stream_chat_logs(room_id: str, model, columns, serialize, after_key, limit: Optional[int]):
+  # 스트리밍 응답은 요청 세션이 닫힌 뒤에 끝나므로 별도 세션 사용
+  async with AsyncSessionLocal() as db:
+    query = select(model).where(model.chat_id == room_id)
+    if after_key:
+      query = query.where(tuple_(*columns) > after_key)
+    query = query.order_by(*columns)
+    if limit:
+      query = query.limit(limit)
+    async for log in await db.stream_scalars(query.execution_options(yield_per=CHAT_LOG_STREAM_BATCH)):
+      yield json.dumps(jsonable_encoder(serialize(log)), ensure_ascii=False) + "\n"
 
 
 
@@ -352,18 +721,28 @@ def get_chat_logs(room_id: str, db: Session = Depends(get_db)):
 # ------------------------------DELETE METHOD------------------------------
 # 채팅방 삭제 API
 @router.delete("/api/chat-room/{room_id}")
-def delete_chat_room(room_id: str, db: Session = Depends(get_db)):
+async def delete_chat_room(room_id: str, db: AsyncSession = Depends(get_async_db)):
   try:
+    # 버퍼에 남은 대화/호감도를 먼저 저장
+    await write_behind.flush_room(room_id)
+
     # ChatRoom 상태값 변경
-    room = db.query(ChatRoom).filter(ChatRoom.chat_id == room_id).first()
+    room = await db.get(ChatRoom, room_id)
     if not room:
       raise HTTPException(status_code=404, detail="해당 채팅방을 찾을 수 없습니다.")
     
     # is_active 업데이트
     room.is_active = False
-    db.commit()
+    await db.commit()
+    chat_history_cache.invalidate(room_id)
+    persona_cache.invalidate_room(room_id)
+    memory_index.invalidate(room_id)
+    chat_summarizer.invalidate(room_id)
+    chat_search.invalidate(room_id)
     return {"message": "채팅방이 성공적으로 비활성화되었습니다."}
+  except HTTPException:
+    raise
   except Exception as e:
-    db.rollback()
+    await db.rollback()
     print(f"Error deleting chat room: {str(e)}")
     raise HTTPException(status_code=500, detail=f"채팅방 삭제 중 오류: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,258 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select, update, insert, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+
+from app.core.config import settings
+from app.database.session import get_async_db, AsyncSessionLocal
+from app.schemas.chat import MessageSchema
+from app.schemas.group_chat import CreateGroupChatSchema
+from app.models.models import GroupChat, GroupChatCharacter, GroupChatTurn, Character
+from app.services.admission import AdmittedStreamingResponse, chat_admission
+from app.services.character_loader import select_current_prompt
+from app.services.chat_history import chat_history_cache, fit_recent_turns
+from app.services.group_chat import group_chat_engine
+from app.services.langchain_balancer import langchain_balancer
+from app.services.langchain_protocol import build_full_payload
+from app.services.persona_cache import build_persona
+from app.utils.common_function import sse_event
+
+router = APIRouter()
+
+# 그룹 대화 내역 캐시 키 (1:1 채팅방 id와 겹치지 않도록 접두어 사용)
+def group_room_id(group_chat_idx: int) -> str:
+  return f"group-{group_chat_idx}"
+
+# 그룹 정보와 참여 캐릭터(최신 프롬프트 기준 페르소나) 조회
+async def load_group(db: AsyncSession, group_chat_idx: int):
+  group = (await db.execute(
+    select(GroupChat).where(GroupChat.group_chat_idx == group_chat_idx, GroupChat.is_deleted == False)
+  )).scalar_one_or_none()
+  if not group:
+    raise HTTPException(status_code=404, detail="해당 그룹 채팅방을 찾을 수 없습니다.")
+
+  # 각 캐릭터와 현재 프롬프트
+  rows = (await db.execute(
+    select_current_prompt()
+    .join(GroupChatCharacter, GroupChatCharacter.char_idx == Character.char_idx)
+    .where(GroupChatCharacter.group_chat_idx == group_chat_idx, Character.is_active == True)
+    .order_by(GroupChatCharacter.group_chars_idx)
+  )).all()
+
+  members = [
+    {"char_idx": character.char_idx, "char_name": character.char_name, "persona": build_persona(prompt, character)}
+    for character, prompt in rows
+  ]
+  return group, members
+
+# 그룹 대화 내역 (캐시에 없으면 group_chat_turns에서 최근 대화를 읽음) - 최근 대화만 토큰 예산 안에서 사용
+async def get_group_history(db: AsyncSession, group_chat_idx: int, limit: int = settings.CHAT_HISTORY_MAX_TURNS) -> dict:
+  room_id = group_room_id(group_chat_idx)
+  history = chat_history_cache.get(room_id)
+  if history is None:
+    rows = (await db.execute(
+      select(GroupChatTurn.seq, GroupChatTurn.speaker, GroupChatTurn.content)
+      .where(GroupChatTurn.group_chat_idx == group_chat_idx)
+      .order_by(GroupChatTurn.seq.desc())
+      .limit(limit)
+    )).all()
+    turns = [(row.speaker, row.content) for row in rows[::-1]]
+    history = chat_history_cache.load(room_id, turns, last_seq=rows[0].seq if rows else 0)
+  recent, _ = fit_recent_turns(history["turns"], settings.PROMPT_RECENT_TURNS, settings.PROMPT_TOKEN_BUDGET)
+  return {**history, "turns": recent}
+
+# 캐릭터 한 명에게 보낼 요청을 만드는 함수 반환
+def group_member_request(group, members: List[dict], history: dict, user_message: str):
+  room_id = group_room_id(group.group_chat_idx)
+  room = {"user_unique_name": None, "user_introduction": None, "favorability": 0}
+
+  async def request(member: dict) -> dict:
+    payload = {
+      **build_full_payload(room_id, room, member["persona"], history, user_message),
+      "group_prompt": group.chat_prompt, # 그룹 상황 설정
+      "group_members": [other["char_name"] for other in members], # 함께 대화하는 캐릭터
+    }
+    # 캐릭터마다 다른 서버로 분산, 캐릭터별 호출도 1:1 채팅과 같은 전역 동시 호출 수 제한을 받음
+    backend = langchain_balancer.backend_for(f"{room_id}-{member['char_idx']}")
+    async with chat_admission.slot():
+      return await backend.request(payload) or {}
+
+  return request
+
+# 응답이 끝난 뒤 그룹 순서대로 대화 내역에 저장하고 캐시에 반영
+async def append_group_history(group_chat_idx: int, history: dict, user_message: str, replies: List[dict]):
+  turns = [(None, "user", user_message)] + [
+    (reply["char_idx"], reply["char_name"], reply["text"])
+    for reply in sorted(replies, key=lambda reply: reply["order"]) if reply["status"] == "ok"
+  ]
+
+  # 스트리밍 응답은 요청 세션이 닫힌 뒤에 끝나므로 별도 세션 사용
+  async with AsyncSessionLocal() as db:
+    async with db.begin():
+      # 그룹 행을 잠가서 다른 워커와 순번이 겹치지 않도록 함
+      await db.execute(select(GroupChat.group_chat_idx).where(GroupChat.group_chat_idx == group_chat_idx).with_for_update())
+      last_seq = (await db.execute(
+        select(func.max(GroupChatTurn.seq)).where(GroupChatTurn.group_chat_idx == group_chat_idx)
+      )).scalar() or 0
+      await db.execute(insert(GroupChatTurn), [
+        {"group_chat_idx": group_chat_idx, "seq": last_seq + offset, "char_idx": char_idx, "speaker": speaker, "content": content}
+        for offset, (char_idx, speaker, content) in enumerate(turns, start=1)
+      ])
+
+  room_id = group_room_id(group_chat_idx)
+  if last_seq != history["last_seq"]:
+    # 다른 워커가 그 사이에 대화를 저장함 - 다음 조회 때 DB에서 다시 채움
+    chat_history_cache.invalidate(room_id)
+    return
+  for _, speaker, content in turns:
+    chat_history_cache.append(room_id, speaker, content)
+
+# ------------------------------POST METHOD------------------------------
+# 그룹 채팅방 생성 API
+@router.post("/api/group-chat/", response_model=dict)
+async def create_group_chat(group: CreateGroupChatSchema, db: AsyncSession = Depends(get_async_db)):
+  if not group.char_idxs:
+    raise HTTPException(status_code=400, detail="참여 캐릭터가 필요합니다.")
+  try:
+    async with db.begin():
+      found = (await db.execute(
+        select(Character.char_idx).where(Character.char_idx.in_(group.char_idxs), Character.is_active == True)
+      )).scalars().all()
+      if len(set(found)) != len(set(group.char_idxs)):
+        raise HTTPException(status_code=404, detail="해당 캐릭터를 찾을 수 없습니다.")
+
+      new_group = GroupChat(user_idx=group.user_idx, chat_title=group.chat_title, chat_prompt=group.chat_prompt)
+      db.add(new_group)
+      await db.flush()  # `new_group.group_chat_idx`를 사용하기 위해 flush 실행
+      await db.refresh(new_group, ["created_at"])
+
+      # 요청 순서 = 응답 순서 (중복 제거)
+      db.add_all([
+        GroupChatCharacter(group_chat_idx=new_group.group_chat_idx, char_idx=char_idx)
+        for char_idx in dict.fromkeys(group.char_idxs)
+      ])
+
+    return {
+      "group_chat_idx": new_group.group_chat_idx,
+      "user_idx": new_group.user_idx,
+      "chat_title": new_group.chat_title,
+      "chat_prompt": new_group.chat_prompt,
+      "char_idxs": list(dict.fromkeys(group.char_idxs)),
+      "created_at": new_group.created_at,
+    }
+  except HTTPException:
+    raise
+  except Exception as e:
+    print(f"Error creating group chat: {str(e)}")
+    raise HTTPException(status_code=500, detail=f"그룹 채팅방 생성 중 오류가 발생했습니다: {str(e)}")
+
+
+# 그룹 채팅 전송 - 모든 캐릭터에게 동시에 요청하고 그룹 순서대로 응답
+@router.post("/api/group-chat/{group_chat_idx}/message")
+async def send_group_message(group_chat_idx: int, message: MessageSchema, db: AsyncSession = Depends(get_async_db)):
+  """
+  응답 시간은 캐릭터 수와 관계없이 가장 느린 캐릭터 기준입니다.
+  시간 안에 응답하지 못한 캐릭터는 status가 timeout/error로 표시되고 나머지 응답은 그대로 반환합니다.
+  """
+  # 같은 그룹의 메시지는 순서대로 하나씩 처리 (대화 내역 경쟁 방지), 전역 슬롯은 캐릭터별 호출마다 얻음
+  async with chat_admission.admit(group_room_id(group_chat_idx), slot=False):
+    group, members = await load_group(db, group_chat_idx)
+    history = await get_group_history(db, group_chat_idx)
+    request = group_member_request(group, members, history, message.content)
+
+    replies = await group_chat_engine.run(group_chat_idx, members, request)
+    await append_group_history(group_chat_idx, history, message.content, replies)
+    return {"user": message.content, "replies": replies}
+
+
+# 그룹 채팅 전송 (스트리밍) - 캐릭터별 응답을 끝나는 대로 SSE로 전달
+@router.post("/api/group-chat/{group_chat_idx}/stream")
+async def stream_group_message(group_chat_idx: int, message: MessageSchema, db: AsyncSession = Depends(get_async_db)):
+  """
+  reply 이벤트로 캐릭터 응답을 끝나는 순서대로 보내고(order로 그룹 내 순서 표시),
+  마지막 done 이벤트로 그룹 순서대로 정렬한 전체 응답을 보냅니다.
+  """
+  ticket = await chat_admission.acquire(group_room_id(group_chat_idx), slot=False)
+  try:
+    group, members = await load_group(db, group_chat_idx)
+    history = await get_group_history(db, group_chat_idx)
+  except BaseException:
+    chat_admission.release(ticket)
+    raise
+  request = group_member_request(group, members, history, message.content)
+
+  async def event_stream():
+    replies = []
+    try:
+      async for reply in group_chat_engine.fan_out(group_chat_idx, members, request):
+        replies.append(reply)
+        yield sse_event("reply", reply)
+      await append_group_history(group_chat_idx, history, message.content, replies)
+      yield sse_event("done", {"user": message.content, "replies": sorted(replies, key=lambda reply: reply["order"])})
+    finally:
+      chat_admission.release(ticket)
+
+  # 본문을 보내기 전에 연결이 끊겨 event_stream이 실행되지 않아도 티켓은 응답에서 반납
+  return AdmittedStreamingResponse(
+    event_stream(),
+    chat_admission,
+    ticket,
+    media_type="text/event-stream",
+    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+  )
+
+
+# ------------------------------GET METHOD------------------------------
+# 특정 유저의 그룹 채팅방 목록 조회 API
+@router.get("/api/group-chat/user/{user_idx}", response_model=List[dict])
+async def get_user_group_chats(user_idx: int, db: AsyncSession = Depends(get_async_db)):
+  rows = (await db.execute(
+    select(GroupChat, Character.char_idx, Character.char_name)
+    .outerjoin(GroupChatCharacter, GroupChatCharacter.group_chat_idx == GroupChat.group_chat_idx)
+    .outerjoin(Character, (Character.char_idx == GroupChatCharacter.char_idx) & (Character.is_active == True))
+    .where(GroupChat.user_idx == user_idx, GroupChat.is_deleted == False)
+    .order_by(GroupChat.created_at.desc(), GroupChatCharacter.group_chars_idx)
+  )).all()
+
+  groups = {}
+  for group, char_idx, char_name in rows:
+    entry = groups.setdefault(group.group_chat_idx, {
+      "group_chat_idx": group.group_chat_idx,
+      "chat_title": group.chat_title,
+      "chat_prompt": group.chat_prompt,
+      "created_at": group.created_at,
+      "characters": [],
+    })
+    if char_idx is not None:
+      entry["characters"].append({"char_idx": char_idx, "char_name": char_name})
+  return list(groups.values())
+
+
+# 그룹 채팅방 정보 조회 API
+@router.get("/api/group-chat/{group_chat_idx}", response_model=dict)
+async def get_group_chat(group_chat_idx: int, db: AsyncSession = Depends(get_async_db)):
+  group, members = await load_group(db, group_chat_idx)
+  return {
+    "group_chat_idx": group.group_chat_idx,
+    "user_idx": group.user_idx,
+    "chat_title": group.chat_title,
+    "chat_prompt": group.chat_prompt,
+    "created_at": group.created_at,
+    "characters": [{"char_idx": member["char_idx"], "char_name": member["char_name"]} for member in members],
+  }
+
+
+# ------------------------------DELETE METHOD------------------------------
+# 그룹 채팅방 삭제 API
+@router.delete("/api/group-chat/{group_chat_idx}")
+async def delete_group_chat(group_chat_idx: int, db: AsyncSession = Depends(get_async_db)):
+  result = await db.execute(
+    update(GroupChat)
+    .where(GroupChat.group_chat_idx == group_chat_idx, GroupChat.is_deleted == False)
+    .values(is_deleted=True)
+  )
+  await db.commit()
+  if result.rowcount == 0:
+    raise HTTPException(status_code=404, detail="해당 그룹 채팅방을 찾을 수 없습니다.")
+  chat_history_cache.invalidate(group_room_id(group_chat_idx))
+  return {"message": "그룹 채팅방이 성공적으로 삭제되었습니다."}
@@ -0,0 +1,35 @@
+from fastapi import APIRouter
+
+from app.services.admission import chat_admission
+from app.services.character_search import character_search
+from app.services.chat_search import chat_search
+from app.services.group_chat import group_chat_engine
+from app.services.idempotency import idempotency_store
+from app.services.image_store import image_store
+from app.services.langchain_balancer import langchain_balancer
+from app.services.langchain_protocol import langchain_protocol
+from app.services.memory_index import memory_index
+from app.services.response_cache import catalog_cache
+from app.services.summarizer import chat_summarizer
+from app.services.upload import upload_service
+from app.services.write_behind import write_behind
+
+router = APIRouter()
+
+# 서비스별 상태/통계 조회 API (각 서비스의 stats()를 모아서 반환)
+@router.get("/api/stats")
+def get_stats():
+  return {
+    "langchain": {**langchain_balancer.stats(), "protocol": langchain_protocol.stats()},
+    "admission": chat_admission.stats(),
+    "memory": memory_index.stats(),
+    "summary": chat_summarizer.stats(),
+    "group_chat": group_chat_engine.stats(),
+    "write_behind": write_behind.stats(),
+    "idempotency": idempotency_store.stats(),
+    "search": chat_search.stats(),
+    "character_search": character_search.stats(),
+    "catalog_cache": catalog_cache.stats(),
+    "upload": upload_service.stats(),
+    "image_store": image_store.stats(),
+  }
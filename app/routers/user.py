@@ -1,4 +1,6 @@
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Body
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.responses import FileResponse
@@ -7,12 +9,14 @@ from wordcloud import WordCloud
 from collections import Counter
 import os
 import re
-import shutil
 
 from app.core.config import Settings
-from app.database.session import get_db
-from app.models.models import User, ChatRoom, ChatLog, Friend
+from app.database.session import get_db, get_async_db
+from app.models.models import User, ChatRoom, ChatTurn, Friend
 from app.schemas.user import SignupRequest, UserResponse, FollowRequest
+from app.services.character_loader import follower_count_update
+from app.services.response_cache import catalog_cache
+from app.services.upload import upload_service
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 SECRET_KEY = Settings.SECRET_KEY
@@ -157,10 +161,11 @@ def preprocess_korean_text(logs_text):
 @router.post("/upload-image/", response_model=dict)
 def upload_image(file: UploadFile = File(...)):
   try:
-    file_location = f"{WORDCLOUD_UPLOAD_DIR}/{file.filename}"
-    with open(file_location, "wb") as f:
-      shutil.copyfileobj(file.file, f)
+    # 크기 제한만 확인 (형식은 이전처럼 확인하지 않음)
+    upload_service.save_image_sync(file, WORDCLOUD_UPLOAD_DIR, file.filename, check_type=False)
     return {"message": f"파일 '{file.filename}'이 저장되었습니다."}
+  except HTTPException:
+    raise
   except Exception as e:
     print(f"파일 업로드 오류: {e}")
     raise HTTPException(status_code=500, detail=f"서버 오류: {str(e)}")
@@ -174,10 +179,15 @@ def generate_user_wordcloud(user_idx: int, db: Session = Depends(get_db)):
       raise HTTPException(status_code=404, detail="채팅 데이터 없음.")
     chat_ids = [chat_id[0] for chat_id in chat_ids]
 
-    logs = db.query(ChatLog.log).filter(ChatLog.chat_id.in_(chat_ids)).all()
-    if not logs:
+    # 화자 접두어 없이 대화 내용만 조회
+    turns = (
+      db.query(ChatTurn.content)
+      .filter(ChatTurn.chat_id.in_(chat_ids))
+      .yield_per(1000)
+    )
+    logs_text = " ".join(turn.content for turn in turns)
+    if not logs_text:
       raise HTTPException(status_code=404, detail="로그 데이터 없음.")
-    logs_text = " ".join([log[0] for log in logs])
 
     words = preprocess_korean_text(logs_text)
     word_frequencies = Counter(words)
@@ -208,7 +218,7 @@ def generate_user_wordcloud(user_idx: int, db: Session = Depends(get_db)):
 async def add_character_to_user(
   user_idx: int,
   request: FollowRequest = Body(...),
-  db: Session = Depends(get_db)
+  db: AsyncSession = Depends(get_async_db)
 ):
   if user_idx != request.user_idx:
     raise HTTPException(
@@ -217,21 +227,29 @@ async def add_character_to_user(
     )
 
   try:
-    existing_entry = db.query(Friend).filter(
-      Friend.user_idx == request.user_idx,
-      Friend.char_idx == request.char_idx
-    ).first()
+    result = await db.execute(
+      select(Friend).where(
+        Friend.user_idx == request.user_idx,
+        Friend.char_idx == request.char_idx
+      )
+    )
+    existing_entry = result.scalars().first()
 
     if existing_entry:
       raise HTTPException(status_code=400, detail="이미 추가된 캐릭터입니다.")
 
     new_follow = Friend(user_idx=request.user_idx, char_idx=request.char_idx)
     db.add(new_follow)
-    db.commit()
+    await db.execute(follower_count_update(request.char_idx, 1)) # 팔로우 추가와 같은 트랜잭션에서 증가
+    await db.commit()
+    catalog_cache.bump() # 팔로워 수가 바뀜
     return {"message": f"캐릭터 {request.char_idx}가 유저 {request.user_idx}에게 추가되었습니다."}
 
+  except HTTPException:
+    await db.rollback()
+    raise
   except Exception as e:
-    db.rollback()
+    await db.rollback()
     raise HTTPException(status_code=500, detail=f"서버 내부 오류: {str(e)}")
 
 '''
@@ -260,8 +278,13 @@ def follow_character(
       char_idx=char_idx
     )
     db.add(new_follow)
+    db.execute(follower_count_update(char_idx, 1)) # 팔로우 추가와 같은 트랜잭션에서 증가
     db.commit()
+    catalog_cache.bump() # 팔로워 수가 바뀜
     return {"message": "성공적으로 팔로우했습니다."}
+  except HTTPException:
+    db.rollback()
+    raise
   except Exception as e:
     db.rollback()
     raise HTTPException(status_code=500, detail=str(e))
@@ -283,9 +306,20 @@ def unfollow_character(
     if not follow:
       raise HTTPException(status_code=404, detail="팔로우 관계를 찾을 수 없습니다.")
 
-    follow.is_active = False
+    # 동시에 언팔로우해도 한 번만 감소하도록 실제로 비활성화한 경우에만 감소
+    result = db.execute(
+      update(Friend)
+      .where(Friend.friend_idx == follow.friend_idx, Friend.is_active == True)
+      .values(is_active=False)
+    )
+    if result.rowcount == 1:
+      db.execute(follower_count_update(char_idx, -1))
     db.commit()
+    catalog_cache.bump() # 팔로워 수가 바뀜
     return {"message": "성공적으로 언팔로우했습니다."}
+  except HTTPException:
+    db.rollback()
+    raise
   except Exception as e:
     db.rollback()
     raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,15 @@
+from typing import List, Optional
+from pydantic import BaseModel
+
+# 그룹 채팅방 생성 요청 스키마
+class CreateGroupChatSchema(BaseModel):
+  """
+  그룹 채팅방 생성을 위한 Pydantic 스키마
+  """
+  user_idx: int
+  char_idxs: List[int] # 참여 캐릭터 (응답 순서)
+  chat_title: Optional[str] = None
+  chat_prompt: Optional[str] = None # 그룹 상황 설정
+
+  class Config:
+    orm_mode = True
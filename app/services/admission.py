@@ -0,0 +1,184 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from app.core.config import settings
+
+
+class ChatAdmissionController:
+  """
+  LLM 호출 입장 제어.
+  같은 채팅방의 요청은 도착 순서(FIFO)대로 하나씩 처리하고, 워커 전체의 동시 LLM 호출 수는
+  세마포어로 제한합니다. 대기열이 가득 차면 기다리지 않고 바로 429/503으로 거절합니다.
+  그룹 채팅처럼 한 요청이 LLM을 여러 번 호출하면 채팅방 순서만 얻고(slot=False) 호출마다 slot()으로 전역 슬롯을 얻습니다.
+  """
+
+  def __init__(
+    self,
+    max_concurrency: int = settings.LLM_MAX_CONCURRENCY,
+    max_queue: int = settings.LLM_MAX_QUEUE,
+    room_queue_depth: int = settings.LLM_ROOM_QUEUE_DEPTH,
+    queue_timeout: float = settings.LLM_QUEUE_TIMEOUT,
+  ):
+    self.max_concurrency = max_concurrency
+    self.max_queue = max_queue
+    self.room_queue_depth = room_queue_depth
+    self.queue_timeout = queue_timeout
+    self._semaphore = asyncio.Semaphore(max_concurrency)
+    self._rooms = {} # room_id -> {"lock": asyncio.Lock (FIFO), "depth": 처리 중 + 대기 중 요청 수}
+    self.waiting = 0
+    self.active = 0
+
+    # 통계
+    self.admitted_total = 0
+    self.rejected_room_total = 0
+    self.rejected_queue_total = 0
+    self.timeouts_total = 0
+    self.queue_seconds_total = 0.0
+    self.queue_seconds_max = 0.0
+    self._recent_waits = deque(maxlen=1000)
+
+  async def acquire(self, room_id: str, slot: bool = True) -> dict:
+    """
+    채팅방 순서와 전역 슬롯(slot이 False면 채팅방 순서만)을 얻을 때까지 기다린 뒤 release()에 넘길 티켓을 반환합니다.
+    """
+    room = self._rooms.get(room_id)
+    if room is None:
+      room = self._rooms[room_id] = {"lock": asyncio.Lock(), "depth": 0}
+    if room["depth"] >= self.room_queue_depth:
+      self.rejected_room_total += 1
+      raise HTTPException(status_code=429, detail="이전 메시지를 처리 중입니다. 잠시 후 다시 시도해주세요.", headers={"Retry-After": "1"})
+    if self.waiting >= self.max_queue:
+      self.rejected_queue_total += 1
+      raise HTTPException(status_code=503, detail="요청이 많아 처리할 수 없습니다. 잠시 후 다시 시도해주세요.", headers={"Retry-After": "5"})
+
+    ticket = {"room_id": room_id, "room": room, "needs_slot": slot, "room_locked": False, "slot": False, "released": False}
+    room["depth"] += 1
+    self.waiting += 1
+    started = time.monotonic()
+    try:
+      await asyncio.wait_for(self._wait(ticket), timeout=self.queue_timeout)
+    except asyncio.TimeoutError:
+      self.timeouts_total += 1
+      self.release(ticket)
+      raise HTTPException(status_code=503, detail="대기 시간이 초과되었습니다. 잠시 후 다시 시도해주세요.", headers={"Retry-After": "5"})
+    except BaseException:
+      self.release(ticket)
+      raise
+    finally:
+      self.waiting -= 1
+
+    self._admitted(started, ticket["slot"])
+    return ticket
+
+  def _admitted(self, started: float, slot: bool):
+    waited = time.monotonic() - started
+    self.admitted_total += 1
+    if slot:
+      self.active += 1
+    self.queue_seconds_total += waited
+    self.queue_seconds_max = max(self.queue_seconds_max, waited)
+    self._recent_waits.append(waited)
+
+  async def _wait(self, ticket: dict):
+    await ticket["room"]["lock"].acquire()
+    ticket["room_locked"] = True
+    if ticket["needs_slot"]:
+      await self._semaphore.acquire()
+      ticket["slot"] = True
+
+  def release(self, ticket: dict):
+    """
+    티켓을 반납합니다. 여러 번 호출해도 한 번만 반영됩니다.
+    """
+    if ticket["released"]:
+      return
+    ticket["released"] = True
+    if ticket["slot"]:
+      self._semaphore.release()
+      self.active -= 1
+    if ticket["room_locked"]:
+      ticket["room"]["lock"].release()
+    room = ticket["room"]
+    room["depth"] -= 1
+    if room["depth"] == 0 and self._rooms.get(ticket["room_id"]) is room:
+      del self._rooms[ticket["room_id"]]
+
+  @asynccontextmanager
+  async def admit(self, room_id: str, slot: bool = True):
+    ticket = await self.acquire(room_id, slot)
+    try:
+      yield ticket
+    finally:
+      self.release(ticket)
+
+  @asynccontextmanager
+  async def slot(self):
+    """
+    채팅방 순서 없이 전역 슬롯만 얻습니다. (순서는 호출한 쪽에서 이미 얻은 경우)
+    """
+    if self.waiting >= self.max_queue:
+      self.rejected_queue_total += 1
+      raise HTTPException(status_code=503, detail="요청이 많아 처리할 수 없습니다. 잠시 후 다시 시도해주세요.", headers={"Retry-After": "5"})
+    self.waiting += 1
+    started = time.monotonic()
+    try:
+      await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+    except asyncio.TimeoutError:
+      self.timeouts_total += 1
+      raise HTTPException(status_code=503, detail="대기 시간이 초과되었습니다. 잠시 후 다시 시도해주세요.", headers={"Retry-After": "5"})
+    finally:
+      self.waiting -= 1
+    self._admitted(started, True)
+    try:
+      yield
+    finally:
+      self._semaphore.release()
+      self.active -= 1
+
+  def stats(self) -> dict:
+    waits = sorted(self._recent_waits)
+
+    def percentile(p: float) -> float:
+      return round(waits[min(len(waits) - 1, int(len(waits) * p))], 6) if waits else 0.0
+
+    return {
+      "max_concurrency": self.max_concurrency,
+      "active": self.active,
+      "waiting": self.waiting,
+      "rooms": len(self._rooms),
+      "admitted_total": self.admitted_total,
+      "rejected_room_total": self.rejected_room_total,
+      "rejected_queue_total": self.rejected_queue_total,
+      "timeouts_total": self.timeouts_total,
+      "queue_seconds_total": round(self.queue_seconds_total, 6),
+      "queue_seconds_max": round(self.queue_seconds_max, 6),
+      "queue_seconds_p50": percentile(0.5),
+      "queue_seconds_p95": percentile(0.95),
+    }
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+  """
+  응답이 끝나면 입장 티켓을 반납하는 StreamingResponse.
+  본문 제너레이터의 finally는 Starlette가 본문을 읽기 시작해야 실행되므로, 보내기 전에 연결이 끊겨도
+  반납되도록 응답 자체에서 반납합니다. (release는 여러 번 호출해도 한 번만 반영됨)
+  """
+
+  def __init__(self, content, controller: ChatAdmissionController, ticket: dict, **kwargs):
+    super().__init__(content, **kwargs)
+    self.controller = controller
+    self.ticket = ticket
+
+  async def __call__(self, scope, receive, send):
+    try:
+      await super().__call__(scope, receive, send)
+    finally:
+      self.controller.release(self.ticket)
+
+
+chat_admission = ChatAdmissionController()
@@ -0,0 +1,77 @@
+from typing import Dict, Iterable, List
+
+from sqlalchemy import select, update, func
+from sqlalchemy.orm import Session
+
+from app.models.models import Character, CharacterPrompt, Friend, Tag
+
+
+def select_current_prompt(*entities):
+  """
+  캐릭터와 현재 프롬프트를 함께 조회하는 select를 만듭니다. 뒤에 추가 조회 대상(entities)을 붙일 수 있습니다.
+  characters.current_prompt_id로 기본 키 조인하므로 프롬프트 버전이 쌓여도 조회 비용은 캐릭터 수만큼입니다.
+  """
+  return (
+    select(Character, CharacterPrompt, *entities)
+    .join(CharacterPrompt, CharacterPrompt.char_prompt_id == Character.current_prompt_id)
+  )
+
+
+def follower_count_update(char_idx: int, delta: int):
+  """
+  characters.follower_count를 delta만큼 바꾸는 UPDATE 문을 만듭니다.
+  팔로우 관계를 바꾸는 트랜잭션 안에서 실행해야 friends 테이블과 함께 커밋/롤백됩니다.
+  """
+  return (
+    update(Character)
+    .where(Character.char_idx == char_idx)
+    .values(follower_count=func.greatest(Character.follower_count + delta, 0))
+  )
+
+
+def load_follower_counts(db: Session, char_idxs: Iterable[int]) -> Dict[int, int]:
+  """
+  friends 테이블에서 캐릭터별 팔로워 수를 한 번의 GROUP BY 쿼리로 집계합니다. 팔로워가 없는 캐릭터는 0입니다.
+  화면에는 characters.follower_count를 쓰고, 이 집계는 카운터 보정(reconcile_follower_counts)에 사용합니다.
+  """
+  char_idxs = list(dict.fromkeys(char_idxs))
+  if not char_idxs:
+    return {}
+  counts = dict(db.execute(
+    select(Friend.char_idx, func.count(Friend.friend_idx))
+    .where(Friend.char_idx.in_(char_idxs), Friend.is_active == True)
+    .group_by(Friend.char_idx)
+  ).all())
+  return {char_idx: counts.get(char_idx, 0) for char_idx in char_idxs}
+
+
+def load_tags(db: Session, char_idxs: Iterable[int]) -> Dict[int, List[dict]]:
+  """
+  캐릭터별 태그 목록을 한 번의 쿼리로 조회합니다. 태그가 없는 캐릭터는 빈 목록입니다.
+  """
+  char_idxs = list(dict.fromkeys(char_idxs))
+  tags = {char_idx: [] for char_idx in char_idxs}
+  if not char_idxs:
+    return tags
+  rows = db.execute(
+    select(Tag.char_idx, Tag.tag_name, Tag.tag_description)
+    .where(Tag.char_idx.in_(char_idxs), Tag.is_deleted == False)
+    .order_by(Tag.char_idx, Tag.tag_idx)
+  ).all()
+  for row in rows:
+    tags[row.char_idx].append({"tag_name": row.tag_name, "tag_description": row.tag_description})
+  return tags
+
+
+class CharacterExtras:
+  """
+  캐릭터 목록 조회 결과 전체의 태그를 미리 한꺼번에 불러 둡니다.
+  캐릭터마다 SELECT를 따로 실행하지 않고 목록 전체에 쿼리 한 번으로 끝납니다.
+  팔로워 수는 characters.follower_count 컬럼을 그대로 사용합니다.
+  """
+
+  def __init__(self, db: Session, char_idxs: Iterable[int]):
+    self.tags = load_tags(db, char_idxs)
+
+  def tag_list(self, char_idx: int) -> List[dict]:
+    return self.tags.get(char_idx, [])
@@ -0,0 +1,180 @@
+import math
+import threading
+import time
+from collections import defaultdict
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import Float, select, and_, or_, cast, func, literal, literal_column
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.models import Character, Tag
+from app.services.chat_search import SEARCH_NGRAM, query_terms
+from app.utils.common_function import ngram_tokens, ngram_text
+
+# 필드별 가중치 (tsvector 가중치 라벨, 메모리 백엔드 점수) - 이름 > 설명 > 태그
+FIELD_WEIGHTS = {"name": ("A", 1.0), "description": ("B", 0.4), "tags": ("C", 0.2)}
+
+SearchCursor = Tuple[float, int] # (점수, char_idx)
+
+_SIMPLE = literal_column("'simple'::regconfig")
+
+
+def search_vector(name: str, description: str, tag_names: Iterable[str]):
+  """
+  characters.search_vector에 저장할 SQL 식을 만듭니다. (n-gram 토큰에 필드별 가중치 부여)
+  """
+  fields = {"name": name, "description": description, "tags": " ".join(tag_names)}
+  vectors = [
+    func.setweight(func.to_tsvector(_SIMPLE, literal(ngram_text(fields[field], SEARCH_NGRAM))), label)
+    for field, (label, _) in FIELD_WEIGHTS.items()
+  ]
+  return vectors[0].op("||")(vectors[1]).op("||")(vectors[2])
+
+
+def serialize_character(character, rank: float) -> dict:
+  return {
+    "id": character.char_idx,
+    "name": character.char_name,
+    "description": character.char_description,
+    "follower_count": character.follower_count,
+    "rank": rank,
+  }
+
+
+class _CatalogIndex:
+  """
+  활성 캐릭터 전체의 역색인 (토큰 -> {char_idx: 점수})
+  """
+
+  def __init__(self, rows: list):
+    self.characters = {}
+    self.postings = {field: defaultdict(dict) for field in FIELD_WEIGHTS}
+    self.lengths = {}
+    for character, tag_names in rows:
+      self.characters[character.char_idx] = character
+      fields = {"name": character.char_name, "description": character.char_description, "tags": " ".join(tag_names)}
+      length = 0
+      for field, (_, weight) in FIELD_WEIGHTS.items():
+        tokens = ngram_tokens(fields[field] or "", SEARCH_NGRAM)
+        length += len(tokens)
+        for token in tokens:
+          scores = self.postings[field][token]
+          scores[character.char_idx] = scores.get(character.char_idx, 0.0) + weight
+      self.lengths[character.char_idx] = length
+    self.built_at = time.monotonic()
+
+  def search(self, terms: List[Tuple[str, bool]], fields: Iterable[str]) -> List[Tuple[float, object]]:
+    matched = None
+    scores = defaultdict(float)
+    for term, prefix in terms:
+      term_scores = defaultdict(float)
+      for field in fields:
+        postings = self.postings[field]
+        for token in ([token for token in postings if token.startswith(term)] if prefix else [term]):
+          for char_idx, score in postings.get(token, {}).items():
+            term_scores[char_idx] += score
+      matched = set(term_scores) if matched is None else matched & set(term_scores)
+      if not matched:
+        return []
+      for char_idx, score in term_scores.items():
+        scores[char_idx] += score
+    return [
+      (scores[char_idx] / (1 + math.log(1 + self.lengths[char_idx])), self.characters[char_idx])
+      for char_idx in matched
+    ]
+
+
+class CharacterSearch:
+  """
+  캐릭터 검색.
+  이름/설명/태그를 n-gram으로 색인하고, 이름에서 찾은 결과를 설명/태그보다 높게 점수를 매깁니다.
+  postgres: characters.search_vector(가중치 tsvector)의 GIN 인덱스와 ts_rank 사용
+  memory: 활성 캐릭터 전체의 역색인을 메모리에 만들어 두고 변경 시/refresh초마다 다시 만듦
+  결과는 (점수 내림차순, char_idx 내림차순)이며 마지막 결과의 (점수, char_idx)로 다음 페이지를 조회합니다.
+  """
+
+  def __init__(self, backend: str = settings.SEARCH_BACKEND, refresh: float = settings.SEARCH_CHARACTER_REFRESH):
+    self.backend = backend
+    self.refresh = refresh
+    self._index = None
+    self._lock = threading.Lock()
+    self.searches = 0
+    self.rebuilds = 0
+
+  def search(self, db: Session, query: str, limit: int, after: Optional[SearchCursor] = None) -> List[dict]:
+    """
+    이름/설명/태그에서 검색해 최대 limit개를 반환합니다.
+    """
+    return self._run(db, query, limit, after, ("name", "description", "tags"))
+
+  def autocomplete(self, db: Session, query: str, limit: int) -> List[dict]:
+    """
+    입력 중인 검색어로 이름만 찾습니다. (마지막 글자는 접두어로 찾음)
+    """
+    return self._run(db, query, limit, None, ("name",))
+
+  def _run(self, db, query, limit, after, fields) -> List[dict]:
+    terms = query_terms(query)
+    if not terms:
+      return []
+    self.searches += 1
+    if self.backend == "memory":
+      return self._search_memory(db, terms, limit, after, fields)
+    return self._search_postgres(db, terms, limit, after, fields)
+
+  def _search_postgres(self, db, terms, limit, after, fields) -> List[dict]:
+    labels = "".join(FIELD_WEIGHTS[field][0] for field in fields)
+    tsquery = func.to_tsquery(
+      _SIMPLE,
+      " & ".join(f"{term}:{'*' if prefix else ''}{labels}" for term, prefix in terms)
+    )
+    # ts_rank는 float4라서 커서로 돌려받은 값과 == 비교가 맞지 않음, double로 바꿔 정렬/비교/커서 값을 모두 같은 식으로 사용
+    rank = cast(func.ts_rank(Character.search_vector, tsquery), Float(53))
+    stmt = (
+      select(Character, rank.label("rank"))
+      .where(Character.search_vector.op("@@")(tsquery), Character.is_active == True)
+    )
+    if after is not None:
+      stmt = stmt.where(or_(rank < after[0], and_(rank == after[0], Character.char_idx < after[1])))
+    rows = db.execute(stmt.order_by(rank.desc(), Character.char_idx.desc()).limit(limit)).all()
+    return [serialize_character(character, float(score)) for character, score in rows]
+
+  def _catalog_index(self, db) -> _CatalogIndex:
+    with self._lock:
+      index = self._index
+    if index is not None and time.monotonic() - index.built_at < self.refresh:
+      return index
+
+    characters = db.execute(select(Character).where(Character.is_active == True)).scalars().all()
+    tag_names = defaultdict(list)
+    for char_idx, tag_name in db.execute(select(Tag.char_idx, Tag.tag_name).where(Tag.is_deleted == False)).all():
+      tag_names[char_idx].append(tag_name)
+    index = _CatalogIndex([(character, tag_names[character.char_idx]) for character in characters])
+    with self._lock:
+      self._index = index
+      self.rebuilds += 1
+    return index
+
+  def _search_memory(self, db, terms, limit, after, fields) -> List[dict]:
+    results = [
+      (score, character) for score, character in self._catalog_index(db).search(terms, fields)
+      if after is None or (score, character.char_idx) < after
+    ]
+    results.sort(key=lambda result: (result[0], result[1].char_idx), reverse=True)
+    return [serialize_character(character, score) for score, character in results[:limit]]
+
+  def invalidate(self):
+    with self._lock:
+      self._index = None
+
+  def stats(self) -> dict:
+    return {
+      "backend": self.backend,
+      "indexed_characters": len(self._index.characters) if self._index is not None else 0,
+      "searches": self.searches,
+      "rebuilds": self.rebuilds,
+    }
+
+
+character_search = CharacterSearch()
@@ -0,0 +1,156 @@
+import itertools
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+
+# "user: 내용" / "chatbot: 내용" 형식의 한 줄
+TURN_PATTERN = re.compile(r'^\s*(user|chatbot)\s*:\s?(.*)$')
+
+Turn = Tuple[Optional[str], str] # (화자, 내용) - 화자를 알 수 없으면 None, 내용은 원문 그대로
+
+
+def parse_log_turns(log_text: str) -> List[Turn]:
+  """
+  ChatLog.log 원문을 (화자, 내용) 목록으로 변환합니다.
+  """
+  turns = []
+  for line in log_text.split('\n'):
+    if 'user:' in line or 'chatbot:' in line:
+      match = TURN_PATTERN.match(line)
+      if match:
+        turns.append((match.group(1), match.group(2)))
+      else:
+        turns.append((None, line))
+  return turns
+
+
+def render_history(turns: List[Turn]) -> str:
+  """
+  대화 목록을 LangChain 서버로 보내는 문자열 형식으로 변환합니다.
+  """
+  return "".join(
+    f"{speaker}: {text}\n" if speaker else f"{text}\n"
+    for speaker, text in turns
+  )
+
+
+def estimate_tokens(text: str) -> int:
+  """
+  토큰 수 추정치 (한글 등은 글자당 1토큰, 영문/숫자는 4글자당 1토큰, 화자 표시 1토큰)
+  """
+  wide = sum(1 for char in text if ord(char) > 127)
+  return wide + (len(text) - wide + 3) // 4 + 1
+
+
+def fit_recent_turns(turns: List[Turn], max_turns: int, budget: int) -> Tuple[List[Turn], int]:
+  """
+  최근 대화부터 max_turns개, budget 토큰 안에서 고르고 (시간순 대화 목록, 사용한 토큰 수)를 반환합니다.
+  """
+  selected = []
+  used = 0
+  for speaker, text in reversed(turns[-max_turns:] if max_turns > 0 else []):
+    tokens = estimate_tokens(text)
+    if used + tokens > budget:
+      break
+    selected.append((speaker, text))
+    used += tokens
+  return selected[::-1], used
+
+
+class ChatHistoryCache:
+  """
+  채팅방별 최근 대화 캐시.
+  채팅방은 LRU로 관리하고, 각 채팅방은 최근 max_turns개의 대화를 링 버퍼로 보관합니다.
+
+  조회 결과는 {"epoch", "last_seq", "turns"} 스냅샷입니다.
+  epoch는 DB에서 다시 채울 때마다 바뀌고, last_seq는 마지막 대화의 순번(ChatTurn.seq)이라서
+  (epoch, last_seq)로 이전 조회 이후 추가된 대화(delta)를 계산할 수 있습니다.
+  다른 워커가 같은 채팅방에 쓴 대화는 알 수 없으므로 DB에서 채운 지 ttl초가 지나면 다시 채웁니다.
+  """
+
+  def __init__(
+    self,
+    max_rooms: int = settings.CHAT_HISTORY_CACHE_ROOMS,
+    max_turns: int = settings.CHAT_HISTORY_MAX_TURNS,
+    ttl: float = settings.CHAT_HISTORY_CACHE_TTL,
+  ):
+    self.max_rooms = max_rooms
+    self.max_turns = max_turns
+    self.ttl = ttl
+    self._rooms = OrderedDict() # room_id -> {"epoch", "last_seq", "turns": deque[Turn], "loaded_at"}
+    self._epochs = itertools.count(1)
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    self.expired = 0
+
+  @staticmethod
+  def _snapshot(entry: dict) -> dict:
+    return {"epoch": entry["epoch"], "last_seq": entry["last_seq"], "turns": list(entry["turns"])}
+
+  def get(self, room_id: str) -> Optional[dict]:
+    with self._lock:
+      entry = self._rooms.get(room_id)
+      if entry is not None and time.monotonic() - entry["loaded_at"] > self.ttl:
+        del self._rooms[room_id]
+        self.expired += 1
+        entry = None
+      if entry is None:
+        self.misses += 1
+        return None
+      self._rooms.move_to_end(room_id)
+      self.hits += 1
+      return self._snapshot(entry)
+
+  def load(self, room_id: str, turns: List[Turn], last_seq: Optional[int] = None) -> dict:
+    """
+    DB에서 읽어온 대화로 채팅방 캐시를 채우고 스냅샷을 반환합니다.
+    last_seq를 주지 않으면 대화 수를 순번으로 사용합니다.
+    """
+    with self._lock:
+      entry = {
+        "epoch": next(self._epochs),
+        "last_seq": len(turns) if last_seq is None else last_seq,
+        "turns": deque(turns, maxlen=self.max_turns),
+        "loaded_at": time.monotonic(),
+      }
+      self._rooms[room_id] = entry
+      self._rooms.move_to_end(room_id)
+      while len(self._rooms) > self.max_rooms:
+        self._rooms.popitem(last=False)
+      return self._snapshot(entry)
+
+  def append(self, room_id: str, speaker: str, text: str) -> Optional[int]:
+    """
+    새 대화를 추가하고 부여된 순번을 반환합니다.
+    캐시에 없는 채팅방은 다음 조회 때 DB에서 채워지므로 무시하고 None을 반환합니다.
+    """
+    with self._lock:
+      entry = self._rooms.get(room_id)
+      if entry is None:
+        return None
+      entry["turns"].append((speaker, text))
+      entry["last_seq"] += 1
+      return entry["last_seq"]
+
+  def invalidate(self, room_id: str):
+    with self._lock:
+      self._rooms.pop(room_id, None)
+
+  def stats(self) -> dict:
+    with self._lock:
+      return {
+        "rooms": len(self._rooms),
+        "max_rooms": self.max_rooms,
+        "max_turns": self.max_turns,
+        "hits": self.hits,
+        "misses": self.misses,
+        "expired": self.expired,
+      }
+
+
+chat_history_cache = ChatHistoryCache()
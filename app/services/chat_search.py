@@ -0,0 +1,168 @@
+import math
+import threading
+from collections import OrderedDict, defaultdict
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Float, select, and_, or_, cast, func, literal_column
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.models import ChatRoom, ChatTurn, CHAT_SEARCH_VECTOR
+from app.utils.common_function import ngram_tokens
+
+SEARCH_NGRAM = 2 # 검색 n-gram 길이 (ChatTurn.search_text와 같아야 함)
+
+SearchCursor = Tuple[float, int] # (점수, turn_idx)
+
+
+def query_terms(query: str) -> List[Tuple[str, bool]]:
+  """
+  검색어를 (토큰, 접두어 검색 여부) 목록으로 변환합니다. n보다 짧은 토큰은 접두어로 찾습니다.
+  """
+  terms = dict.fromkeys(ngram_tokens(query, SEARCH_NGRAM))
+  return [(term, len(term) < SEARCH_NGRAM) for term in terms]
+
+
+def serialize_turn(turn, rank: float) -> dict:
+  return {
+    "turn_idx": turn.turn_idx,
+    "room_id": turn.chat_id,
+    "session_id": turn.session_id,
+    "seq": turn.seq,
+    "speaker": turn.speaker,
+    "content": turn.content,
+    "created_at": turn.created_at,
+    "rank": rank,
+  }
+
+
+class _RoomIndex:
+  """
+  채팅방 하나의 역색인 (토큰 -> {행 위치: 등장 횟수})
+  """
+
+  def __init__(self, turns: list):
+    self.turns = turns
+    self.lengths = []
+    self.postings = defaultdict(dict)
+    for position, turn in enumerate(turns):
+      tokens = ngram_tokens(turn.content, SEARCH_NGRAM)
+      self.lengths.append(len(tokens))
+      for token in tokens:
+        counts = self.postings[token]
+        counts[position] = counts.get(position, 0) + 1
+
+  def search(self, terms: List[Tuple[str, bool]]) -> List[Tuple[float, object]]:
+    matched = None
+    scores = defaultdict(float)
+    for term, prefix in terms:
+      counts = defaultdict(int)
+      for token in ([token for token in self.postings if token.startswith(term)] if prefix else [term]):
+        for position, count in self.postings.get(token, {}).items():
+          counts[position] += count
+      matched = set(counts) if matched is None else matched & set(counts)
+      if not matched:
+        return []
+      for position, count in counts.items():
+        scores[position] += count
+    # 긴 대화일수록 점수를 낮춤 (ts_rank의 길이 정규화와 비슷하게)
+    return [(scores[position] / (1 + math.log(1 + self.lengths[position])), self.turns[position]) for position in matched]
+
+
+class ChatSearch:
+  """
+  대화 전문 검색.
+  postgres: chat_turns.search_text(n-gram)의 tsvector GIN 인덱스와 ts_rank 사용
+  memory: tsvector가 없는 환경용, 채팅방별 역색인을 메모리에 만들어 LRU로 유지
+  결과는 (점수 내림차순, turn_idx 내림차순)이며 마지막 결과의 (점수, turn_idx)로 다음 페이지를 조회합니다.
+  """
+
+  def __init__(self, backend: str = settings.SEARCH_BACKEND, max_rooms: int = settings.SEARCH_CACHE_ROOMS):
+    self.backend = backend
+    self.max_rooms = max_rooms
+    self._rooms = OrderedDict() # room_id -> _RoomIndex (memory 백엔드)
+    self._lock = threading.Lock()
+    self.searches = 0
+
+  async def search(
+    self,
+    db: AsyncSession,
+    query: str,
+    limit: int,
+    after: Optional[SearchCursor] = None,
+    room_id: Optional[str] = None,
+    user_idx: Optional[int] = None,
+  ) -> List[dict]:
+    """
+    room_id 또는 user_idx(사용자의 활성 채팅방 전체) 범위에서 검색해 최대 limit개를 반환합니다.
+    """
+    terms = query_terms(query)
+    if not terms:
+      return []
+    self.searches += 1
+    if self.backend == "memory":
+      return await self._search_memory(db, terms, limit, after, room_id, user_idx)
+    return await self._search_postgres(db, terms, limit, after, room_id, user_idx)
+
+  async def _search_postgres(self, db, terms, limit, after, room_id, user_idx) -> List[dict]:
+    tsquery = func.to_tsquery(
+      literal_column("'simple'::regconfig"),
+      " & ".join(f"{term}:*" if prefix else term for term, prefix in terms)
+    )
+    # ts_rank는 float4라서 커서로 돌려받은 값과 == 비교가 맞지 않음, double로 바꿔 정렬/비교/커서 값을 모두 같은 식으로 사용
+    rank = cast(func.ts_rank(CHAT_SEARCH_VECTOR, tsquery), Float(53))
+    stmt = select(ChatTurn, rank.label("rank")).where(CHAT_SEARCH_VECTOR.op("@@")(tsquery))
+    if room_id is not None:
+      stmt = stmt.where(ChatTurn.chat_id == room_id)
+    if user_idx is not None:
+      stmt = stmt.where(ChatTurn.chat_id.in_(
+        select(ChatRoom.chat_id).where(ChatRoom.user_idx == user_idx, ChatRoom.is_active == True)
+      ))
+    if after is not None:
+      stmt = stmt.where(or_(rank < after[0], and_(rank == after[0], ChatTurn.turn_idx < after[1])))
+    rows = (await db.execute(stmt.order_by(rank.desc(), ChatTurn.turn_idx.desc()).limit(limit))).all()
+    return [serialize_turn(turn, float(score)) for turn, score in rows]
+
+  async def _room_index(self, db, room_id: str) -> _RoomIndex:
+    with self._lock:
+      index = self._rooms.get(room_id)
+      if index is not None:
+        self._rooms.move_to_end(room_id)
+        return index
+    turns = (await db.execute(select(ChatTurn).where(ChatTurn.chat_id == room_id))).scalars().all()
+    index = _RoomIndex(turns)
+    with self._lock:
+      self._rooms[room_id] = index
+      while len(self._rooms) > self.max_rooms:
+        self._rooms.popitem(last=False)
+    return index
+
+  async def _search_memory(self, db, terms, limit, after, room_id, user_idx) -> List[dict]:
+    if room_id is not None:
+      room_ids = [room_id]
+    else:
+      room_ids = (await db.execute(
+        select(ChatRoom.chat_id).where(ChatRoom.user_idx == user_idx, ChatRoom.is_active == True)
+      )).scalars().all()
+
+    results = []
+    for current in room_ids:
+      for score, turn in (await self._room_index(db, current)).search(terms):
+        if after is None or (score, turn.turn_idx) < after:
+          results.append((score, turn))
+    results.sort(key=lambda result: (result[0], result[1].turn_idx), reverse=True)
+    return [serialize_turn(turn, score) for score, turn in results[:limit]]
+
+  def invalidate(self, room_id: str):
+    with self._lock:
+      self._rooms.pop(room_id, None)
+
+  def stats(self) -> dict:
+    return {
+      "backend": self.backend,
+      "indexed_rooms": len(self._rooms),
+      "searches": self.searches,
+    }
+
+
+chat_search = ChatSearch()
@@ -0,0 +1,83 @@
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, List
+
+from app.core.config import settings
+
+
+class GroupChatEngine:
+  """
+  그룹 채팅 팬아웃 엔진.
+  사용자 메시지 하나를 그룹의 모든 캐릭터에게 동시에 보내고, 끝나는 순서대로 응답을 돌려줍니다.
+  그룹마다 동시에 진행하는 캐릭터 요청 수를 제한하고, 시간 안에 끝나지 않은 캐릭터는
+  timeout 결과로 처리해서 나머지 캐릭터의 응답은 그대로 전달합니다.
+  """
+
+  def __init__(self, max_concurrency: int = settings.GROUP_CHAT_MAX_CONCURRENCY, timeout: float = settings.GROUP_CHAT_TIMEOUT):
+    self.max_concurrency = max_concurrency
+    self.timeout = timeout
+    self._groups = {} # group_id -> {"semaphore", "users": 진행 중인 팬아웃 수}
+
+    # 통계
+    self.fan_outs = 0
+    self.replies = 0
+    self.timeouts = 0
+    self.errors = 0
+
+  async def _reply(self, group: dict, order: int, member: dict, request: Callable[[dict], Awaitable[dict]]) -> dict:
+    result = {"order": order, "char_idx": member["char_idx"], "char_name": member["char_name"]}
+    try:
+      async with group["semaphore"]:
+        response = await asyncio.wait_for(request(member), timeout=self.timeout)
+      self.replies += 1
+      return {**result, "status": "ok", "text": response.get("text", ""), "emotion": response.get("emotion", "Neutral")}
+    except asyncio.TimeoutError:
+      self.timeouts += 1
+      return {**result, "status": "timeout", "text": None, "emotion": None}
+    except Exception as e:
+      self.errors += 1
+      print(f"그룹 채팅 응답 실패: {member['char_name']} ({str(e)})")
+      return {**result, "status": "error", "text": None, "emotion": None}
+
+  async def fan_out(self, group_id, members: List[dict], request: Callable[[dict], Awaitable[dict]]) -> AsyncIterator[dict]:
+    """
+    members 각각에 request(member)를 동시에 실행하고 끝나는 순서대로 결과를 반환합니다.
+    결과의 order는 members 안의 순서라서 정렬하면 그룹 순서대로 합칠 수 있습니다.
+    """
+    group = self._groups.get(group_id)
+    if group is None:
+      group = self._groups[group_id] = {"semaphore": asyncio.Semaphore(self.max_concurrency), "users": 0}
+    group["users"] += 1
+    self.fan_outs += 1
+
+    tasks = [asyncio.create_task(self._reply(group, order, member, request)) for order, member in enumerate(members)]
+    try:
+      for finished in asyncio.as_completed(tasks):
+        yield await finished
+    finally:
+      # 클라이언트 연결이 끊기면 남은 요청 취소
+      for task in tasks:
+        task.cancel()
+      group["users"] -= 1
+      if group["users"] == 0 and self._groups.get(group_id) is group:
+        del self._groups[group_id]
+
+  async def run(self, group_id, members: List[dict], request: Callable[[dict], Awaitable[dict]]) -> List[dict]:
+    """
+    모든 캐릭터의 결과를 그룹 순서대로 정렬해서 반환합니다.
+    """
+    results = [result async for result in self.fan_out(group_id, members, request)]
+    return sorted(results, key=lambda result: result["order"])
+
+  def stats(self) -> dict:
+    return {
+      "max_concurrency": self.max_concurrency,
+      "timeout": self.timeout,
+      "active_groups": len(self._groups),
+      "fan_outs": self.fan_outs,
+      "replies": self.replies,
+      "timeouts": self.timeouts,
+      "errors": self.errors,
+    }
+
+
+group_chat_engine = GroupChatEngine()
@@ -0,0 +1,82 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Tuple
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+
+
+class IdempotencyStore:
+  """
+  Idempotency-Key 결과 저장소.
+  같은 키의 요청이 처리 중이면 새로 생성하지 않고 진행 중인 작업의 결과를 함께 기다리고,
+  끝난 뒤 ttl초 안에 다시 오면 저장된 결과를 그대로 돌려줍니다.
+  실패한 요청은 저장하지 않아서 재시도하면 다시 처리합니다.
+  """
+
+  def __init__(self, ttl: float = settings.IDEMPOTENCY_TTL, max_entries: int = settings.IDEMPOTENCY_MAX_ENTRIES):
+    self.ttl = ttl
+    self.max_entries = max_entries
+    self._entries = OrderedDict() # key -> {"task", "fingerprint", "expires"}
+
+    # 통계
+    self.executions = 0
+    self.coalesced = 0 # 처리 중인 요청에 합류
+    self.replayed = 0 # 저장된 결과 반환
+
+  def _get(self, key):
+    entry = self._entries.get(key)
+    if entry is not None and entry["expires"] is not None and time.monotonic() > entry["expires"]:
+      del self._entries[key]
+      return None
+    return entry
+
+  def _finished(self, key, entry: dict, task: asyncio.Task):
+    if task.cancelled() or task.exception() is not None:
+      if self._entries.get(key) is entry:
+        del self._entries[key]
+      return
+    entry["expires"] = time.monotonic() + self.ttl
+
+  async def run(self, key, fingerprint: str, producer: Callable[[], Awaitable]) -> Tuple[object, bool]:
+    """
+    (결과, 재사용 여부)를 반환합니다.
+    작업은 별도 태스크로 실행해서 처음 요청한 클라이언트가 끊겨도 끝까지 처리하고 결과를 저장합니다.
+    """
+    entry = self._get(key)
+    if entry is not None:
+      if entry["fingerprint"] != fingerprint:
+        raise HTTPException(status_code=422, detail="같은 Idempotency-Key로 다른 요청을 보낼 수 없습니다.")
+      if entry["task"].done():
+        self.replayed += 1
+      else:
+        self.coalesced += 1
+      return await asyncio.shield(entry["task"]), True
+
+    task = asyncio.create_task(producer())
+    entry = {"task": task, "fingerprint": fingerprint, "expires": None}
+    self._entries[key] = entry
+    self._entries.move_to_end(key)
+    task.add_done_callback(lambda done: self._finished(key, entry, done))
+    self.executions += 1
+
+    # 처리가 끝난 항목부터 오래된 순으로 정리 (처리 중인 항목은 유지)
+    if len(self._entries) > self.max_entries:
+      for old_key in [old_key for old_key, old in self._entries.items() if old["task"].done()][:len(self._entries) - self.max_entries]:
+        del self._entries[old_key]
+
+    return await asyncio.shield(task), False
+
+  def stats(self) -> dict:
+    return {
+      "entries": len(self._entries),
+      "in_flight": sum(1 for entry in self._entries.values() if not entry["task"].done()),
+      "executions": self.executions,
+      "coalesced": self.coalesced,
+      "replayed": self.replayed,
+    }
+
+
+idempotency_store = IdempotencyStore()
@@ -0,0 +1,260 @@
+import asyncio
+import os
+import re
+import time
+from datetime import timedelta
+from typing import Iterable, List, Tuple
+
+from fastapi import UploadFile
+from sqlalchemy import select, update, delete, case, exists, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.database.session import AsyncSessionLocal, async_engine
+from app.models.models import Image, ImageMapping, ImagePrompt
+from app.services.upload import upload_service
+
+CHARACTER_IMAGE_DIR = "app/uploads/characters/" # 캐릭터 이미지 파일 저장 경로
+IMAGE_GC_LOCK_KEY = 25025 # 여러 워커 중 하나만 정리하도록 잡는 advisory lock 키
+
+# 정리 대상이 될 수 있는 파일명 - 내용 주소 이미지와 업로드 중 남은 임시 파일만 (그 외 파일은 건드리지 않음)
+SWEEPABLE_FILE = re.compile(r"[0-9a-f]{64}\.\w+|\.[0-9a-f]{32}\.part")
+
+
+def release_update(img_idx: int):
+  """
+  이미지 참조를 하나 해제하는 UPDATE 문 (0 아래로 내려가지 않음, 0이 되면 released_at 기록)
+  """
+  return (
+    update(Image)
+    .where(Image.img_idx == img_idx)
+    .values(
+      ref_count=func.greatest(Image.ref_count - 1, 0),
+      released_at=case((Image.ref_count <= 1, func.now()), else_=Image.released_at),
+    )
+  )
+
+
+def _remove_file(path: str, modified_before: float) -> bool:
+  """
+  파일이 modified_before 이전에 마지막으로 쓰였으면 지웁니다. (그 뒤에 같은 내용을 다시 올렸으면 남겨 둠)
+  """
+  try:
+    if os.stat(path).st_mtime >= modified_before:
+      return False
+    os.remove(path)
+    return True
+  except FileNotFoundError:
+    return False
+
+
+def _stale_files(directory: str, modified_before: float) -> List[str]:
+  try:
+    entries = list(os.scandir(directory))
+  except FileNotFoundError:
+    return []
+  return [
+    entry.name for entry in entries
+    if SWEEPABLE_FILE.fullmatch(entry.name)
+    and entry.is_file(follow_symlinks=False) and entry.stat(follow_symlinks=False).st_mtime < modified_before
+  ]
+
+
+class ImageStore:
+  """
+  캐릭터 이미지 저장소 (내용 주소 방식).
+  업로드한 이미지를 내용의 sha256 이름({해시}.{확장자})으로 저장해서 같은 이미지는 파일 하나와 images 행 하나를 같이 씁니다.
+  images.ref_count는 이미지를 가리키는 image_mapping 행 수이며, 매핑을 추가/교체하는 트랜잭션에서 같이 증감합니다.
+
+  참조가 없는 이미지는 바로 지우지 않고, 정리(sweep)에서 grace초가 지난 것만 지웁니다.
+  - ref_count가 0인 내용 주소 images 행과 그 파일
+  - 어떤 images 행도 가리키지 않는 내용 주소 파일(롤백된 업로드)과 중단된 업로드의 임시 파일
+  이전 방식으로 저장한 이미지(content_hash가 NULL)와 직접 넣은 파일은 지우지 않습니다.
+  파일은 정리를 시작한 뒤에 다시 쓰였으면(같은 내용이 다시 업로드됨) 지우지 않습니다.
+  정리는 IMAGE_GC_ENABLED인 워커에서만 주기적으로 돌고, advisory lock으로 한 번에 한 곳에서만 실행됩니다.
+  """
+
+  def __init__(
+    self,
+    directory: str = CHARACTER_IMAGE_DIR,
+    enabled: bool = settings.IMAGE_GC_ENABLED,
+    interval: float = settings.IMAGE_GC_INTERVAL,
+    grace: float = settings.IMAGE_GC_GRACE,
+    batch_size: int = settings.IMAGE_GC_BATCH_SIZE,
+  ):
+    self.directory = directory
+    self.enabled = enabled
+    self.interval = interval
+    self.grace = grace
+    self.batch_size = batch_size
+    self._worker = None
+
+    # 통계
+    self.stored = 0
+    self.deduplicated = 0
+    self.released = 0
+    self.sweeps = 0
+    self.skipped_sweeps = 0
+    self.swept_images = 0
+    self.swept_files = 0
+    self.failures = 0
+    self.last_sweep_seconds = 0.0
+
+  async def put(self, db: AsyncSession, upload: UploadFile) -> Tuple[int, str]:
+    """
+    업로드 이미지를 저장하고 참조를 하나 추가한 뒤 (img_idx, file_path)를 반환합니다.
+    같은 내용의 이미지가 이미 있으면 그 행의 참조 수만 늘립니다.
+    """
+    file_path = await upload_service.save_image(upload, self.directory, content_addressed=True)
+    content_hash = os.path.splitext(os.path.basename(file_path))[0]
+
+    stmt = insert(Image).values(file_path=file_path, content_hash=content_hash, ref_count=1)
+    stmt = stmt.on_conflict_do_update(
+      index_elements=[Image.content_hash],
+      index_where=Image.content_hash.isnot(None),
+      set_={"ref_count": Image.ref_count + 1, "released_at": None},
+    ).returning(Image.img_idx, Image.file_path, Image.ref_count)
+    img_idx, file_path, ref_count = (await db.execute(stmt)).one()
+
+    self.stored += 1
+    if ref_count > 1:
+      self.deduplicated += 1
+    return img_idx, file_path
+
+  async def release(self, db: AsyncSession, img_idx: int):
+    await db.execute(release_update(img_idx))
+    self.released += 1
+
+  async def attach(self, db: AsyncSession, char_idx: int, upload: UploadFile) -> str:
+    """
+    업로드 이미지를 캐릭터 이미지로 지정하고 파일 경로를 반환합니다.
+    기존 매핑은 지우고 기존 이미지의 참조를 해제합니다. (캐릭터마다 매핑은 하나)
+    """
+    img_idx, file_path = await self.put(db, upload)
+
+    mappings = (await db.execute(select(ImageMapping).where(ImageMapping.char_idx == char_idx))).scalars().all()
+    mapped = False
+    for mapping in mappings:
+      if mapping.img_idx == img_idx:
+        # 같은 이미지를 다시 올림 - 매핑은 그대로 두고 put에서 늘린 참조만 되돌림
+        mapping.is_active = True
+        await self.release(db, img_idx)
+        mapped = True
+      else:
+        await db.delete(mapping)
+        await self.release(db, mapping.img_idx)
+    if not mapped:
+      db.add(ImageMapping(char_idx=char_idx, img_idx=img_idx, is_active=True))
+    return file_path
+
+  def start(self):
+    """
+    백그라운드 정리를 시작합니다. (앱 시작 시 호출, IMAGE_GC_ENABLED가 아니면 아무것도 하지 않음)
+    """
+    if self.enabled and self._worker is None:
+      self._worker = asyncio.create_task(self._run())
+
+  async def _run(self):
+    while True:
+      try:
+        await self.sweep()
+      except Exception as e:
+        self.failures += 1
+        print(f"이미지 정리 실패: {str(e)}")
+      await asyncio.sleep(self.interval)
+
+  async def sweep(self) -> Tuple[int, int]:
+    """
+    참조가 없는 이미지와 파일을 정리하고 (지운 행 수, 지운 파일 수)를 반환합니다.
+    다른 곳에서 정리 중이면 건너뜁니다.
+    """
+    started = time.time()
+    # 세션은 배치마다 커밋하며 커넥션을 반납하므로, 잠금은 별도 커넥션에서 정리가 끝날 때까지 잡고 있음
+    async with async_engine.connect() as lock_connection:
+      if not (await lock_connection.execute(select(func.pg_try_advisory_lock(IMAGE_GC_LOCK_KEY)))).scalar():
+        self.skipped_sweeps += 1
+        return 0, 0
+      try:
+        async with AsyncSessionLocal() as db:
+          images = await self._sweep_images(db, started)
+          files = await self._sweep_files(db, started - self.grace)
+      finally:
+        await lock_connection.execute(select(func.pg_advisory_unlock(IMAGE_GC_LOCK_KEY)))
+    self.sweeps += 1
+    self.swept_images += images
+    self.swept_files += files
+    self.last_sweep_seconds = time.time() - started
+    return images, files
+
+  async def _sweep_images(self, db: AsyncSession, started: float) -> int:
+    unreferenced = (
+      (Image.ref_count == 0)
+      & Image.content_hash.isnot(None)
+      & (Image.released_at < func.now() - timedelta(seconds=self.grace))
+      & ~exists().where(ImagePrompt.img_idx == Image.img_idx)
+    )
+    total = 0
+    last_img_idx = 0
+    while True:
+      img_idxs = (await db.execute(
+        select(Image.img_idx)
+        .where(unreferenced, Image.img_idx > last_img_idx)
+        .order_by(Image.img_idx)
+        .limit(self.batch_size)
+      )).scalars().all()
+      if not img_idxs:
+        return total
+      last_img_idx = img_idxs[-1]
+
+      # 조건을 다시 걸어서 지움 (그 사이에 같은 이미지가 다시 업로드됐으면 남김)
+      file_paths = (await db.execute(
+        delete(Image).where(Image.img_idx.in_(img_idxs), unreferenced).returning(Image.file_path)
+      )).scalars().all()
+      await db.commit()
+      total += len(file_paths)
+      # 행을 지운 뒤에 파일을 지움 (파일이 먼저 없어지면 아직 남은 행이 없는 파일을 가리킴)
+      await self._remove_files(file_paths, started)
+
+  async def _sweep_files(self, db: AsyncSession, modified_before: float) -> int:
+    names = await asyncio.to_thread(_stale_files, self.directory, modified_before)
+    if not names:
+      return 0
+    referenced = {
+      os.path.basename(file_path)
+      for file_path in (await db.execute(select(Image.file_path))).scalars()
+    }
+    await db.rollback()
+    return await self._remove_files(
+      [os.path.join(self.directory, name) for name in names if name not in referenced],
+      modified_before,
+    )
+
+  async def _remove_files(self, file_paths: Iterable[str], modified_before: float) -> int:
+    removed = 0
+    for file_path in file_paths:
+      if await asyncio.to_thread(_remove_file, file_path, modified_before):
+        removed += 1
+    return removed
+
+  def stats(self) -> dict:
+    return {
+      "stored": self.stored,
+      "deduplicated": self.deduplicated,
+      "released": self.released,
+      "enabled": self.enabled,
+      "sweeps": self.sweeps,
+      "skipped_sweeps": self.skipped_sweeps,
+      "swept_images": self.swept_images,
+      "swept_files": self.swept_files,
+      "failures": self.failures,
+      "last_sweep_seconds": round(self.last_sweep_seconds, 3),
+    }
+
+  async def close(self):
+    if self._worker is not None:
+      self._worker.cancel()
+      self._worker = None
+
+
+image_store = ImageStore()
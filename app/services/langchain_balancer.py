@@ -0,0 +1,189 @@
+import asyncio
+import bisect
+import hashlib
+import time
+from typing import AsyncIterator, Iterator, List
+
+from app.core.config import settings
+from app.services.langchain_client import LangChainConnectionPool
+
+
+def _hash(key: str) -> int:
+  return int(hashlib.md5(key.encode("utf-8")).hexdigest()[:16], 16)
+
+
+class ConsistentHashRing:
+  """
+  가상 노드를 사용하는 일관된 해시 링.
+  노드가 추가/제거되어도 해당 노드 구간의 키만 이동합니다.
+  """
+
+  def __init__(self, vnodes: int = settings.LANGCHAIN_VNODES):
+    self.vnodes = vnodes
+    self._points = [] # 정렬된 해시 값
+    self._owners = [] # _points와 같은 순서의 노드
+
+  def add(self, node: str):
+    for replica in range(self.vnodes):
+      point = _hash(f"{node}#{replica}")
+      index = bisect.bisect(self._points, point)
+      self._points.insert(index, point)
+      self._owners.insert(index, node)
+
+  def remove(self, node: str):
+    keep = [(point, owner) for point, owner in zip(self._points, self._owners) if owner != node]
+    self._points = [point for point, _ in keep]
+    self._owners = [owner for _, owner in keep]
+
+  def nodes_for(self, key: str) -> Iterator[str]:
+    """
+    키 위치에서 시계 방향으로 만나는 노드를 중복 없이 차례로 반환합니다.
+    """
+    if not self._points:
+      return
+    start = bisect.bisect(self._points, _hash(key))
+    seen = set()
+    for offset in range(len(self._points)):
+      owner = self._owners[(start + offset) % len(self._points)]
+      if owner not in seen:
+        seen.add(owner)
+        yield owner
+
+
+class _Backend:
+  """
+  LangChain 서버 하나의 커넥션 풀과 상태(헬스, 지연 시간) 정보
+  """
+
+  def __init__(self, uri: str, balancer: "LangChainBalancer"):
+    self.uri = uri
+    # v1 서버는 연결 주소의 ?room_id=로 채팅방을 구분하므로 커넥션을 채팅방별로 씀 (v2 서버는 요청 데이터의 room_id를 읽음)
+    self.pool = LangChainConnectionPool(f"{uri}/ws/generate/", room_query=settings.LANGCHAIN_PROTOCOL_VERSION < 2)
+    self.balancer = balancer
+    self.consecutive_failures = 0
+    self.ejected_until = 0.0
+    self.requests = 0
+    self.errors = 0
+    self.ignored_timeouts = 0
+    self.latency_ewma = None
+    self.latency_max = 0.0
+    self.last_error = None
+
+  @property
+  def healthy(self) -> bool:
+    return time.monotonic() >= self.ejected_until
+
+  def _record(self, latency: float, error: Exception = None):
+    self.requests += 1
+    if error is None:
+      self.consecutive_failures = 0
+      self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+      self.latency_max = max(self.latency_max, latency)
+      return
+    self.errors += 1
+    self.consecutive_failures += 1
+    self.last_error = str(error) or type(error).__name__
+    if self.consecutive_failures >= self.balancer.eject_failures:
+      # 연속 실패 시 일정 시간 동안 라우팅에서 제외, 이후 다시 시도해서 실패하면 바로 재제외
+      self.ejected_until = time.monotonic() + self.balancer.eject_seconds
+      print(f"LangChain 서버 제외: {self.uri} ({self.last_error})")
+
+  async def stream(self, payload: dict, count_timeouts: bool = True) -> AsyncIterator[dict]:
+    """
+    count_timeouts가 False면 응답 시간 초과를 서버 실패로 세지 않습니다. (요약처럼 원래 오래 걸리는 백그라운드 요청)
+    """
+    started = time.monotonic()
+    try:
+      async for message in self.pool.stream(payload):
+        yield message
+    except asyncio.TimeoutError as e:
+      if count_timeouts:
+        self._record(time.monotonic() - started, e)
+      else:
+        self.ignored_timeouts += 1
+      raise
+    except Exception as e:
+      self._record(time.monotonic() - started, e)
+      raise
+    self._record(time.monotonic() - started)
+
+  async def request(self, payload: dict, count_timeouts: bool = True) -> dict:
+    response = None
+    async for message in self.stream(payload, count_timeouts):
+      response = message
+    return response
+
+  def stats(self) -> dict:
+    return {
+      "uri": self.uri,
+      "healthy": self.healthy,
+      "consecutive_failures": self.consecutive_failures,
+      "requests": self.requests,
+      "errors": self.errors,
+      "ignored_timeouts": self.ignored_timeouts,
+      "latency_ewma": round(self.latency_ewma, 6) if self.latency_ewma is not None else None,
+      "latency_max": round(self.latency_max, 6),
+      "last_error": self.last_error,
+      "pool": self.pool.stats(),
+    }
+
+
+class LangChainBalancer:
+  """
+  room_id 기준으로 LangChain 서버를 고르는 로드 밸런서.
+  같은 채팅방은 항상 같은 서버로 가서 서버 쪽 캐시(페르소나, 대화 기록)가 유지되고,
+  제외된 서버의 채팅방만 링의 다음 서버로 넘어갑니다.
+  """
+
+  def __init__(
+    self,
+    uris: List[str],
+    vnodes: int = settings.LANGCHAIN_VNODES,
+    eject_failures: int = settings.LANGCHAIN_EJECT_FAILURES,
+    eject_seconds: float = settings.LANGCHAIN_EJECT_SECONDS,
+  ):
+    self.eject_failures = eject_failures
+    self.eject_seconds = eject_seconds
+    self.ring = ConsistentHashRing(vnodes)
+    self.backends = {}
+    for uri in uris:
+      self.add_backend(uri)
+
+  def add_backend(self, uri: str):
+    if uri in self.backends:
+      return
+    self.backends[uri] = _Backend(uri, self)
+    self.ring.add(uri)
+
+  async def remove_backend(self, uri: str):
+    backend = self.backends.pop(uri, None)
+    if backend is None:
+      return
+    self.ring.remove(uri)
+    await backend.pool.close()
+
+  def backend_for(self, room_id: str) -> _Backend:
+    """
+    링에서 room_id 다음의 정상 서버를 반환합니다. 모두 제외 상태면 원래 담당 서버를 반환합니다.
+    """
+    primary = None
+    for uri in self.ring.nodes_for(room_id):
+      backend = self.backends[uri]
+      primary = primary or backend
+      if backend.healthy:
+        return backend
+    if primary is None:
+      raise RuntimeError("등록된 LangChain 서버가 없습니다.")
+    return primary
+
+  def stats(self) -> dict:
+    return {
+      "backends": [backend.stats() for backend in self.backends.values()],
+    }
+
+  async def close(self):
+    for backend in self.backends.values():
+      await backend.pool.close()
+
+
+langchain_balancer = LangChainBalancer(settings.WS_SERVER_DOMAINS)
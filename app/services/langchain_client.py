@@ -0,0 +1,342 @@
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import deque
+from typing import AsyncIterator, Optional
+from urllib.parse import quote
+
+import websockets
+
+from app.core.config import settings
+
+
+class LangChainError(Exception):
+  """
+  LangChain 서버와의 통신 실패 (연결 끊김, 재연결 실패 등)
+  """
+
+
+class _PooledConnection:
+  """
+  풀에 속한 하나의 WebSocket 커넥션.
+  여러 요청이 request_id로 구분되어 하나의 커넥션을 공유합니다.
+  서버가 응답에 request_id를 돌려주는 것을 확인하기 전까지는 동시에 한 요청만 보냅니다.
+  (request_id가 없는 응답은 어느 요청의 것인지 알 수 없으므로 추측하지 않음)
+  풀이 room_query이면 커넥션은 room_id 채팅방 전용이며, 연결 주소에도 ?room_id=를 붙입니다.
+  """
+
+  def __init__(self, pool: "LangChainConnectionPool", index: int):
+    self.pool = pool
+    self.index = index
+    self.websocket = None
+    self.reader_task: Optional[asyncio.Task] = None
+    self.pending = {}  # request_id -> asyncio.Queue (응답 메시지 전달용)
+    self.connect_lock = asyncio.Lock()
+    self.send_lock = asyncio.Lock()
+    self.ever_connected = False
+    self.echoes_request_id = False # 이 커넥션의 서버가 응답에 request_id를 돌려주는지 (연결마다 다시 확인)
+    self.room_id = None # room_query일 때 이 커넥션을 쓰는 채팅방 (요청을 배정할 때 정함)
+    self.connected_room_id = None # 현재 WebSocket을 연결한 주소의 채팅방
+
+  @property
+  def connected(self) -> bool:
+    return self.websocket is not None
+
+  @property
+  def capacity(self) -> int:
+    return self.pool.max_in_flight if self.echoes_request_id else 1
+
+  def _ready(self) -> bool:
+    return self.websocket is not None and (not self.pool.room_query or self.connected_room_id == self.room_id)
+
+  async def ensure_connected(self):
+    """
+    커넥션이 없으면 지수 백오프로 재시도하며 연결합니다.
+    room_query이면 다른 채팅방 주소로 연결되어 있을 때 이 커넥션의 채팅방 주소로 다시 연결합니다.
+    """
+    if self._ready():
+      return
+    async with self.connect_lock:
+      if self._ready():
+        return
+      switching = self.websocket is not None
+      if switching:
+        # 이전 채팅방의 요청은 모두 끝났음 (요청이 없는 커넥션만 다른 채팅방에 배정됨)
+        self.abandon()
+        self.pool.room_switches_total += 1
+      room_id = self.room_id
+      uri = self.pool.connect_uri(room_id)
+      last_error = None
+      for attempt in range(self.pool.reconnect_retries + 1):
+        if attempt:
+          await asyncio.sleep(self.pool.backoff_delay(attempt))
+        try:
+          websocket = await websockets.connect(uri)
+        except Exception as e:
+          last_error = e
+          print(f"LangChain 연결 실패 ({uri}, 시도 {attempt + 1}): {str(e)}")
+          continue
+        if self.ever_connected and not switching:
+          self.pool.reconnects_total += 1
+        self.ever_connected = True
+        self.echoes_request_id = False
+        self.connected_room_id = room_id
+        self.websocket = websocket
+        self.reader_task = asyncio.create_task(self._read_loop(websocket))
+        return
+      raise LangChainError(f"LangChain 서버에 연결할 수 없습니다: {str(last_error)}")
+
+  async def send(self, payload: dict):
+    async with self.send_lock:
+      if self.websocket is None:
+        raise LangChainError("WebSocket 연결이 닫혔습니다.")
+      await self.websocket.send(json.dumps(payload))
+
+  def _route(self, message: dict) -> Optional[asyncio.Queue]:
+    request_id = message.get("request_id")
+    if request_id is not None:
+      if not self.echoes_request_id:
+        # request_id를 돌려주는 서버 - 이제부터 여러 요청을 같이 보냄
+        self.echoes_request_id = True
+        self.pool._wake_all()
+      # 시간 초과 등으로 포기한 요청의 늦은 응답은 pending에 없으므로 버려짐
+      return self.pending.get(request_id)
+    if not self.echoes_request_id and len(self.pending) == 1:
+      # request_id를 돌려주지 않는 서버는 커넥션당 한 요청만 보내므로 그 요청의 응답
+      return next(iter(self.pending.values()))
+    return None
+
+  async def _read_loop(self, websocket):
+    """
+    커넥션에서 들어오는 메시지를 request_id에 맞는 요청으로 분배합니다.
+    """
+    error = None
+    try:
+      async for raw in websocket:
+        try:
+          message = json.loads(raw)
+        except ValueError as e:
+          message = e
+        if not isinstance(message, dict):
+          # 깨진 메시지 하나 때문에 같은 커넥션의 다른 요청까지 실패시키지 않음
+          self.pool.malformed_total += 1
+          print(f"LangChain 메시지를 해석할 수 없습니다 ({self.pool.uri}): {str(raw)[:200]}")
+          continue
+        queue = self._route(message)
+        if queue is None:
+          self.pool.unmatched_total += 1
+          print(f"LangChain 응답을 보낼 요청이 없습니다 ({self.pool.uri}, request_id={message.get('request_id')})")
+          continue
+        queue.put_nowait(message)
+    except Exception as e:
+      error = e
+    finally:
+      # close()/abandon()으로 버린 커넥션이면 대기 중인 요청은 그쪽에서 처리함
+      if self.websocket is websocket:
+        self.websocket = None
+        reason = f"WebSocket 연결이 닫혔습니다: {str(error)}" if error else "WebSocket 연결이 닫혔습니다."
+        self._fail_pending(reason)
+
+  def _fail_pending(self, reason: str):
+    for queue in self.pending.values():
+      queue.put_nowait(LangChainError(reason))
+
+  def abandon(self):
+    """
+    응답을 끝까지 받지 못한 요청이 있을 때 커넥션을 버립니다.
+    request_id를 돌려주지 않는 서버에서는 남은 응답이 다음 요청의 응답으로 섞이기 때문입니다.
+    """
+    websocket, self.websocket = self.websocket, None
+    if websocket is not None:
+      asyncio.create_task(websocket.close())
+
+  async def close(self):
+    websocket, self.websocket = self.websocket, None
+    self._fail_pending("WebSocket 연결이 닫혔습니다.")
+    if websocket is not None:
+      await websocket.close()
+    if self.reader_task is not None:
+      self.reader_task.cancel()
+      self.reader_task = None
+
+
+class LangChainConnectionPool:
+  """
+  LangChain WebSocket 서버에 대한 장기 커넥션 풀.
+  커넥션은 처음 필요할 때 열리고, 끊기면 다음 요청에서 백오프와 함께 다시 연결됩니다.
+
+  room_query: 연결 주소의 ?room_id=로 채팅방을 구분하는 기존(v1) 서버용.
+  커넥션 하나는 한 채팅방의 요청만 보내고, 다른 채팅방이 쓰려면 요청이 없을 때 그 채팅방 주소로 다시 연결합니다.
+  room_id는 요청 데이터에도 그대로 담겨 있으므로, 요청 데이터의 room_id를 읽는 서버는 room_query 없이 커넥션을 공유합니다.
+  """
+
+  def __init__(
+    self,
+    uri: str,
+    size: int = settings.LANGCHAIN_POOL_SIZE,
+    max_in_flight: int = settings.LANGCHAIN_MAX_IN_FLIGHT,
+    timeout: float = settings.LANGCHAIN_TIMEOUT,
+    reconnect_retries: int = settings.LANGCHAIN_RECONNECT_RETRIES,
+    backoff_base: float = settings.LANGCHAIN_BACKOFF_BASE,
+    backoff_max: float = settings.LANGCHAIN_BACKOFF_MAX,
+    room_query: bool = False,
+  ):
+    self.uri = uri
+    self.room_query = room_query
+    self.max_in_flight = max_in_flight
+    self.timeout = timeout
+    self.reconnect_retries = reconnect_retries
+    self.backoff_base = backoff_base
+    self.backoff_max = backoff_max
+    self.connections = [_PooledConnection(self, index) for index in range(size)]
+    self._waiters = deque()
+
+    # 통계
+    self.requests_total = 0
+    self.errors_total = 0
+    self.reconnects_total = 0
+    self.wait_seconds_total = 0.0
+    self.unmatched_total = 0
+    self.malformed_total = 0
+    self.room_switches_total = 0
+
+  def connect_uri(self, room_id: Optional[str]) -> str:
+    if self.room_query and room_id is not None:
+      return f"{self.uri}?room_id={quote(str(room_id), safe='')}"
+    return self.uri
+
+  def backoff_delay(self, attempt: int) -> float:
+    # 지수 백오프 + 지터
+    delay = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+    return random.uniform(delay / 2, delay)
+
+  def _usable(self, conn: _PooledConnection, room_id: Optional[str]) -> bool:
+    if len(conn.pending) >= conn.capacity:
+      return False
+    # room_query이면 다른 채팅방의 요청이 남아 있는 커넥션은 쓸 수 없음
+    return not self.room_query or conn.room_id == room_id or not conn.pending
+
+  def _pick(self, room_id: Optional[str]) -> _PooledConnection:
+    # 자리가 있는 커넥션 중 (room_query이면 같은 채팅방에 연결된 커넥션 우선) 요청이 가장 적은 커넥션 우선, 같으면 이미 연결된 커넥션 우선
+    return min(self.connections, key=lambda conn: (
+      not self._usable(conn, room_id),
+      self.room_query and conn.connected_room_id != room_id,
+      len(conn.pending),
+      not conn.connected,
+    ))
+
+  async def _acquire(self, request_id: str, queue: asyncio.Queue, room_id: Optional[str]) -> _PooledConnection:
+    started = time.monotonic()
+    while True:
+      conn = self._pick(room_id)
+      if self._usable(conn, room_id):
+        conn.room_id = room_id
+        conn.pending[request_id] = queue
+        self.wait_seconds_total += time.monotonic() - started
+        return conn
+      waiter = asyncio.get_running_loop().create_future()
+      self._waiters.append(waiter)
+      try:
+        await waiter
+      except asyncio.CancelledError:
+        if waiter.done() and not waiter.cancelled():
+          self._wake_next()
+        raise
+
+  def _wake_next(self):
+    while self._waiters:
+      waiter = self._waiters.popleft()
+      if not waiter.done():
+        waiter.set_result(None)
+        return
+
+  def _wake_all(self):
+    while self._waiters:
+      waiter = self._waiters.popleft()
+      if not waiter.done():
+        waiter.set_result(None)
+
+  def _release(self, conn: _PooledConnection, request_id: str):
+    conn.pending.pop(request_id, None)
+    if self.room_query:
+      # 깨운 요청이 다른 채팅방이면 이 커넥션을 못 쓸 수 있으므로 모두 다시 확인
+      self._wake_all()
+    else:
+      self._wake_next()
+
+  async def stream(self, payload: dict) -> AsyncIterator[dict]:
+    """
+    요청을 보내고 서버 메시지를 순서대로 돌려줍니다.
+    type이 "token"인 메시지는 중간 결과이며, 그 외의 메시지를 받으면 종료합니다.
+    """
+    request_id = uuid.uuid4().hex
+    queue = asyncio.Queue()
+    conn = await self._acquire(request_id, queue, payload.get("room_id"))
+    self.requests_total += 1
+    finished = False
+    try:
+      await conn.ensure_connected()
+      await conn.send({**payload, "request_id": request_id})
+      while True:
+        message = await asyncio.wait_for(queue.get(), timeout=self.timeout)
+        if isinstance(message, Exception):
+          raise message
+        if message.get("type") != "token":
+          finished = True
+        yield message
+        if finished:
+          return
+    except Exception:
+      self.errors_total += 1
+      raise
+    finally:
+      if not finished and not conn.echoes_request_id:
+        # 늦게 오는 응답을 다음 요청과 구분할 수 없으므로 커넥션을 버림
+        conn.abandon()
+      self._release(conn, request_id)
+
+  async def request(self, payload: dict) -> dict:
+    """
+    요청을 보내고 최종 응답 메시지만 반환합니다.
+    """
+    response = None
+    async for message in self.stream(payload):
+      response = message
+    return response
+
+  def stats(self) -> dict:
+    in_flight = sum(len(conn.pending) for conn in self.connections)
+    capacity = sum(conn.capacity for conn in self.connections)
+    return {
+      "uri": self.uri,
+      "size": len(self.connections),
+      "connected": sum(1 for conn in self.connections if conn.connected),
+      "in_flight": in_flight,
+      "capacity": capacity,
+      "occupancy": in_flight / capacity if capacity else 0.0,
+      "waiting": sum(1 for waiter in self._waiters if not waiter.done()),
+      "requests_total": self.requests_total,
+      "errors_total": self.errors_total,
+      "reconnects_total": self.reconnects_total,
+      "wait_seconds_total": round(self.wait_seconds_total, 6),
+      "unmatched_total": self.unmatched_total,
+      "malformed_total": self.malformed_total,
+      "room_query": self.room_query,
+      "room_switches_total": self.room_switches_total,
+      "connections": [
+        {
+          "index": conn.index,
+          "connected": conn.connected,
+          "in_flight": len(conn.pending),
+          "echoes_request_id": conn.echoes_request_id,
+          "room_id": conn.connected_room_id if self.room_query else None,
+        }
+        for conn in self.connections
+      ],
+    }
+
+  async def close(self):
+    for conn in self.connections:
+      await conn.close()
@@ -0,0 +1,152 @@
+import threading
+from collections import OrderedDict
+from typing import AsyncIterator, List
+
+from app.core.config import settings
+from app.services.chat_history import Turn, render_history
+
+# LangChain 서버가 등록 정보를 잃어버렸을 때(재시작 등) 보내는 에러 코드
+CACHE_MISS_ERRORS = ("persona_cache_miss", "history_cache_miss")
+
+
+def build_full_payload(room_id: str, room: dict, persona: dict, history: dict, user_message: str, memories: List[Turn] = (), summary: str = "") -> dict:
+  """
+  v1 요청: 페르소나와 전체 대화 내역을 매번 함께 보냅니다.
+  """
+  return {
+    "room_id": room_id,
+    "user_message": user_message,
+    **persona, # 캐릭터 이름, 호칭, 외형, 성격, 배경, 말투, 예시 대화
+    "user_unique_name": room["user_unique_name"], # 캐릭터가 사용자에게 부르는 이름 (nickname보다 우선순위)
+    "user_introduction": room["user_introduction"], # 캐릭터한테 사용자를 소개하는 글
+    "favorability": room["favorability"], # 호감도
+    "history_summary": summary, # 최근 대화 이전의 대화 요약
+    "chat_history": render_history(history["turns"]), # 채팅 기록 (최근 대화)
+    "related_history": render_history(memories), # 새 메시지와 관련된 예전 대화
+  }
+
+
+class PersonaDeltaProtocol:
+  """
+  v2 요청 프로토콜. (LANGCHAIN_PROTOCOL_VERSION=2일 때만 사용, 기본값 1은 기존 서버와 같은 전체 요청)
+  char_prompt_id별 페르소나를 서버(백엔드 URI)마다 한 번만 등록하고,
+  이후에는 프롬프트 id, 호감도, 새 메시지와 서버가 아직 보지 못한 대화(delta)만 보냅니다.
+  서버가 캐시 미스를 알리면 v1 전체 요청으로 다시 보냅니다.
+  """
+
+  def __init__(self, version: int = settings.LANGCHAIN_PROTOCOL_VERSION, max_entries: int = settings.LANGCHAIN_REGISTRY_SIZE):
+    self.version = version
+    self.max_entries = max_entries
+    self._registered = OrderedDict() # (uri, char_prompt_id) -> True
+    self._acked = OrderedDict() # (uri, room_id) -> (epoch, last_seq) 서버가 알고 있는 대화 위치
+    self._lock = threading.Lock()
+
+    # 통계
+    self.registrations = 0
+    self.delta_requests = 0
+    self.full_requests = 0
+    self.cache_misses = 0
+
+  def _remember(self, table: OrderedDict, key, value):
+    with self._lock:
+      table[key] = value
+      table.move_to_end(key)
+      while len(table) > self.max_entries:
+        table.popitem(last=False)
+
+  def _forget(self, uri: str, room_id: str, char_prompt_id: int):
+    with self._lock:
+      self._registered.pop((uri, char_prompt_id), None)
+      self._acked.pop((uri, room_id), None)
+
+  async def _ensure_registered(self, backend, char_prompt_id: int, persona: dict):
+    key = (backend.uri, char_prompt_id)
+    if key in self._registered:
+      return
+    await backend.request({
+      "type": "register_persona",
+      "protocol_version": self.version,
+      "char_prompt_id": char_prompt_id,
+      "persona": persona,
+    })
+    self.registrations += 1
+    self._remember(self._registered, key, True)
+
+  def _delta_payload(self, backend, room_id: str, room: dict, history: dict, user_message: str, memories: List[Turn], summary: str) -> dict:
+    acked = self._acked.get((backend.uri, room_id))
+    missing = history["last_seq"] - acked[1] if acked and acked[0] == history["epoch"] else None
+    reset = missing is None or missing < 0 or missing > len(history["turns"])
+    delta = history["turns"] if reset else history["turns"][len(history["turns"]) - missing:]
+    return {
+      "type": "chat",
+      "protocol_version": self.version,
+      "room_id": room_id,
+      "char_prompt_id": room["char_prompt_id"],
+      "user_message": user_message,
+      "user_unique_name": room["user_unique_name"],
+      "user_introduction": room["user_introduction"],
+      "favorability": room["favorability"],
+      "history_delta": [{"speaker": speaker, "text": text} for speaker, text in delta],
+      "history_reset": reset, # True면 서버는 기존 대화 기록을 history_delta로 교체
+      "history_summary": summary, # 최근 대화 이전의 대화 요약
+      "related_history": [{"speaker": speaker, "text": text} for speaker, text in memories], # 이번 요청에만 쓰는 예전 대화
+    }
+
+  async def stream(
+    self,
+    backend,
+    room_id: str,
+    room: dict,
+    persona: dict,
+    history: dict,
+    user_message: str,
+    stream: bool = False,
+    memories: List[Turn] = (),
+    summary: str = "",
+  ) -> AsyncIterator[dict]:
+    """
+    한 턴의 요청을 보내고 서버 메시지를 그대로 돌려줍니다.
+    """
+    options = {"stream": True} if stream else {}
+    full_payload = {**build_full_payload(room_id, room, persona, history, user_message, memories, summary), **options}
+
+    if self.version < 2:
+      self.full_requests += 1
+      async for message in backend.stream(full_payload):
+        yield message
+      return
+
+    await self._ensure_registered(backend, room["char_prompt_id"], persona)
+    self.delta_requests += 1
+    missed = False
+    async for message in backend.stream({**self._delta_payload(backend, room_id, room, history, user_message, memories, summary), **options}):
+      if message.get("error") in CACHE_MISS_ERRORS:
+        missed = True
+        continue
+      yield message
+
+    if missed:
+      # 서버가 페르소나/대화 기록을 잃어버린 경우 전체 요청으로 재전송, 다음 턴에 다시 등록
+      self.cache_misses += 1
+      self.full_requests += 1
+      self._forget(backend.uri, room_id, room["char_prompt_id"])
+      async for message in backend.stream(full_payload):
+        yield message
+      return
+
+    # 서버는 이번 사용자 메시지와 자신의 응답까지 알고 있음
+    self._remember(self._acked, (backend.uri, room_id), (history["epoch"], history["last_seq"] + 2))
+
+  def stats(self) -> dict:
+    return {
+      "protocol_version": self.version,
+      "registered_personas": len(self._registered),
+      "tracked_rooms": len(self._acked),
+      "registrations": self.registrations,
+      "delta_requests": self.delta_requests,
+      "full_requests": self.full_requests,
+      "cache_misses": self.cache_misses,
+    }
+
+
+langchain_protocol = PersonaDeltaProtocol()
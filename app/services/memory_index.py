@@ -0,0 +1,212 @@
+import asyncio
+import importlib
+import zlib
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+MemoryRow = Tuple[int, Optional[str], str] # (순번, 화자, 내용)
+Embedding = Callable[[List[str], int], np.ndarray] # (문장 목록, 차원) -> (문장 수, 차원) 행렬
+
+
+def hashing_embedding(texts: List[str], dim: int) -> np.ndarray:
+  """
+  외부 모델 없이 쓰는 기본 임베딩.
+  단어와 글자 bigram을 해시해서 dim 차원에 더하고(부호 해싱), 행마다 L2 정규화합니다.
+  """
+  matrix = np.zeros((len(texts), dim), dtype=np.float32)
+  for row, text in enumerate(texts):
+    words = text.lower().split()
+    features = words + [word[i:i + 2] for word in words for i in range(len(word) - 1)]
+    if not features:
+      continue
+    hashes = np.fromiter((zlib.crc32(feature.encode("utf-8")) for feature in features), dtype=np.uint32, count=len(features))
+    signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+    np.add.at(matrix[row], hashes % dim, signs)
+  norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+  return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def load_embedding(path: str) -> Embedding:
+  """
+  "모듈:함수" 형식의 경로로 임베딩 함수를 불러옵니다.
+  """
+  module_name, _, attr = path.partition(":")
+  return getattr(importlib.import_module(module_name), attr)
+
+
+class RoomMemory:
+  """
+  채팅방 하나의 대화 임베딩.
+  벡터는 연속된 (용량, 차원) 행렬에 순서대로 쌓고, 부족하면 두 배로(최대 max_turns까지) 늘립니다.
+  행렬은 스레드에서 읽고 쓰므로 lock을 잡고 다룹니다.
+  """
+
+  def __init__(self, dim: int, max_turns: int):
+    self.dim = dim
+    self.max_turns = max_turns
+    self.vectors = np.empty((64, dim), dtype=np.float32)
+    self.seqs = np.empty(64, dtype=np.int64)
+    self.turns = [] # (화자, 내용), vectors와 같은 순서
+    self.size = 0
+    self.lock = asyncio.Lock()
+
+  @property
+  def last_seq(self) -> Optional[int]:
+    return int(self.seqs[self.size - 1]) if self.size else None
+
+  @property
+  def nbytes(self) -> int:
+    return self.vectors.nbytes + self.seqs.nbytes
+
+  def add(self, rows: List[MemoryRow], vectors: np.ndarray):
+    needed = self.size + len(rows)
+    if needed > len(self.vectors):
+      capacity = max(needed, min(len(self.vectors) * 2, self.max_turns))
+      grown = np.empty((capacity, self.dim), dtype=np.float32)
+      grown[:self.size] = self.vectors[:self.size]
+      self.vectors = grown
+      seqs = np.empty(capacity, dtype=np.int64)
+      seqs[:self.size] = self.seqs[:self.size]
+      self.seqs = seqs
+    self.vectors[self.size:needed] = vectors
+    self.seqs[self.size:needed] = [seq for seq, _, _ in rows]
+    self.turns.extend((speaker, content) for _, speaker, content in rows)
+    self.size = needed
+
+    if self.size > self.max_turns:
+      # 오래된 대화부터 버림
+      drop = self.size - self.max_turns
+      self.vectors[:self.max_turns] = self.vectors[drop:self.size]
+      self.seqs[:self.max_turns] = self.seqs[drop:self.size]
+      del self.turns[:drop]
+      self.size = self.max_turns
+
+  def search(self, query: np.ndarray, k: int, max_seq: int, min_score: float) -> List[Tuple[float, int, Tuple[Optional[str], str]]]:
+    """
+    max_seq 이하 대화 중 코사인 유사도 상위 k개를 (점수, 순번, 대화) 목록으로 반환합니다.
+    """
+    if not self.size or k <= 0:
+      return []
+    scores = self.vectors[:self.size] @ query # 행이 정규화되어 있으므로 내적 = 코사인 유사도
+    scores[self.seqs[:self.size] > max_seq] = -np.inf
+    k = min(k, self.size)
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [
+      (float(scores[index]), int(self.seqs[index]), self.turns[index])
+      for index in top if scores[index] >= min_score
+    ]
+
+
+class MemoryIndexCache:
+  """
+  채팅방별 장기 기억 인덱스.
+  채팅방은 LRU로 관리하고(채팅방 수와 전체 행렬 크기 제한), 새 메시지와 비슷한 예전 대화를 벡터 연산 한 번으로 찾습니다.
+  임베딩과 행렬 연산은 CPU 작업이라 이벤트 루프 밖(스레드)에서 처리합니다.
+  """
+
+  def __init__(
+    self,
+    embed: Embedding,
+    dim: int = settings.MEMORY_EMBEDDING_DIM,
+    max_rooms: int = settings.MEMORY_CACHE_ROOMS,
+    max_turns: int = settings.MEMORY_MAX_TURNS,
+    max_bytes: int = settings.MEMORY_MAX_BYTES,
+  ):
+    self.embed = embed
+    self.dim = dim
+    self.max_rooms = max_rooms
+    self.max_turns = max_turns
+    self.max_bytes = max_bytes
+    self._rooms = OrderedDict() # room_id -> RoomMemory
+    self.hits = 0
+    self.misses = 0
+    self.searches = 0
+    self.evictions = 0
+
+  async def _embed(self, texts: List[str]) -> np.ndarray:
+    return await asyncio.to_thread(self.embed, texts, self.dim)
+
+  def _evict(self):
+    # 가장 최근에 쓴 채팅방 하나는 크기와 관계없이 남김
+    while len(self._rooms) > 1 and (len(self._rooms) > self.max_rooms or self.nbytes > self.max_bytes):
+      self._rooms.popitem(last=False)
+      self.evictions += 1
+
+  @property
+  def nbytes(self) -> int:
+    return sum(memory.nbytes for memory in self._rooms.values())
+
+  def has(self, room_id: str) -> bool:
+    if room_id in self._rooms:
+      self._rooms.move_to_end(room_id)
+      self.hits += 1
+      return True
+    self.misses += 1
+    return False
+
+  async def load(self, room_id: str, rows: List[MemoryRow]):
+    """
+    DB에서 읽어온 대화(순번 오름차순)로 채팅방 인덱스를 만듭니다.
+    """
+    rows = rows[-self.max_turns:]
+    memory = RoomMemory(self.dim, self.max_turns)
+    if rows:
+      vectors = await self._embed([content for _, _, content in rows])
+      await asyncio.to_thread(memory.add, rows, vectors)
+    self._rooms[room_id] = memory
+    self._rooms.move_to_end(room_id)
+    self._evict()
+
+  async def add(self, room_id: str, rows: List[MemoryRow]):
+    """
+    새 대화를 추가합니다. 인덱스가 없는 채팅방은 다음 검색 때 DB에서 만들어지므로 무시합니다.
+    """
+    memory = self._rooms.get(room_id)
+    if memory is None:
+      return
+    last_seq = memory.last_seq
+    rows = [row for row in rows if last_seq is None or row[0] > last_seq]
+    if not rows:
+      return
+    vectors = await self._embed([content for _, _, content in rows])
+    async with memory.lock:
+      # 임베딩하는 동안 다른 요청이 먼저 추가했을 수 있으므로 다시 거름
+      last_seq = memory.last_seq
+      keep = [index for index, row in enumerate(rows) if last_seq is None or row[0] > last_seq]
+      if keep:
+        await asyncio.to_thread(memory.add, [rows[index] for index in keep], vectors[keep])
+    if self._rooms.get(room_id) is memory:
+      self._evict()
+
+  async def search(self, room_id: str, query: str, k: int, max_seq: int, min_score: float = settings.MEMORY_MIN_SCORE):
+    memory = self._rooms.get(room_id)
+    if memory is None:
+      return []
+    self.searches += 1
+    vector = (await self._embed([query]))[0]
+    async with memory.lock:
+      return await asyncio.to_thread(memory.search, vector, k, max_seq, min_score)
+
+  def invalidate(self, room_id: str):
+    self._rooms.pop(room_id, None)
+
+  def stats(self) -> dict:
+    return {
+      "rooms": len(self._rooms),
+      "max_rooms": self.max_rooms,
+      "indexed_turns": sum(memory.size for memory in self._rooms.values()),
+      "bytes": self.nbytes,
+      "max_bytes": self.max_bytes,
+      "hits": self.hits,
+      "misses": self.misses,
+      "searches": self.searches,
+      "evictions": self.evictions,
+    }
+
+
+memory_index = MemoryIndexCache(load_embedding(settings.MEMORY_EMBEDDING))
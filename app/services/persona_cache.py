@@ -0,0 +1,124 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from app.core.config import settings
+from app.utils.common_function import clean_json_string
+
+DEFAULT_NICKNAMES = {'30': '', '70': '', '100': ''}
+
+
+def build_persona(prompt, character) -> dict:
+  """
+  CharacterPrompt/Character로 LangChain 요청 데이터의 페르소나 부분을 구성합니다.
+  """
+  if prompt:
+    example_dialogues = [json.loads(clean_json_string(dialogue)) if dialogue else {} for dialogue in prompt.example_dialogues] if prompt.example_dialogues else []
+    nicknames = json.loads(character.nicknames) if character.nicknames else dict(DEFAULT_NICKNAMES)
+  else:
+    # 기본값 설정
+    example_dialogues = []
+    nicknames = dict(DEFAULT_NICKNAMES)
+
+  return {
+    "character_name": character.char_name, # 캐릭터 이름
+    "nickname": nicknames, # 호감도에 따른 호칭 명
+    "character_appearance": prompt.character_appearance, # 캐릭터 외형
+    "character_personality": prompt.character_personality, # 캐릭터 성격
+    "character_background": prompt.character_background, # 캐릭터 배경
+    "character_speech_style": prompt.character_speech_style, # 캐릭터 말투
+    "example_dialogues": example_dialogues, # 예시 대화
+  }
+
+
+class _LRU:
+  """
+  크기 제한과 TTL이 있는 LRU 딕셔너리 (호출자가 잠금 관리)
+  """
+
+  def __init__(self, max_size: int, ttl: float):
+    self.max_size = max_size
+    self.ttl = ttl
+    self.items = OrderedDict() # key -> (저장 시각, 값)
+
+  def get(self, key):
+    item = self.items.get(key)
+    if item is None:
+      return None
+    stored_at, value = item
+    if time.monotonic() - stored_at > self.ttl:
+      del self.items[key]
+      return None
+    self.items.move_to_end(key)
+    return value
+
+  def put(self, key, value):
+    self.items[key] = (time.monotonic(), value)
+    self.items.move_to_end(key)
+    while len(self.items) > self.max_size:
+      self.items.popitem(last=False)
+
+  def remove_where(self, predicate):
+    for key in [key for key, (_, value) in self.items.items() if predicate(value)]:
+      del self.items[key]
+
+
+class PersonaCache:
+  """
+  char_prompt_id별 페르소나와 room_id별 채팅방 정보 캐시.
+  CharacterPrompt는 수정 시 새 행이 생기므로 불변이지만, Character의 이름/호칭은
+  제자리에서 수정되므로 update_character/delete_character에서 무효화해야 합니다.
+  """
+
+  def __init__(self, max_size: int = settings.PERSONA_CACHE_SIZE, ttl: float = settings.PERSONA_CACHE_TTL):
+    self._personas = _LRU(max_size, ttl) # char_prompt_id -> {"char_idx", "persona"}
+    self._rooms = _LRU(max_size, ttl) # room_id -> 채팅방 정보
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+
+  def get(self, room_id: str):
+    """
+    (채팅방 정보, 페르소나)를 반환합니다. 둘 중 하나라도 없으면 None.
+    """
+    with self._lock:
+      room = self._rooms.get(room_id)
+      entry = self._personas.get(room["char_prompt_id"]) if room else None
+      if entry is None:
+        self.misses += 1
+        return None
+      self.hits += 1
+      return dict(room), entry["persona"]
+
+  def put(self, room_id: str, room: dict, persona: dict):
+    with self._lock:
+      self._rooms.put(room_id, dict(room))
+      self._personas.put(room["char_prompt_id"], {"char_idx": room["char_idx"], "persona": persona})
+
+  def set_favorability(self, room_id: str, favorability: int):
+    with self._lock:
+      room = self._rooms.get(room_id)
+      if room is not None:
+        room["favorability"] = favorability
+
+  def invalidate_room(self, room_id: str):
+    with self._lock:
+      self._rooms.items.pop(room_id, None)
+
+  def invalidate_character(self, char_idx: int):
+    with self._lock:
+      self._personas.remove_where(lambda entry: entry["char_idx"] == char_idx)
+      self._rooms.remove_where(lambda room: room["char_idx"] == char_idx)
+
+  def stats(self) -> dict:
+    with self._lock:
+      return {
+        "personas": len(self._personas.items),
+        "rooms": len(self._rooms.items),
+        "hits": self.hits,
+        "misses": self.misses,
+      }
+
+
+persona_cache = PersonaCache()
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from app.core.config import settings
+
+
+def make_etag(body: bytes) -> str:
+  """
+  응답 본문의 해시로 강한 ETag를 만듭니다. (같은 내용이면 버전이 바뀌어도 같은 ETag)
+  """
+  return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+  if not if_none_match:
+    return False
+  candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+  # If-None-Match는 약한 비교 (W/ 접두어 무시)
+  return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+class ResponseCache:
+  """
+  캐릭터 카탈로그 응답 캐시.
+  (경로, 쿼리 파라미터, 카탈로그 버전)별로 직렬화한 응답 본문과 ETag를 메모리에 보관하고,
+  If-None-Match가 ETag와 같으면 본문 없이 304를 반환합니다.
+  캐릭터 생성/수정/삭제/팔로우 때 bump()로 버전을 올려 이전 응답을 버립니다.
+  다른 워커의 변경은 알 수 없으므로 ttl초가 지나면 다시 만듭니다.
+  """
+
+  def __init__(self, max_bytes: int = settings.RESPONSE_CACHE_MAX_BYTES, ttl: float = settings.RESPONSE_CACHE_TTL):
+    self.max_bytes = max_bytes
+    self.ttl = ttl
+    self.version = 0
+    self._entries = OrderedDict() # key -> {"body", "etag", "headers", "stored_at"}
+    self._bytes = 0
+    self._lock = threading.Lock()
+
+    # 통계
+    self.hits = 0
+    self.misses = 0
+    self.not_modified = 0
+    self.evictions = 0
+
+  def bump(self):
+    with self._lock:
+      self.version += 1
+      self._entries.clear()
+      self._bytes = 0
+
+  def _get(self, key) -> Optional[dict]:
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        return None
+      if time.monotonic() - entry["stored_at"] > self.ttl:
+        self._remove(key)
+        return None
+      self._entries.move_to_end(key)
+      return entry
+
+  def _put(self, key, entry: dict):
+    size = len(entry["body"])
+    if size > self.max_bytes:
+      return
+    with self._lock:
+      if key[-1] != self.version:
+        return # 만드는 동안 데이터가 바뀜
+      if key in self._entries:
+        self._remove(key)
+      self._entries[key] = entry
+      self._bytes += size
+      while self._bytes > self.max_bytes:
+        self._remove(next(iter(self._entries)))
+        self.evictions += 1
+
+  def _remove(self, key):
+    entry = self._entries.pop(key)
+    self._bytes -= len(entry["body"])
+
+  def respond(self, request: Request, build: Callable[[dict], object]) -> Response:
+    """
+    캐시된 응답을 반환하거나 build(headers)로 응답 데이터를 만들어 저장합니다.
+    build는 응답 데이터를 반환하고, 함께 보낼 헤더(X-Next-Cursor 등)는 headers에 넣습니다.
+    """
+    # 이미지 URL에 base_url이 들어가므로 키에 포함
+    key = (str(request.base_url), request.url.path, tuple(sorted(request.query_params.multi_items())), self.version)
+    entry = self._get(key)
+    if entry is not None:
+      self.hits += 1
+    else:
+      self.misses += 1
+      headers = {}
+      body = json.dumps(jsonable_encoder(build(headers)), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+      entry = {"body": body, "etag": make_etag(body), "headers": headers, "stored_at": time.monotonic()}
+      self._put(key, entry)
+
+    headers = {**entry["headers"], "ETag": entry["etag"], "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), entry["etag"]):
+      self.not_modified += 1
+      return Response(status_code=304, headers=headers)
+    return Response(content=entry["body"], media_type="application/json", headers=headers)
+
+  def stats(self) -> dict:
+    return {
+      "version": self.version,
+      "entries": len(self._entries),
+      "bytes": self._bytes,
+      "max_bytes": self.max_bytes,
+      "hits": self.hits,
+      "misses": self.misses,
+      "not_modified": self.not_modified,
+      "evictions": self.evictions,
+    }
+
+
+catalog_cache = ResponseCache()
@@ -0,0 +1,219 @@
+import asyncio
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+from sqlalchemy import select, update, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.database.session import AsyncSessionLocal
+from app.models.models import ChatSummary, ChatTurn
+from app.services.chat_history import Turn, estimate_tokens
+from app.services.langchain_balancer import langchain_balancer
+
+# 문장 끝 (마침표/물음표/느낌표 뒤 공백)
+SENTENCE_END = re.compile(r'(?<=[.!?])\s')
+
+
+def local_summary(summary: str, turns: List[Turn], max_tokens: int) -> str:
+  """
+  LangChain 서버 없이 쓰는 간단한 요약.
+  대화마다 첫 문장만 기존 요약 뒤에 붙이고, max_tokens를 넘으면 오래된 줄부터 버립니다.
+  """
+  lines = summary.split("\n") if summary else []
+  for speaker, text in turns:
+    sentence = SENTENCE_END.split(text.strip(), maxsplit=1)[0][:120]
+    if sentence:
+      lines.append(f"{speaker}: {sentence}" if speaker else sentence)
+
+  used = sum(estimate_tokens(line) for line in lines)
+  start = 0
+  while start < len(lines) and used > max_tokens:
+    used -= estimate_tokens(lines[start])
+    start += 1
+  return "\n".join(lines[start:])
+
+
+class ChatSummarizer:
+  """
+  채팅방별 롤링 요약.
+  최근 대화 창 밖으로 밀려난 대화가 batch_turns개 쌓이면 백그라운드에서 기존 요약에 접어 넣고,
+  요약과 함께 반영된 마지막 순번(summarized_seq)과 버전을 저장합니다.
+  저장은 버전을 비교해서 다른 워커가 먼저 갱신했으면 덮어쓰지 않습니다.
+  """
+
+  def __init__(
+    self,
+    backend: str = settings.SUMMARY_BACKEND,
+    batch_turns: int = settings.SUMMARY_BATCH_TURNS,
+    max_tokens: int = settings.SUMMARY_MAX_TOKENS,
+    recent_turns: int = settings.PROMPT_RECENT_TURNS,
+    max_rooms: int = settings.SUMMARY_CACHE_ROOMS,
+  ):
+    self.backend = backend
+    self.batch_turns = batch_turns
+    self.max_tokens = max_tokens
+    self.recent_turns = recent_turns
+    self.max_rooms = max_rooms
+    self._cache = OrderedDict() # room_id -> {"summary", "summarized_seq", "version"}
+    self._lock = threading.Lock()
+    self._queue = None
+    self._pending = set()
+    self._worker = None
+
+    # 통계
+    self.folds = 0
+    self.local_folds = 0
+    self.conflicts = 0
+    self.failures = 0
+
+  def _remember(self, room_id: str, entry: dict):
+    with self._lock:
+      self._cache[room_id] = entry
+      self._cache.move_to_end(room_id)
+      while len(self._cache) > self.max_rooms:
+        self._cache.popitem(last=False)
+
+  async def get(self, db: AsyncSession, room_id: str) -> dict:
+    """
+    채팅방 요약({"summary", "summarized_seq", "version"})을 반환합니다. 요약이 없으면 빈 요약.
+    """
+    with self._lock:
+      entry = self._cache.get(room_id)
+      if entry is not None:
+        self._cache.move_to_end(room_id)
+        return entry
+
+    result = await db.execute(
+      select(ChatSummary.summary, ChatSummary.summarized_seq, ChatSummary.version).where(ChatSummary.chat_id == room_id)
+    )
+    row = result.first()
+    entry = {"summary": row.summary, "summarized_seq": row.summarized_seq, "version": row.version} if row else {"summary": "", "summarized_seq": None, "version": 0}
+    self._remember(room_id, entry)
+    return entry
+
+  def schedule(self, room_id: str, last_seq: int):
+    """
+    요약되지 않은 예전 대화가 batch_turns개 이상이면 백그라운드 요약을 예약합니다.
+    """
+    with self._lock:
+      entry = self._cache.get(room_id)
+    if entry is None or room_id in self._pending:
+      return
+    if last_seq - self.recent_turns - (entry["summarized_seq"] or 0) < self.batch_turns:
+      return
+
+    if self._worker is None:
+      self._queue = asyncio.Queue()
+      self._worker = asyncio.create_task(self._run())
+    self._pending.add(room_id)
+    self._queue.put_nowait(room_id)
+
+  async def _run(self):
+    while True:
+      room_id = await self._queue.get()
+      try:
+        async with AsyncSessionLocal() as db:
+          await self.fold(db, room_id)
+      except Exception as e:
+        self.failures += 1
+        print(f"대화 요약 실패: {room_id} ({str(e)})")
+      finally:
+        self._pending.discard(room_id)
+
+  async def fold(self, db: AsyncSession, room_id: str):
+    """
+    최근 대화 창 밖의 요약되지 않은 대화를 batch_turns개씩 요약에 접어 넣습니다.
+    """
+    result = await db.execute(select(ChatSummary).where(ChatSummary.chat_id == room_id))
+    row = result.scalar_one_or_none()
+    summary, watermark, version = (row.summary, row.summarized_seq, row.version) if row else ("", None, 0)
+
+    last_seq = (await db.execute(select(func.max(ChatTurn.seq)).where(ChatTurn.chat_id == room_id))).scalar()
+    if last_seq is None:
+      return
+    cutoff = last_seq - self.recent_turns
+
+    while True:
+      query = select(ChatTurn.seq, ChatTurn.speaker, ChatTurn.content).where(ChatTurn.chat_id == room_id, ChatTurn.seq <= cutoff)
+      if watermark is not None:
+        query = query.where(ChatTurn.seq > watermark)
+      rows = (await db.execute(query.order_by(ChatTurn.seq).limit(self.batch_turns))).all()
+      if len(rows) < self.batch_turns:
+        return
+
+      summary = await self._summarize(room_id, summary, [(row.speaker, row.content) for row in rows])
+      watermark = rows[-1].seq
+      version = await self._save(db, room_id, summary, watermark, version)
+      if version is None:
+        return
+      self.folds += 1
+      self._remember(room_id, {"summary": summary, "summarized_seq": watermark, "version": version})
+
+  async def _summarize(self, room_id: str, summary: str, turns: List[Turn]) -> str:
+    if self.backend == "langchain":
+      try:
+        response = await langchain_balancer.backend_for(room_id).request({
+          "type": "summarize",
+          "room_id": room_id,
+          "summary": summary, # 기존 요약
+          "turns": [{"speaker": speaker, "text": text} for speaker, text in turns], # 새로 접어 넣을 대화
+          "max_tokens": self.max_tokens,
+        }, count_timeouts=False) # 요약이 늦어도 채팅 요청이 다른 서버로 넘어가지 않도록 제외 판단에서 뺌
+        if response and response.get("summary"):
+          return response["summary"]
+        print(f"요약 응답 없음, 로컬 요약 사용: {room_id} ({response and response.get('error')})")
+      except Exception as e:
+        print(f"요약 요청 실패, 로컬 요약 사용: {room_id} ({str(e)})")
+    self.local_folds += 1
+    return local_summary(summary, turns, self.max_tokens)
+
+  async def _save(self, db: AsyncSession, room_id: str, summary: str, watermark: int, version: int) -> Optional[int]:
+    """
+    version이 그대로일 때만 저장하고 새 버전을 반환합니다. 다른 워커가 먼저 갱신했으면 None.
+    """
+    try:
+      if version == 0:
+        db.add(ChatSummary(chat_id=room_id, summary=summary, summarized_seq=watermark, version=1))
+        await db.commit()
+        return 1
+
+      result = await db.execute(
+        update(ChatSummary)
+        .where(ChatSummary.chat_id == room_id, ChatSummary.version == version)
+        .values(summary=summary, summarized_seq=watermark, version=version + 1, updated_at=func.now())
+      )
+      await db.commit()
+      if result.rowcount == 1:
+        return version + 1
+    except IntegrityError:
+      await db.rollback()
+    self.conflicts += 1
+    self.invalidate(room_id)
+    return None
+
+  def invalidate(self, room_id: str):
+    with self._lock:
+      self._cache.pop(room_id, None)
+
+  def stats(self) -> dict:
+    return {
+      "backend": self.backend,
+      "cached_rooms": len(self._cache),
+      "pending": len(self._pending),
+      "folds": self.folds,
+      "local_folds": self.local_folds,
+      "conflicts": self.conflicts,
+      "failures": self.failures,
+    }
+
+  async def close(self):
+    if self._worker is not None:
+      self._worker.cancel()
+      self._worker = None
+
+
+chat_summarizer = ChatSummarizer()
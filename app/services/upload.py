@@ -0,0 +1,261 @@
+import asyncio
+import hashlib
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+
+from app.core.config import settings
+
+FORM_OVERHEAD_BYTES = 1024 * 1024 # 업로드 요청에서 이미지 외의 폼 필드와 multipart 경계에 허용하는 크기
+
+# 허용하는 이미지 형식 (파일 앞부분 시그니처 -> 확장자) - 클라이언트가 보낸 content-type/파일명은 믿지 않음
+IMAGE_SIGNATURES = [
+  (b"\x89PNG\r\n\x1a\n", "png"),
+  (b"\xff\xd8\xff", "jpg"),
+  (b"GIF87a", "gif"),
+  (b"GIF89a", "gif"),
+]
+
+
+def detect_image_type(head: bytes) -> Optional[str]:
+  for signature, extension in IMAGE_SIGNATURES:
+    if head.startswith(signature):
+      return extension
+  if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+    return "webp"
+  return None
+
+
+class _PartFile:
+  """
+  같은 디렉토리의 임시 파일에 쓰고, 다 쓰면 fsync 후 최종 경로로 rename 합니다.
+  (중간에 실패하거나 끊겨도 최종 경로에 덜 쓴 파일이 남지 않음) 모든 메서드는 블로킹입니다.
+  쓰는 동안 내용의 sha256을 같이 계산합니다.
+  """
+
+  def __init__(self, directory: str):
+    os.makedirs(directory, exist_ok=True)
+    self.directory = directory
+    self.part_path = os.path.join(directory, f".{uuid.uuid4().hex}.part")
+    self.file = open(self.part_path, "wb")
+    self.hash = hashlib.sha256()
+
+  def write(self, chunk: bytes):
+    self.file.write(chunk)
+    self.hash.update(chunk)
+
+  def commit(self, path: str):
+    self.file.flush()
+    os.fsync(self.file.fileno())
+    self.file.close()
+    os.replace(self.part_path, path)
+    # rename 자체도 디스크에 반영되도록 디렉토리 fsync (지원하지 않는 OS는 생략)
+    try:
+      fd = os.open(self.directory, os.O_RDONLY)
+    except OSError:
+      return
+    try:
+      os.fsync(fd)
+    except OSError:
+      pass
+    finally:
+      os.close(fd)
+
+  def abort(self):
+    self.file.close()
+    try:
+      os.remove(self.part_path)
+    except FileNotFoundError:
+      pass
+
+
+class UploadService:
+  """
+  이미지 업로드 저장.
+  업로드를 chunk_size씩 읽어 임시 파일에 바로 쓰므로 파일 전체를 메모리에 올리지 않고,
+  파일 쓰기는 스레드에서 실행해서 이벤트 루프를 막지 않습니다.
+  첫 청크로 이미지 형식을(check_type일 때), 읽는 도중에 max_bytes를 확인해서 최종 경로에 저장하지 않고 거절합니다.
+  엔드포인트가 호출될 때는 Starlette가 요청 본문을 이미 임시 파일로 받아 둔 상태이므로,
+  너무 큰 요청을 받는 도중에 끊는 것은 UploadLimitMiddleware가 요청 단위로 합니다.
+  """
+
+  def __init__(self, max_bytes: int = settings.UPLOAD_MAX_BYTES, chunk_size: int = settings.UPLOAD_CHUNK_SIZE):
+    self.max_bytes = max_bytes
+    self.chunk_size = chunk_size
+
+    # 통계
+    self.uploads = 0
+    self.bytes = 0
+    self.seconds = 0.0
+    self.last_bytes_per_second = 0.0
+    self.rejected_type = 0
+    self.rejected_size = 0
+    self.failures = 0
+
+  def _file_path(self, directory: str, extension: Optional[str], filename: Optional[str], part: _PartFile, content_addressed: bool) -> str:
+    extension = extension or "bin" # 형식을 확인하지 않은 업로드
+    if filename:
+      return os.path.join(directory, os.path.basename(filename)) # 경로 조작 방지
+    if content_addressed:
+      # 같은 내용이면 같은 경로 (이미 있으면 같은 내용으로 덮어씀)
+      return os.path.join(directory, f"{part.hash.hexdigest()}.{extension}")
+    timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+    return os.path.join(directory, f"{timestamp}_{uuid.uuid4().hex}.{extension}")
+
+  def _check(self, total: int, extension: Optional[str], check_type: bool):
+    if check_type and extension is None:
+      self.rejected_type += 1
+      raise HTTPException(status_code=415, detail="지원하지 않는 이미지 형식입니다. (png, jpg, gif, webp)")
+    if total > self.max_bytes:
+      self.rejected_size += 1
+      raise HTTPException(status_code=413, detail=f"이미지는 최대 {self.max_bytes // (1024 * 1024)}MB까지 업로드할 수 있습니다.")
+
+  def _record(self, total: int, started: float):
+    elapsed = time.monotonic() - started
+    self.uploads += 1
+    self.bytes += total
+    self.seconds += elapsed
+    self.last_bytes_per_second = total / elapsed if elapsed > 0 else 0.0
+
+  async def save_image(
+    self, upload: UploadFile, directory: str, filename: Optional[str] = None,
+    content_addressed: bool = False, check_type: bool = True,
+  ) -> str:
+    """
+    업로드 이미지를 directory에 저장하고 경로를 반환합니다. filename이 없으면 고유한 파일명을 만듭니다.
+    content_addressed이면 파일명을 내용의 sha256으로 만듭니다. ({해시}.{확장자})
+    check_type이면 파일 시그니처가 허용하는 이미지 형식이 아닐 때 415로 거절합니다.
+    """
+    started = time.monotonic()
+    chunk = await upload.read(self.chunk_size)
+    extension = detect_image_type(chunk)
+    self._check(len(chunk), extension, check_type)
+
+    part = await asyncio.to_thread(_PartFile, directory)
+    total = 0
+    try:
+      while chunk:
+        total += len(chunk)
+        self._check(total, extension, check_type)
+        await asyncio.to_thread(part.write, chunk)
+        chunk = await upload.read(self.chunk_size)
+      path = self._file_path(directory, extension, filename, part, content_addressed)
+      await asyncio.to_thread(part.commit, path)
+    except BaseException as e:
+      await asyncio.shield(asyncio.to_thread(part.abort))
+      if not isinstance(e, HTTPException):
+        self.failures += 1
+      raise
+    self._record(total, started)
+    return path
+
+  def save_image_sync(
+    self, upload: UploadFile, directory: str, filename: Optional[str] = None,
+    content_addressed: bool = False, check_type: bool = True,
+  ) -> str:
+    """
+    save_image와 같지만 동기 엔드포인트(스레드풀에서 실행)용입니다.
+    """
+    started = time.monotonic()
+    chunk = upload.file.read(self.chunk_size)
+    extension = detect_image_type(chunk)
+    self._check(len(chunk), extension, check_type)
+
+    part = _PartFile(directory)
+    total = 0
+    try:
+      while chunk:
+        total += len(chunk)
+        self._check(total, extension, check_type)
+        part.write(chunk)
+        chunk = upload.file.read(self.chunk_size)
+      path = self._file_path(directory, extension, filename, part, content_addressed)
+      part.commit(path)
+    except BaseException as e:
+      part.abort()
+      if not isinstance(e, HTTPException):
+        self.failures += 1
+      raise
+    self._record(total, started)
+    return path
+
+  def stats(self) -> dict:
+    return {
+      "uploads": self.uploads,
+      "bytes": self.bytes,
+      "bytes_per_second": round(self.bytes / self.seconds, 1) if self.seconds > 0 else 0.0,
+      "last_bytes_per_second": round(self.last_bytes_per_second, 1),
+      "rejected_type": self.rejected_type,
+      "rejected_size": self.rejected_size,
+      "failures": self.failures,
+    }
+
+
+upload_service = UploadService()
+
+
+class UploadLimitMiddleware:
+  """
+  multipart 요청 본문이 max_bytes(이미지 최대 크기 + 폼 오버헤드)를 넘으면 413으로 거절하는 ASGI 미들웨어.
+  Content-Length가 있으면 본문을 읽기 전에, 없으면(chunked) 받은 크기가 넘는 순간 더 받지 않고 거절합니다.
+  """
+
+  def __init__(self, app, max_bytes: int = settings.UPLOAD_MAX_BYTES + FORM_OVERHEAD_BYTES):
+    self.app = app
+    self.max_bytes = max_bytes
+
+  def _reject(self):
+    upload_service.rejected_size += 1
+    return JSONResponse(
+      status_code=413,
+      content={"detail": f"이미지는 최대 {upload_service.max_bytes // (1024 * 1024)}MB까지 업로드할 수 있습니다."},
+    )
+
+  async def __call__(self, scope, receive, send):
+    if scope["type"] != "http":
+      return await self.app(scope, receive, send)
+    headers = dict(scope["headers"])
+    if not headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+      return await self.app(scope, receive, send)
+
+    content_length = headers.get(b"content-length")
+    if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+      return await self._reject()(scope, receive, send)
+
+    received = 0
+    exceeded = False
+    response_started = False
+
+    async def limited_receive():
+      nonlocal received, exceeded
+      if exceeded:
+        return {"type": "http.disconnect"}
+      message = await receive()
+      if message["type"] == "http.request":
+        received += len(message.get("body", b""))
+        if received > self.max_bytes:
+          # 앱에는 연결이 끊긴 것으로 알려서 본문 파싱을 멈추게 함
+          exceeded = True
+          return {"type": "http.disconnect"}
+      return message
+
+    async def tracked_send(message):
+      nonlocal response_started
+      if exceeded and not response_started:
+        return # 본문 파싱 실패 응답(400) 대신 413을 보냄
+      if message["type"] == "http.response.start":
+        response_started = True
+      await send(message)
+
+    try:
+      await self.app(scope, limited_receive, tracked_send)
+    except Exception:
+      if not exceeded:
+        raise
+    if exceeded and not response_started:
+      await self._reject()(scope, receive, send)
@@ -0,0 +1,255 @@
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from sqlalchemy import select, update, insert, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.database.session import AsyncSessionLocal
+from app.models.models import ChatRoom, ChatTurn
+from app.services.chat_history import chat_history_cache
+from app.services.chat_search import chat_search
+from app.services.memory_index import memory_index
+
+
+class WriteBehindBuffer:
+  """
+  채팅 턴/호감도 쓰기 지연 버퍼.
+  턴마다 커밋하지 않고 채팅방별로 모아 두었다가, 일정 시간(interval)마다 또는 max_rows개가
+  쌓이면 여러 채팅방의 대화를 한 번의 다중 행 INSERT와 호감도 일괄 UPDATE로 저장합니다.
+  호감도는 채팅방별 마지막 값만 저장합니다.
+
+  DB를 읽기 전에 flush_room()으로 해당 채팅방을 먼저 저장해야 방금 쓴 대화가 보입니다.
+
+  순번을 다시 매겨도 저장할 수 없는 채팅방은 버퍼에 남겨 다음 주기에 재시도하고,
+  max_retries번 실패하면 dead_letter_path 파일(JSON Lines)에 기록한 뒤 버퍼에서 뺍니다.
+  """
+
+  def __init__(
+    self,
+    interval: float = settings.WRITE_BEHIND_INTERVAL,
+    max_rows: int = settings.WRITE_BEHIND_MAX_ROWS,
+    max_pending: int = settings.WRITE_BEHIND_MAX_PENDING,
+    max_retries: int = settings.WRITE_BEHIND_MAX_RETRIES,
+    dead_letter_path: str = settings.WRITE_BEHIND_DEAD_LETTER_PATH,
+  ):
+    self.interval = interval
+    self.max_rows = max_rows
+    self.max_pending = max_pending
+    self.max_retries = max_retries
+    self.dead_letter_path = dead_letter_path
+    self._attempts = {} # room_id -> 순번 충돌로 저장하지 못한 횟수
+    self._turns = {} # room_id -> [ChatTurn 행 dict]
+    self._favorability = {} # room_id -> 마지막 호감도
+    self._since = {} # room_id -> 저장 대기 시작 시각 (가장 오래된 변경)
+    self.pending_rows = 0
+    self._flush_lock = asyncio.Lock()
+    self._wakeup = asyncio.Event()
+    self._worker = None
+
+    # 통계
+    self.flushes = 0
+    self.flushed_rows = 0
+    self.flushed_favorability = 0
+    self.conflicts = 0
+    self.failures = 0
+    self.retried_rows = 0
+    self.dead_letter_rows = 0
+    self.last_flush_lag = 0.0
+    self.max_flush_lag = 0.0
+
+  async def add(self, room_id: str, turns: List[dict], favorability: Optional[int] = None):
+    """
+    저장할 대화 행과 호감도를 버퍼에 추가합니다.
+    """
+    if self._worker is None:
+      self._worker = asyncio.create_task(self._run())
+
+    self._turns.setdefault(room_id, []).extend(turns)
+    if favorability is not None:
+      self._favorability[room_id] = favorability
+    self._since.setdefault(room_id, time.monotonic())
+    self.pending_rows += len(turns)
+
+    if self.pending_rows >= self.max_pending:
+      # DB가 따라오지 못하면 요청 쪽에서 직접 저장해서 버퍼가 끝없이 커지지 않도록 함
+      try:
+        await self.flush()
+      except Exception as e:
+        print(f"쓰기 지연 버퍼 저장 실패: {str(e)}")
+    elif self.pending_rows >= self.max_rows:
+      self._wakeup.set()
+
+  async def _run(self):
+    while True:
+      try:
+        await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+      except asyncio.TimeoutError:
+        pass
+      self._wakeup.clear()
+      try:
+        await self.flush()
+      except Exception as e:
+        print(f"쓰기 지연 버퍼 저장 실패: {str(e)}")
+
+  async def flush_room(self, room_id: str):
+    if room_id in self._since:
+      await self.flush([room_id])
+
+  async def flush(self, room_ids: Optional[Iterable[str]] = None):
+    """
+    버퍼의 변경을 저장합니다. room_ids를 주면 해당 채팅방만 저장합니다.
+    """
+    async with self._flush_lock:
+      rooms = list(self._since) if room_ids is None else [room_id for room_id in room_ids if room_id in self._since]
+      if not rooms:
+        return
+      batch = {room_id: (self._turns.pop(room_id, []), self._favorability.pop(room_id, None), self._since.pop(room_id)) for room_id in rooms}
+      self.pending_rows -= sum(len(turns) for turns, _, _ in batch.values())
+
+      remaining = dict(batch)
+      retry = {}
+      dead_letter = set()
+      try:
+        async with AsyncSessionLocal() as db:
+          try:
+            await self._write(db, batch)
+            remaining = {}
+            for room_id in batch:
+              self._attempts.pop(room_id, None)
+          except IntegrityError:
+            # 다른 워커가 같은 순번을 먼저 저장한 채팅방이 있음 - 채팅방별로 나눠서 다시 저장
+            await db.rollback()
+            for room_id, entry in batch.items():
+              result = await self._write_room(db, room_id, entry)
+              if result == "retry":
+                retry[room_id] = entry
+              elif result == "dead_letter":
+                dead_letter.add(room_id)
+              del remaining[room_id]
+      except Exception:
+        # 저장하지 못한 채팅방만 다시 버퍼에 넣고 다음 주기에 재시도
+        self.failures += 1
+        self._requeue({**remaining, **retry})
+        raise
+      self._requeue(retry)
+
+      written = {room_id: entry for room_id, entry in batch.items() if room_id not in retry and room_id not in dead_letter}
+      for room_id in written:
+        chat_search.invalidate(room_id) # 메모리 검색 인덱스는 다음 검색 때 다시 만듦
+      lag = time.monotonic() - min(since for _, _, since in batch.values())
+      self.flushes += 1
+      self.flushed_rows += sum(len(turns) for turns, _, _ in written.values())
+      self.flushed_favorability += sum(1 for _, favorability, _ in written.values() if favorability is not None)
+      self.last_flush_lag = lag
+      self.max_flush_lag = max(self.max_flush_lag, lag)
+
+  async def _write(self, db: AsyncSession, batch: dict):
+    rows = [row for turns, _, _ in batch.values() for row in turns]
+    if rows:
+      await db.execute(insert(ChatTurn), rows)
+    favorability = [
+      {"chat_id": room_id, "favorability": value}
+      for room_id, (_, value, _) in batch.items() if value is not None
+    ]
+    if favorability:
+      # 기본 키 기준 ORM 일괄 UPDATE (executemany)
+      await db.execute(update(ChatRoom), favorability)
+    await db.commit()
+
+  async def _write_room(self, db: AsyncSession, room_id: str, entry: tuple) -> str:
+    """
+    한 채팅방을 저장하고 결과("written", "retry": 다음 주기에 재시도, "dead_letter": 파일에 기록)를 반환합니다.
+    """
+    try:
+      await self._write(db, {room_id: entry})
+      self._attempts.pop(room_id, None)
+      return "written"
+    except IntegrityError:
+      await db.rollback()
+
+    # 이미 저장된 마지막 순번 뒤로 다시 번호를 매기고, 캐시는 DB 기준으로 다시 채우도록 비움
+    self.conflicts += 1
+    last_seq = (await db.execute(select(func.max(ChatTurn.seq)).where(ChatTurn.chat_id == room_id))).scalar() or 0
+    turns, favorability, since = entry
+    for offset, row in enumerate(turns, start=1):
+      row["seq"] = last_seq + offset
+    chat_history_cache.invalidate(room_id)
+    memory_index.invalidate(room_id)
+    try:
+      await self._write(db, {room_id: (turns, favorability, since)})
+      self._attempts.pop(room_id, None)
+      return "written"
+    except IntegrityError as e:
+      await db.rollback()
+      error = e
+
+    attempts = self._attempts.get(room_id, 0) + 1
+    if attempts < self.max_retries:
+      # 버퍼에 남겨 다음 주기에 다시 번호를 매겨 저장 (다른 채팅방 저장은 막지 않음)
+      self._attempts[room_id] = attempts
+      self.retried_rows += len(turns)
+      print(f"대화 저장 실패, 재시도 예정 ({attempts}/{self.max_retries}): {room_id} ({str(error)})")
+      return "retry"
+
+    # 계속 실패하는 행은 파일에 남기고 버퍼에서 뺌 (기록에 실패하면 예외가 나서 버퍼에 다시 들어감)
+    await asyncio.to_thread(self._dead_letter, room_id, turns, favorability, str(error))
+    self._attempts.pop(room_id, None)
+    self.dead_letter_rows += len(turns)
+    print(f"대화 저장 실패, dead letter에 기록: {room_id} ({len(turns)}개, {self.dead_letter_path})")
+    return "dead_letter"
+
+  def _dead_letter(self, room_id: str, turns: List[dict], favorability: Optional[int], error: str):
+    directory = os.path.dirname(self.dead_letter_path)
+    if directory:
+      os.makedirs(directory, exist_ok=True)
+    record = {
+      "chat_id": room_id,
+      "turns": turns,
+      "favorability": favorability,
+      "error": error,
+      "failed_at": datetime.utcnow().isoformat(),
+    }
+    with open(self.dead_letter_path, "a", encoding="utf-8") as file:
+      file.write(json.dumps(record, ensure_ascii=False) + "\n")
+      file.flush()
+      os.fsync(file.fileno())
+
+  def _requeue(self, batch: dict):
+    for room_id, (turns, favorability, since) in batch.items():
+      self._turns[room_id] = turns + self._turns.get(room_id, [])
+      if favorability is not None:
+        self._favorability.setdefault(room_id, favorability) # 그 사이 들어온 값이 더 최신
+      self._since[room_id] = min(since, self._since.get(room_id, since))
+      self.pending_rows += len(turns)
+
+  def stats(self) -> dict:
+    oldest = min(self._since.values(), default=None)
+    return {
+      "pending_rows": self.pending_rows,
+      "pending_rooms": len(self._since),
+      "flush_lag_seconds": round(time.monotonic() - oldest, 6) if oldest is not None else 0.0, # 가장 오래 기다린 변경
+      "last_flush_lag_seconds": round(self.last_flush_lag, 6),
+      "max_flush_lag_seconds": round(self.max_flush_lag, 6),
+      "flushes": self.flushes,
+      "flushed_rows": self.flushed_rows,
+      "flushed_favorability": self.flushed_favorability,
+      "conflicts": self.conflicts,
+      "failures": self.failures,
+      "retried_rows": self.retried_rows,
+      "dead_letter_rows": self.dead_letter_rows,
+    }
+
+  async def close(self):
+    if self._worker is not None:
+      self._worker.cancel()
+      self._worker = None
+    await self.flush()
+
+
+write_behind = WriteBehindBuffer()
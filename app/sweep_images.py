@@ -0,0 +1,11 @@
+import asyncio
+
+from app.services.image_store import image_store
+
+# 참조가 없는 캐릭터 이미지를 한 번 정리 (IMAGE_GC_ENABLED를 켠 워커가 없을 때 cron 등으로 실행)
+def sweep():
+  images, files = asyncio.run(image_store.sweep())
+  print(f"Swept {images} unreferenced images and {files} files.")
+
+if __name__ == "__main__":
+  sweep()
@@ -1,4 +1,6 @@
 import re
+import json
+import base64
 
 def clean_json_string(json_string):
     """
@@ -9,3 +11,65 @@ def clean_json_string(json_string):
     if not isinstance(json_string, str):
         return json_string
     return re.sub(r'[\x00-\x1F\x7F]', '', json_string)
+
+
+def encode_cursor(*values):
+    """
+    키셋 페이지네이션 커서 생성 (정렬 키 값들을 URL-safe 문자열로 인코딩)
+    :param values: 마지막 행의 정렬 키 값 (datetime은 ISO 문자열로 변환)
+    :return: 커서 문자열
+    """
+    raw = json.dumps([value.isoformat() if hasattr(value, "isoformat") else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    encode_cursor로 만든 커서를 정렬 키 값 목록으로 복원
+    :param cursor: 커서 문자열
+    :return: 값 목록 (잘못된 커서면 ValueError)
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+    except Exception:
+        raise ValueError("잘못된 커서입니다.")
+    if not isinstance(values, list):
+        raise ValueError("잘못된 커서입니다.")
+    return values
+
+
+def sse_event(event, data):
+    """
+    SSE 이벤트 문자열 생성
+    :param event: 이벤트 이름
+    :param data: 전송할 데이터 (JSON으로 직렬화)
+    :return: text/event-stream 형식 문자열
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+def ngram_tokens(text, n=2):
+    """
+    검색용 n-gram 토큰 생성 (한글은 띄어쓰기/조사 때문에 단어 단위로는 검색이 잘 안 됨)
+    :param text: 입력 문자열
+    :param n: n-gram 길이 (n보다 짧은 단어는 그대로 사용)
+    :return: 단어별 n-gram 토큰 목록 (소문자)
+    """
+    tokens = []
+    for word in re.findall(r'\w+', text.lower()):
+        if len(word) <= n:
+            tokens.append(word)
+        else:
+            tokens.extend(word[i:i + n] for i in range(len(word) - n + 1))
+    return tokens
+
+
+def ngram_text(text, n=2):
+    """
+    n-gram 토큰을 공백으로 이어 붙인 문자열 (tsvector 생성용)
+    :param text: 입력 문자열
+    :param n: n-gram 길이
+    :return: "토큰 토큰 ..." 문자열
+    """
+    return " ".join(ngram_tokens(text or "", n))
@@ -0,0 +1,104 @@
+import asyncio
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+
+# 엔진은 import 시점에 만들어지므로 DB 접속 정보만 채워 둠 (테스트는 실제 PostgreSQL에 연결하지 않음)
+for name, value in {"DB_HOST": "localhost", "DB_PORT": "5432", "DB_USER": "test", "DB_PASS": "test", "DB_NAME": "test"}.items():
+  os.environ.setdefault(name, value)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 캐릭터 목록/팔로우 테스트에 쓰는 테이블 (PostgreSQL 전용 컬럼/인덱스 제외)
+CATALOG_TABLES = [
+  """CREATE TABLE characters (
+    char_idx INTEGER PRIMARY KEY, character_owner INTEGER, field_idx INTEGER NOT NULL, voice_idx TEXT NOT NULL,
+    char_name TEXT NOT NULL, char_description TEXT NOT NULL, created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    is_active BOOLEAN NOT NULL DEFAULT 1, nicknames TEXT, follower_count INTEGER NOT NULL DEFAULT 0, current_prompt_id INTEGER
+  )""",
+  """CREATE TABLE char_prompts (
+    char_prompt_id INTEGER PRIMARY KEY, char_idx INTEGER NOT NULL, created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    character_appearance TEXT NOT NULL, character_personality TEXT NOT NULL, character_background TEXT NOT NULL,
+    character_speech_style TEXT NOT NULL, example_dialogues TEXT
+  )""",
+  "CREATE TABLE tags (tag_idx INTEGER PRIMARY KEY, char_idx INTEGER NOT NULL, tag_name TEXT NOT NULL, tag_description TEXT, is_deleted BOOLEAN NOT NULL DEFAULT 0)",
+  "CREATE TABLE images (img_idx INTEGER PRIMARY KEY, file_path TEXT NOT NULL, content_hash TEXT, ref_count INTEGER NOT NULL DEFAULT 0, released_at DATETIME)",
+  "CREATE TABLE image_mapping (char_idx INTEGER NOT NULL, img_idx INTEGER NOT NULL, is_active BOOLEAN NOT NULL DEFAULT 1, PRIMARY KEY (char_idx, img_idx))",
+  "CREATE TABLE friends (friend_idx INTEGER PRIMARY KEY, user_idx INTEGER NOT NULL, char_idx INTEGER NOT NULL, is_active BOOLEAN NOT NULL DEFAULT 1)",
+]
+
+
+@pytest.fixture
+def http_scope():
+  """
+  ASGI 앱을 직접 호출할 때 쓰는 HTTP 요청 scope를 만듭니다. (JSON 본문)
+  """
+  def make(method: str, path: str) -> dict:
+    return {
+      "type": "http",
+      "asgi": {"version": "3.0", "spec_version": "2.4"},
+      "http_version": "1.1",
+      "method": method,
+      "scheme": "http",
+      "path": path,
+      "raw_path": path.encode(),
+      "query_string": b"",
+      "root_path": "",
+      "headers": [(b"content-type", b"application/json"), (b"host", b"test")],
+      "client": ("127.0.0.1", 1),
+      "server": ("test", 80),
+    }
+  return make
+
+
+@pytest.fixture
+def run_asgi():
+  """
+  ASGI 앱에 messages를 차례로 보낸 뒤 http.disconnect를 보내고, 앱이 보낸 메시지 목록을 반환합니다.
+  disconnected이면 응답을 보내는 순간 연결이 이미 끊긴 것처럼 send에서 OSError를 냅니다.
+  """
+  def run(app, scope: dict, messages: list, disconnected: bool = False) -> list:
+    sent = []
+
+    async def receive():
+      if messages:
+        return messages.pop(0)
+      await asyncio.sleep(0)
+      return {"type": "http.disconnect"}
+
+    async def send(message):
+      if disconnected:
+        raise OSError("connection reset")
+      sent.append(message)
+
+    async def main():
+      try:
+        await app(scope, receive, send)
+      except Exception:
+        pass # 서버는 끊긴 연결의 예외를 로그만 남김
+      await asyncio.sleep(0.05)
+    asyncio.run(main())
+    return sent
+  return run
+
+
+@pytest.fixture
+def catalog_db(tmp_path):
+  """
+  캐릭터 목록 조회용 테이블만 만든 SQLite 세션. 실행한 SQL은 db.info["statements"]에 쌓입니다.
+  """
+  engine = create_engine(f"sqlite:///{tmp_path / 'catalog.db'}")
+  event.listen(engine, "connect", lambda connection, _: connection.create_function("greatest", 2, max))
+  with engine.begin() as connection:
+    for statement in CATALOG_TABLES:
+      connection.execute(text(statement))
+  statements = []
+  event.listen(engine, "before_cursor_execute", lambda connection, cursor, statement, *args: statements.append(statement))
+  db = sessionmaker(bind=engine, autoflush=False)()
+  db.info["statements"] = statements
+  yield db
+  db.close()
+  engine.dispose()
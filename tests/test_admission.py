@@ -0,0 +1,140 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import FastAPI, HTTPException
+
+import app.routers.chat as chat_router
+from app.database.session import get_async_db
+from app.services.admission import ChatAdmissionController
+
+
+def test_same_room_is_served_in_arrival_order():
+  async def test():
+    admission = ChatAdmissionController(max_concurrency=4, max_queue=10, room_queue_depth=10, queue_timeout=1)
+    order = []
+
+    async def turn(name: str, delay: float):
+      async with admission.admit("room"):
+        order.append(f"{name} start")
+        await asyncio.sleep(delay)
+        order.append(f"{name} end")
+
+    await asyncio.gather(turn("first", 0.05), turn("second", 0), turn("third", 0))
+    assert order == ["first start", "first end", "second start", "second end", "third start", "third end"]
+    assert admission.stats()["rooms"] == 0
+    assert admission.stats()["active"] == 0
+  asyncio.run(test())
+
+
+def test_global_concurrency_is_capped_across_rooms():
+  async def test():
+    admission = ChatAdmissionController(max_concurrency=2, max_queue=10, room_queue_depth=10, queue_timeout=1)
+    running = 0
+    peak = 0
+
+    async def turn(room_id: str):
+      nonlocal running, peak
+      async with admission.admit(room_id):
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+
+    await asyncio.gather(*[turn(f"room-{i}") for i in range(6)])
+    assert peak == 2
+    assert admission.stats()["admitted_total"] == 6
+  asyncio.run(test())
+
+
+def test_full_room_queue_is_rejected_with_429():
+  async def test():
+    admission = ChatAdmissionController(max_concurrency=4, max_queue=10, room_queue_depth=2, queue_timeout=1)
+    first = await admission.acquire("room")
+    waiting = asyncio.create_task(admission.acquire("room"))
+    await asyncio.sleep(0)
+    with pytest.raises(HTTPException) as error:
+      await admission.acquire("room")
+    assert error.value.status_code == 429
+    admission.release(first)
+    admission.release(await waiting)
+    assert admission.stats()["rejected_room_total"] == 1
+    assert admission.stats()["rooms"] == 0
+  asyncio.run(test())
+
+
+def test_queue_timeout_returns_503_and_frees_the_room():
+  async def test():
+    admission = ChatAdmissionController(max_concurrency=1, max_queue=10, room_queue_depth=4, queue_timeout=0.05)
+    busy = await admission.acquire("other")
+    with pytest.raises(HTTPException) as error:
+      await admission.acquire("room")
+    assert error.value.status_code == 503
+    assert admission.stats()["timeouts_total"] == 1
+    admission.release(busy)
+    # 시간 초과한 요청의 채팅방 순서가 남아 있지 않음
+    async with admission.admit("room"):
+      pass
+    assert admission.stats()["rooms"] == 0
+  asyncio.run(test())
+
+
+def test_slot_shares_the_global_limit_without_room_order():
+  async def test():
+    admission = ChatAdmissionController(max_concurrency=2, max_queue=10, room_queue_depth=4, queue_timeout=1)
+    running = 0
+    peak = 0
+
+    async def call():
+      nonlocal running, peak
+      async with admission.slot():
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+
+    # 그룹은 채팅방 순서만 잡고, 캐릭터별 호출이 전역 슬롯을 나눠 씀
+    async with admission.admit("group", slot=False):
+      assert admission.stats()["active"] == 0
+      await asyncio.gather(*[call() for _ in range(5)])
+    assert peak == 2
+    assert admission.stats()["active"] == 0
+    assert admission.stats()["rooms"] == 0
+  asyncio.run(test())
+
+
+@pytest.fixture
+def stream_app(monkeypatch):
+  admission = ChatAdmissionController(max_concurrency=4, max_queue=10, room_queue_depth=4, queue_timeout=1)
+  monkeypatch.setattr(chat_router, "chat_admission", admission)
+
+  async def load_chat_context(db, room_id, user_message):
+    return {"room": {"favorability": 0}, "history": {"last_seq": 0}}
+
+  async def stream_chat_turn(context, room_id, user_message, stream=False):
+    await asyncio.sleep(0.2)
+    yield {"type": "token", "text": "안녕"}
+
+  monkeypatch.setattr(chat_router, "load_chat_context", load_chat_context)
+  monkeypatch.setattr(chat_router, "stream_chat_turn", stream_chat_turn)
+  app = FastAPI()
+  app.include_router(chat_router.router)
+
+  async def no_db():
+    yield None
+  app.dependency_overrides[get_async_db] = no_db
+  return app, admission
+
+
+def test_stream_releases_the_ticket_when_the_client_disconnects_before_the_first_chunk(stream_app, run_asgi, http_scope):
+  app, admission = stream_app
+  body = json.dumps({"sender": "user", "content": "안녕"}).encode()
+  run_asgi(app, http_scope("POST", "/api/chat/r1/stream"), [{"type": "http.request", "body": body, "more_body": False}], disconnected=True)
+  assert admission.stats()["active"] == 0
+  assert admission.stats()["rooms"] == 0
+
+  # 같은 채팅방의 다음 요청이 429/503 없이 들어옴
+  sent = run_asgi(app, http_scope("POST", "/api/chat/r1/stream"), [{"type": "http.request", "body": body, "more_body": False}])
+  assert sent[0]["status"] == 200
+  assert admission.stats()["admitted_total"] == 2
+  assert admission.stats()["rooms"] == 0
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiosqlite")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
+
+import app.routers.user as user_router
+from app.core.config import settings
+from app.database.session import get_async_db, get_db
+
+TABLES = [
+  "CREATE TABLE characters (char_idx INTEGER PRIMARY KEY, follower_count INTEGER NOT NULL DEFAULT 0)",
+  "CREATE TABLE friends (friend_idx INTEGER PRIMARY KEY, user_idx INTEGER NOT NULL, char_idx INTEGER NOT NULL, is_active BOOLEAN NOT NULL DEFAULT 1)",
+]
+
+
+@pytest.fixture
+def database(tmp_path):
+  # TestClient는 다른 이벤트 루프에서 앱을 실행하므로 커넥션을 재사용하지 않음
+  engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}", poolclass=NullPool)
+  event.listen(engine.sync_engine, "connect", lambda connection, _: connection.create_function("greatest", 2, max))
+
+  async def create():
+    async with engine.begin() as connection:
+      for statement in TABLES:
+        await connection.execute(text(statement))
+      await connection.execute(text("INSERT INTO characters (char_idx) VALUES (1), (2)"))
+  asyncio.run(create())
+  yield async_sessionmaker(engine, expire_on_commit=False)
+  asyncio.run(engine.dispose())
+
+
+@pytest.fixture
+def client(database):
+  sessions = []
+  app = FastAPI()
+  app.include_router(user_router.router)
+
+  async def override_get_async_db():
+    async with database() as db:
+      sessions.append(db)
+      yield db
+
+  def no_sync_db():
+    raise AssertionError("async 엔드포인트가 동기 세션을 사용함")
+    yield
+  app.dependency_overrides[get_async_db] = override_get_async_db
+  app.dependency_overrides[get_db] = no_sync_db
+  client = TestClient(app)
+  client.sessions = sessions
+  return client
+
+
+async def fetch(factory, statement: str) -> list:
+  async with factory() as db:
+    return (await db.execute(text(statement))).all()
+
+
+def test_async_url_uses_the_asyncpg_driver():
+  assert settings.ASYNC_DATABASE_URL.startswith("postgresql+asyncpg://")
+  assert settings.ASYNC_DATABASE_URL.split("://", 1)[1] == settings.DATABASE_URL.split("://", 1)[1]
+
+
+def test_follow_runs_on_an_async_session(client, database):
+  response = client.post("/users/3/follow", json={"user_idx": 3, "char_idx": 1})
+  assert response.status_code == 200
+  assert all(isinstance(session, AsyncSession) for session in client.sessions)
+  assert asyncio.run(fetch(database, "SELECT user_idx, char_idx FROM friends")) == [(3, 1)]
+  assert asyncio.run(fetch(database, "SELECT char_idx, follower_count FROM characters ORDER BY char_idx")) == [(1, 1), (2, 0)]
+
+
+def test_duplicate_follow_is_rejected_and_rolled_back(client, database):
+  assert client.post("/users/3/follow", json={"user_idx": 3, "char_idx": 1}).status_code == 200
+  response = client.post("/users/3/follow", json={"user_idx": 3, "char_idx": 1})
+  assert response.status_code == 400
+  assert asyncio.run(fetch(database, "SELECT count(*) FROM friends")) == [(1,)]
+  assert asyncio.run(fetch(database, "SELECT follower_count FROM characters WHERE char_idx = 1")) == [(1,)]
+
+
+def test_mismatched_user_is_rejected_before_touching_the_database(client, database):
+  assert client.post("/users/3/follow", json={"user_idx": 4, "char_idx": 1}).status_code == 400
+  assert asyncio.run(fetch(database, "SELECT count(*) FROM friends")) == [(0,)]
@@ -0,0 +1,92 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import sessionmaker
+
+import app.backfill_chat_turns as backfill_module
+from app.backfill_chat_turns import backfill_room, backfill_search_text, repair_room_seqs
+from app.models.models import ChatLog, ChatTurn
+from app.utils.common_function import ngram_text
+
+TABLES = [
+  "CREATE TABLE chat_rooms (chat_id TEXT PRIMARY KEY)",
+  "CREATE TABLE chat_logs (session_id TEXT PRIMARY KEY, chat_id TEXT NOT NULL, log TEXT NOT NULL, start_time DATETIME NOT NULL, end_time DATETIME NOT NULL)",
+  """CREATE TABLE chat_turns (
+    turn_idx INTEGER PRIMARY KEY, chat_id TEXT NOT NULL, session_id TEXT, seq INTEGER NOT NULL, speaker TEXT, content TEXT NOT NULL,
+    search_text TEXT, created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP, UNIQUE (chat_id, seq)
+  )""",
+  "CREATE TABLE chat_summaries (chat_id TEXT PRIMARY KEY, summary TEXT NOT NULL, summarized_seq INTEGER NOT NULL, version INTEGER NOT NULL DEFAULT 1, updated_at DATETIME)",
+]
+
+
+@pytest.fixture
+def db(tmp_path):
+  engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+  with engine.begin() as connection:
+    for statement in TABLES:
+      connection.execute(text(statement))
+    connection.execute(text("INSERT INTO chat_rooms VALUES ('r1'), ('r2')"))
+    connection.execute(insert(ChatLog.__table__), [
+      {"session_id": "s1", "chat_id": "r1", "log": "user: 안녕\nchatbot: 반가워", "start_time": datetime(2024, 1, 1), "end_time": datetime(2024, 1, 1)},
+      {"session_id": "s2", "chat_id": "r1", "log": "user: 잘 지냈어?\n시스템 알림 user: 없음", "start_time": datetime(2024, 1, 2), "end_time": datetime(2024, 1, 2)},
+      # 백엔드가 chat_turns에 직접 쓰기 시작한 뒤의 세션은 이미 옮겨져 있음
+      {"session_id": "s3", "chat_id": "r1", "log": "user: 새 대화", "start_time": datetime(2024, 2, 1), "end_time": datetime(2024, 2, 1)},
+    ])
+    connection.execute(insert(ChatTurn.__table__), [
+      {"chat_id": "r1", "seq": 1, "speaker": "user", "content": "새 대화", "created_at": datetime(2024, 2, 1)},
+      {"chat_id": "r1", "seq": 2, "speaker": "chatbot", "content": "응", "created_at": datetime(2024, 2, 1)},
+    ])
+    connection.execute(text("INSERT INTO chat_summaries (chat_id, summary, summarized_seq) VALUES ('r1', '요약', 1)"))
+  session = sessionmaker(bind=engine)()
+  yield session
+  session.close()
+  engine.dispose()
+
+
+def turns(db, chat_id: str) -> list:
+  return [tuple(row) for row in db.execute(
+    text("SELECT seq, session_id, speaker, content FROM chat_turns WHERE chat_id = :chat_id ORDER BY seq"), {"chat_id": chat_id}
+  )]
+
+
+def test_legacy_sessions_are_numbered_from_one_before_the_existing_turns(db):
+  assert backfill_room(db, "r1") == 4
+  db.commit()
+  assert turns(db, "r1") == [
+    (1, "s1", "user", "안녕"),
+    (2, "s1", "chatbot", "반가워"),
+    (3, "s2", "user", "잘 지냈어?"),
+    (4, "s2", None, "시스템 알림 user: 없음"),
+    (5, None, "user", "새 대화"),
+    (6, None, "chatbot", "응"),
+  ]
+  # 요약이 가리키던 대화도 같이 밀림
+  assert db.execute(text("SELECT summarized_seq FROM chat_summaries")).scalar() == 5
+
+  # 다시 실행해도 건너뜀
+  assert backfill_room(db, "r1") == 0
+
+
+def test_rooms_without_turns_get_every_session(db):
+  db.execute(insert(ChatLog.__table__), [{"session_id": "x", "chat_id": "r2", "log": "user: 하나\nchatbot: 둘", "start_time": datetime(2024, 1, 1), "end_time": datetime(2024, 1, 1)}])
+  assert backfill_room(db, "r2") == 2
+  assert [seq for seq, _, _, _ in turns(db, "r2")] == [1, 2]
+
+
+def test_repair_moves_rooms_with_non_positive_seqs_to_start_at_one(db):
+  db.execute(insert(ChatTurn.__table__), [
+    {"chat_id": "r2", "seq": seq, "speaker": "user", "content": f"{seq}"} for seq in (-1, 0, 1)
+  ])
+  db.commit()
+  assert repair_room_seqs(db) == 1
+  assert [(seq, content) for seq, _, _, content in turns(db, "r2")] == [(1, "-1"), (2, "0"), (3, "1")]
+  assert [seq for seq, _, _, _ in turns(db, "r1")] == [1, 2]
+  assert repair_room_seqs(db) == 0
+
+
+def test_search_text_is_filled_in_batches(db, monkeypatch):
+  monkeypatch.setattr(backfill_module, "SEARCH_TEXT_BATCH_SIZE", 1)
+  assert backfill_search_text(db) == 2
+  assert db.execute(text("SELECT search_text FROM chat_turns ORDER BY seq")).scalars().all() == [ngram_text("새 대화"), ngram_text("응")]
+  assert backfill_search_text(db) == 0
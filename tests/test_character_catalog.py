@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+import app.routers.character as character_router
+from app.database.session import get_db
+from app.models.models import Character, Image, ImageMapping, Tag
+from app.services.response_cache import ResponseCache
+
+STARTED = datetime(2024, 1, 1)
+# (char_idx, field_idx, 생성 순서, 팔로워 수, 태그)
+CHARACTERS = [
+  (1, 1, 0, 5, ["판타지"]),
+  (2, 2, 1, 5, ["일상"]),
+  (3, 1, 2, 0, []),
+  (4, 2, 2, 9, ["판타지", "일상"]),
+  (5, 1, 3, 1, ["판타지"]),
+  (6, 3, 4, 2, []),
+]
+
+
+@pytest.fixture
+def client(catalog_db, monkeypatch):
+  catalog_db.execute(insert(Character.__table__), [
+    {
+      "char_idx": char_idx, "field_idx": field_idx, "voice_idx": "v", "char_name": f"캐릭터{char_idx}", "char_description": "",
+      # 3번과 4번은 생성 시각이 같아서 char_idx로 순서가 정해짐
+      "created_at": STARTED + timedelta(days=day), "follower_count": followers, "is_active": char_idx != 6,
+    }
+    for char_idx, field_idx, day, followers, _ in CHARACTERS
+  ])
+  catalog_db.execute(insert(Tag.__table__), [
+    {"char_idx": char_idx, "tag_name": tag, "tag_description": None, "is_deleted": False}
+    for char_idx, _, _, _, tags in CHARACTERS for tag in tags
+  ])
+  catalog_db.execute(insert(Image.__table__), [{"img_idx": 1, "file_path": "app/uploads/1.png"}, {"img_idx": 2, "file_path": "app/uploads/old.png"}])
+  catalog_db.execute(insert(ImageMapping.__table__), [{"char_idx": 1, "img_idx": 1, "is_active": True}, {"char_idx": 1, "img_idx": 2, "is_active": False}])
+  catalog_db.commit()
+
+  monkeypatch.setattr(character_router, "catalog_cache", ResponseCache(max_bytes=1 << 20, ttl=60))
+  app = FastAPI()
+  app.include_router(character_router.router)
+  app.dependency_overrides[get_db] = lambda: catalog_db
+  return TestClient(app)
+
+
+def collect(client, **params) -> list:
+  pages, cursor = [], None
+  while True:
+    response = client.get("/api/characters/catalog", params={**params, **({"cursor": cursor} if cursor else {})})
+    assert response.status_code == 200
+    pages.append([character["char_idx"] for character in response.json()])
+    cursor = response.headers.get("x-next-cursor")
+    if cursor is None:
+      return pages
+
+
+def test_newest_first_pages_without_gaps_across_equal_timestamps(client):
+  assert collect(client, limit=2) == [[5, 4], [3, 2], [1]]
+  assert collect(client, limit=5) == [[5, 4, 3, 2, 1]]
+
+
+def test_popular_sort_breaks_ties_by_char_idx(client):
+  assert collect(client, sort="popular", limit=2) == [[4, 2], [1, 5], [3]]
+
+
+def test_field_and_tag_filters(client):
+  assert collect(client, fields=[2]) == [[4, 2]]
+  assert collect(client, fields=[1, 3]) == [[5, 3, 1]]
+  assert collect(client, tags=["판타지"], limit=2) == [[5, 4], [1]]
+  assert collect(client, tags=["판타지"], fields=[2]) == [[4]]
+
+
+def test_cards_use_the_active_image_and_tags(client):
+  card = client.get("/api/characters/catalog", params={"fields": [1]}).json()[-1]
+  assert card["char_idx"] == 1
+  assert card["character_image"] == "http://testserver/static/1.png"
+  assert card["tags"] == [{"tag_name": "판타지", "tag_description": None}]
+  assert "character_personality" not in card
+
+
+@pytest.mark.parametrize("params", [
+  {"cursor": "not a cursor"},
+  {"sort": "popular", "cursor": "WyIyMDI0LTAxLTAxIiwgMV0"}, # ["2024-01-01", 1]는 팔로워 수가 아님
+  {"sort": "random"},
+])
+def test_invalid_requests_are_rejected(client, params):
+  assert client.get("/api/characters/catalog", params=params).status_code in (400, 422)
+
+
+def test_cached_page_answers_if_none_match_with_304(client):
+  first = client.get("/api/characters/catalog", params={"limit": 2})
+  etag = first.headers["etag"]
+  assert client.get("/api/characters/catalog", params={"limit": 2}, headers={"If-None-Match": etag}).status_code == 304
+  assert client.get("/api/characters/catalog", params={"limit": 3}, headers={"If-None-Match": etag}).status_code == 200
@@ -0,0 +1,69 @@
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app.models.models import Character, CharacterPrompt, Image, ImageMapping, Tag
+from app.routers.character import list_characters
+from app.services.character_loader import CharacterExtras, load_tags
+
+STARTED = datetime(2024, 1, 1)
+
+
+def add_characters(db, char_idxs):
+  db.execute(insert(Character.__table__), [
+    {
+      "char_idx": char_idx, "field_idx": 1, "voice_idx": "v", "char_name": f"캐릭터{char_idx}", "char_description": "",
+      "created_at": STARTED + timedelta(days=char_idx), "nicknames": json.dumps({"30": "너"}), "current_prompt_id": char_idx,
+    }
+    for char_idx in char_idxs
+  ])
+  db.execute(insert(CharacterPrompt.__table__), [
+    {
+      "char_prompt_id": char_idx, "char_idx": char_idx, "character_appearance": "", "character_personality": f"성격{char_idx}",
+      "character_background": "", "character_speech_style": "",
+    }
+    for char_idx in char_idxs
+  ])
+  db.execute(insert(Tag.__table__), [
+    {"char_idx": char_idx, "tag_name": f"태그{char_idx}-{index}", "tag_description": None, "is_deleted": index == 2}
+    for char_idx in char_idxs for index in range(3)
+  ])
+  db.execute(insert(Image.__table__), [{"img_idx": char_idx, "file_path": f"app/uploads/{char_idx}.png"} for char_idx in char_idxs])
+  db.execute(insert(ImageMapping.__table__), [{"char_idx": char_idx, "img_idx": char_idx} for char_idx in char_idxs])
+  db.commit()
+
+
+def test_load_tags_groups_by_character_in_one_query(catalog_db):
+  add_characters(catalog_db, range(1, 4))
+  statements = catalog_db.info["statements"]
+  statements.clear()
+  tags = load_tags(catalog_db, [2, 1, 2, 9])
+  assert len(statements) == 1
+  assert list(tags) == [2, 1, 9]
+  assert tags[1] == [{"tag_name": "태그1-0", "tag_description": None}, {"tag_name": "태그1-1", "tag_description": None}]
+  assert tags[9] == []
+
+  statements.clear()
+  assert load_tags(catalog_db, []) == {}
+  assert CharacterExtras(catalog_db, []).tag_list(1) == []
+  assert statements == []
+
+
+def test_character_list_query_count_does_not_grow_with_the_list(catalog_db):
+  add_characters(catalog_db, range(1, 3))
+  statements = catalog_db.info["statements"]
+  statements.clear()
+  small = list_characters(catalog_db, None)
+  small_queries = len(statements)
+
+  add_characters(catalog_db, range(3, 30))
+  statements.clear()
+  large = list_characters(catalog_db, None)
+  assert len(large) == 29
+  assert len(statements) == small_queries == 2
+
+  assert [character["char_idx"] for character in small] == [1, 2]
+  assert small[0]["tags"] == [{"tag_name": "태그1-0", "tag_description": None}, {"tag_name": "태그1-1", "tag_description": None}]
+  assert small[0]["character_image"] == "/static/1.png"
+  assert small[0]["character_personality"] == "성격1"
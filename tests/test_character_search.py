@@ -0,0 +1,71 @@
+from types import SimpleNamespace
+
+from fastapi import Response
+from sqlalchemy.dialects import postgresql
+
+import app.routers.character as character_router
+from app.routers.character import search_characters
+from app.services.character_search import CharacterSearch, _CatalogIndex
+
+
+def make_character(char_idx: int, name: str, description: str = ""):
+  return SimpleNamespace(char_idx=char_idx, char_name=name, char_description=description, follower_count=0)
+
+
+def memory_search(rows: list) -> CharacterSearch:
+  search = CharacterSearch(backend="memory", refresh=60)
+  search._index = _CatalogIndex(rows)
+  return search
+
+
+def collect_pages(search: CharacterSearch, monkeypatch, query: str, limit: int) -> list:
+  monkeypatch.setattr(character_router, "character_search", search)
+  pages, cursor = [], None
+  while True:
+    response = Response()
+    pages.append([result["id"] for result in search_characters(query, response, limit, cursor, db=None)])
+    cursor = response.headers.get("X-Next-Cursor")
+    if cursor is None:
+      return pages
+
+
+def test_name_matches_outrank_description_and_tag_matches():
+  search = memory_search([
+    (make_character(1, "용사", "마왕을 쓰러뜨린 고양이"), []),
+    (make_character(2, "고양이 기사", "검을 든 기사"), []),
+    (make_character(3, "마법사", "조용한 마법사"), ["고양이"]),
+  ])
+  assert [result["id"] for result in search.search(None, "고양이", 10)] == [2, 1, 3]
+  assert [result["id"] for result in search.autocomplete(None, "고", 10)] == [2]
+
+
+def test_pages_through_tied_ranks_without_gaps_or_repeats(monkeypatch):
+  search = memory_search([(make_character(char_idx, "고양이"), []) for char_idx in range(1, 6)] + [(make_character(6, "강아지"), [])])
+  # 점수가 모두 같은 1~5번이 페이지 경계에 걸쳐도 빠지거나 겹치지 않음
+  assert collect_pages(search, monkeypatch, "고양이", 2) == [[5, 4], [3, 2], [1]]
+  assert collect_pages(search, monkeypatch, "고양이", 5) == [[5, 4, 3, 2, 1], []]
+
+
+class CapturingSession:
+  def __init__(self, rows):
+    self.rows = rows
+    self.statements = []
+
+  def execute(self, statement):
+    self.statements.append(statement)
+    return SimpleNamespace(all=lambda: self.rows)
+
+
+def test_postgres_keyset_compares_and_returns_the_double_rank():
+  search = CharacterSearch(backend="postgres")
+  db = CapturingSession([(make_character(3, "고양이"), 0.0607927106320858)])
+
+  results = search.search(db, "고양이", 2, after=(0.0607927106320858, 5))
+  assert results[0]["rank"] == 0.0607927106320858
+
+  sql = str(db.statements[0].compile(dialect=postgresql.dialect()))
+  rank = "CAST(ts_rank(characters.search_vector, to_tsquery('simple'::regconfig, %(to_tsquery_1)s)) AS FLOAT(53))"
+  assert f"{rank} AS rank" in sql
+  assert f"{rank} < %(param_1)s" in sql
+  assert f"{rank} = %(param_2)s" in sql
+  assert f"ORDER BY {rank} DESC" in sql
@@ -0,0 +1,98 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import app.routers.chat as chat_router
+from app.services.chat_history import ChatHistoryCache, fit_recent_turns, parse_log_turns, render_history
+
+
+def test_parse_log_turns_keeps_speakers_and_unknown_lines():
+  log = "user: 안녕\nchatbot:반가워\n시스템 메시지\n  user:  공백 유지\n이상한 user: 줄"
+  assert parse_log_turns(log) == [("user", "안녕"), ("chatbot", "반가워"), ("user", " 공백 유지"), (None, "이상한 user: 줄")]
+  assert render_history(parse_log_turns(log)) == "user: 안녕\nchatbot: 반가워\nuser:  공백 유지\n이상한 user: 줄\n"
+
+
+def test_fit_recent_turns_stops_at_the_turn_or_token_budget():
+  turns = [("user", "a" * 40), ("chatbot", "b"), ("user", "c")]
+  assert fit_recent_turns(turns, 2, 100) == ([("chatbot", "b"), ("user", "c")], 4)
+  assert fit_recent_turns(turns, 10, 10) == ([("chatbot", "b"), ("user", "c")], 4)
+  assert fit_recent_turns(turns, 0, 100) == ([], 0)
+
+
+def test_ring_buffer_keeps_the_last_turns_and_counts_seq():
+  cache = ChatHistoryCache(max_rooms=4, max_turns=3, ttl=60)
+  loaded = cache.load("r1", [("user", "1"), ("chatbot", "2")], last_seq=10)
+  assert (loaded["last_seq"], loaded["turns"]) == (10, [("user", "1"), ("chatbot", "2")])
+
+  assert cache.append("r1", "user", "3") == 11
+  assert cache.append("r1", "chatbot", "4") == 12
+  snapshot = cache.get("r1")
+  assert snapshot == {"epoch": loaded["epoch"], "last_seq": 12, "turns": [("chatbot", "2"), ("user", "3"), ("chatbot", "4")]}
+  # 스냅샷은 복사본이라 이후 추가의 영향을 받지 않음
+  cache.append("r1", "user", "5")
+  assert len(snapshot["turns"]) == 3 and snapshot["turns"][-1] == ("chatbot", "4")
+
+  # 캐시에 없는 채팅방은 무시
+  assert cache.append("r2", "user", "x") is None
+
+
+def test_reloading_changes_the_epoch():
+  cache = ChatHistoryCache(max_rooms=4, max_turns=3, ttl=60)
+  first = cache.load("r1", [])
+  second = cache.load("r1", [("user", "a")])
+  assert first["epoch"] != second["epoch"]
+  assert second["last_seq"] == 1
+
+
+def test_rooms_are_evicted_least_recently_used_first():
+  cache = ChatHistoryCache(max_rooms=2, max_turns=3, ttl=60)
+  cache.load("r1", [])
+  cache.load("r2", [])
+  cache.get("r1")
+  cache.load("r3", [])
+  assert cache.get("r2") is None
+  assert cache.get("r1") is not None and cache.get("r3") is not None
+  assert cache.stats()["rooms"] == 2
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+  cache = ChatHistoryCache(max_rooms=2, max_turns=3, ttl=5)
+  now = time.monotonic()
+  cache.load("r1", [])
+  monkeypatch.setattr(time, "monotonic", lambda: now + 10)
+  assert cache.get("r1") is None
+  assert (cache.stats()["expired"], cache.stats()["misses"]) == (1, 1)
+
+
+class CountingSession:
+  def __init__(self, rows):
+    self.rows = rows
+    self.queries = 0
+
+  async def execute(self, statement):
+    self.queries += 1
+    return SimpleNamespace(all=lambda: self.rows)
+
+
+def test_get_chat_history_queries_once_then_serves_from_the_cache(monkeypatch):
+  cache = ChatHistoryCache(max_rooms=4, max_turns=10, ttl=60)
+  monkeypatch.setattr(chat_router, "chat_history_cache", cache)
+  flushed = []
+
+  async def flush_room(room_id):
+    flushed.append(room_id)
+  monkeypatch.setattr(chat_router.write_behind, "flush_room", flush_room)
+  # seq 역순으로 조회됨
+  db = CountingSession([SimpleNamespace(seq=6, speaker="chatbot", content="응"), SimpleNamespace(seq=5, speaker="user", content="안녕")])
+
+  async def test():
+    first = await chat_router.get_chat_history(db, "r1")
+    chat_router.append_chat_history("r1", "또", "왔어")
+    second = await chat_router.get_chat_history(db, "r1")
+    return first, second
+  first, second = asyncio.run(test())
+
+  assert (first["last_seq"], first["turns"]) == (6, [("user", "안녕"), ("chatbot", "응")])
+  assert (second["last_seq"], second["turns"][-2:]) == (8, [("user", "또"), ("chatbot", "왔어")])
+  assert db.queries == 1
+  assert flushed == ["r1"]
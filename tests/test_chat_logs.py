@@ -0,0 +1,186 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("aiosqlite")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
+
+import app.routers.chat as chat_router
+from app.database.session import get_async_db
+from app.models.models import ChatLog, ChatTurn
+from app.utils.common_function import encode_cursor, decode_cursor
+
+STARTED = datetime(2024, 1, 1, 12, 0, 0)
+
+TABLES = [
+  "CREATE TABLE chat_logs (session_id TEXT PRIMARY KEY, chat_id TEXT NOT NULL, log TEXT NOT NULL, start_time DATETIME NOT NULL, end_time DATETIME NOT NULL)",
+  """CREATE TABLE chat_turns (
+    turn_idx INTEGER PRIMARY KEY, chat_id TEXT, session_id TEXT, seq INTEGER, speaker TEXT, content TEXT,
+    search_text TEXT, created_at DATETIME DEFAULT CURRENT_TIMESTAMP, UNIQUE (chat_id, seq)
+  )""",
+]
+
+
+class FakeWriteBehind:
+  """
+  flush_room이 불리면 버퍼에 있던 대화를 chat_turns에 씀
+  """
+
+  def __init__(self, factory):
+    self.factory = factory
+    self.pending = {}
+    self.flushed = []
+
+  async def flush_room(self, room_id: str):
+    self.flushed.append(room_id)
+    rows = self.pending.pop(room_id, [])
+    if rows:
+      async with self.factory() as db:
+        await db.execute(insert(ChatTurn.__table__), rows)
+        await db.commit()
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+  # TestClient는 다른 이벤트 루프에서 앱을 실행하므로 커넥션을 재사용하지 않음
+  engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}", poolclass=NullPool)
+
+  async def create():
+    async with engine.begin() as connection:
+      for statement in TABLES:
+        await connection.execute(text(statement))
+      logs = []
+      for i in range(7):
+        # 같은 start_time인 세션이 있어도 session_id로 순서가 정해져야 함
+        start_time = STARTED + timedelta(minutes=i // 2)
+        logs.append({"session_id": f"s{i}", "chat_id": "legacy", "log": f"log {i}", "start_time": start_time, "end_time": start_time})
+      logs.append({"session_id": "other", "chat_id": "other-room", "log": "x", "start_time": STARTED, "end_time": STARTED})
+      # 커서 비교와 같은 형식으로 시각을 저장하도록 모델 테이블로 INSERT (SQLite는 시각을 문자열로 비교)
+      await connection.execute(insert(ChatLog.__table__), logs)
+      # backfill된 채팅방: 옛 세션 로그가 남아 있어도 chat_turns 기준
+      await connection.execute(insert(ChatLog.__table__), [{"session_id": "old", "chat_id": "room", "log": "user: 옛날\n", "start_time": STARTED, "end_time": STARTED}])
+      await connection.execute(insert(ChatTurn.__table__), [
+        {"chat_id": "room", "session_id": "old" if seq == 1 else None, "seq": seq, "speaker": "user" if seq % 2 else "chatbot", "content": f"turn {seq}", "created_at": STARTED}
+        for seq in range(1, 8)
+      ])
+  asyncio.run(create())
+  factory = async_sessionmaker(engine, expire_on_commit=False)
+  monkeypatch.setattr(chat_router, "AsyncSessionLocal", factory)
+  yield factory
+  asyncio.run(engine.dispose())
+
+
+@pytest.fixture
+def write_behind(database, monkeypatch):
+  buffer = FakeWriteBehind(database)
+  monkeypatch.setattr(chat_router, "write_behind", buffer)
+  return buffer
+
+
+@pytest.fixture
+def client(database, write_behind):
+  app = FastAPI()
+  app.include_router(chat_router.router)
+
+  async def override_get_async_db():
+    async with database() as db:
+      yield db
+  app.dependency_overrides[get_async_db] = override_get_async_db
+  return TestClient(app)
+
+
+def session_ids(response) -> list:
+  return [log["session_id"] for log in response.json()]
+
+
+def seqs(response) -> list:
+  return [log["seq"] for log in response.json()]
+
+
+def test_cursor_encoding_round_trips():
+  cursor = encode_cursor(STARTED, "s1")
+  assert decode_cursor(cursor) == [STARTED.isoformat(), "s1"]
+  with pytest.raises(ValueError):
+    decode_cursor("not a cursor")
+
+
+def test_legacy_rooms_page_backward_from_the_latest_logs(client):
+  response = client.get("/api/chat/legacy", params={"limit": 3})
+  assert session_ids(response) == ["s4", "s5", "s6"]
+  assert "x-next-cursor" not in response.headers
+
+  seen = session_ids(response)
+  while "x-prev-cursor" in response.headers:
+    response = client.get("/api/chat/legacy", params={"limit": 3, "before": response.headers["x-prev-cursor"]})
+    seen = session_ids(response) + seen
+  assert seen == [f"s{i}" for i in range(7)]
+
+
+def test_legacy_rooms_page_forward_and_back_again(client):
+  first = client.get("/api/chat/legacy", params={"limit": 3, "before": encode_cursor(STARTED + timedelta(minutes=1), "s2")})
+  assert session_ids(first) == ["s0", "s1"]
+  assert "x-prev-cursor" not in first.headers
+
+  forward = client.get("/api/chat/legacy", params={"limit": 3, "after": first.headers["x-next-cursor"]})
+  assert session_ids(forward) == ["s2", "s3", "s4"]
+  back = client.get("/api/chat/legacy", params={"limit": 3, "before": forward.headers["x-prev-cursor"]})
+  assert session_ids(back) == ["s0", "s1"]
+
+  last = client.get("/api/chat/legacy", params={"limit": 3, "after": forward.headers["x-next-cursor"]})
+  assert session_ids(last) == ["s5", "s6"]
+  assert "x-next-cursor" not in last.headers
+
+
+def test_migrated_rooms_page_through_chat_turns(client):
+  response = client.get("/api/chat/room", params={"limit": 3})
+  assert seqs(response) == [5, 6, 7]
+  assert response.json()[0] == {"session_id": None, "seq": 5, "log": "user: turn 5\n", "start_time": STARTED.isoformat(), "end_time": STARTED.isoformat()}
+
+  seen = seqs(response)
+  while "x-prev-cursor" in response.headers:
+    response = client.get("/api/chat/room", params={"limit": 3, "before": response.headers["x-prev-cursor"]})
+    seen = seqs(response) + seen
+  assert seen == list(range(1, 8))
+
+  forward = client.get("/api/chat/room", params={"limit": 4, "after": encode_cursor(2)})
+  assert seqs(forward) == [3, 4, 5, 6]
+  assert seqs(client.get("/api/chat/room", params={"after": forward.headers["x-next-cursor"]})) == [7]
+
+
+def test_buffered_turns_are_flushed_before_reading(client, write_behind):
+  write_behind.pending["room"] = [{"chat_id": "room", "seq": 8, "speaker": "user", "content": "방금", "created_at": STARTED}]
+  assert seqs(client.get("/api/chat/room", params={"limit": 2})) == [7, 8]
+  assert write_behind.flushed == ["room"]
+
+  # 아직 대화가 없던 채팅방도 버퍼를 먼저 저장하면 chat_turns 기준으로 읽음
+  write_behind.pending["new"] = [{"chat_id": "new", "seq": 1, "speaker": "user", "content": "첫 대화", "created_at": STARTED}]
+  assert client.get("/api/chat/new").json()[0]["log"] == "user: 첫 대화\n"
+
+
+def test_stream_returns_ndjson_after_the_cursor(client):
+  response = client.get("/api/chat/legacy", params={"stream": True, "after": encode_cursor(STARTED + timedelta(minutes=1), "s2")})
+  assert response.headers["content-type"].startswith("application/x-ndjson")
+  assert [json.loads(line)["session_id"] for line in response.text.splitlines()] == ["s3", "s4", "s5", "s6"]
+
+  response = client.get("/api/chat/room", params={"stream": True, "after": encode_cursor(4), "limit": 2})
+  assert [json.loads(line)["seq"] for line in response.text.splitlines()] == [5, 6]
+
+
+@pytest.mark.parametrize("room_id, params", [
+  ("legacy", {"before": encode_cursor(STARTED, "s0"), "after": encode_cursor(STARTED, "s0")}),
+  ("legacy", {"stream": True, "before": encode_cursor(STARTED, "s0")}),
+  ("legacy", {"before": "not a cursor"}),
+  # 다른 테이블 기준 커서
+  ("legacy", {"before": encode_cursor(3)}),
+  ("room", {"after": encode_cursor(STARTED, "s0")}),
+  ("room", {"stream": True, "after": encode_cursor("x")}),
+])
+def test_invalid_cursor_combinations_are_rejected(client, room_id, params):
+  assert client.get(f"/api/chat/{room_id}", params=params).status_code == 400
@@ -0,0 +1,67 @@
+import asyncio
+from types import SimpleNamespace
+
+from fastapi import Response
+from sqlalchemy.dialects import postgresql
+
+from app.routers.chat import parse_search_cursor, search_page
+from app.services.chat_search import ChatSearch, _RoomIndex, query_terms
+
+
+def make_turn(turn_idx: int, content: str, chat_id: str = "r1"):
+  return SimpleNamespace(turn_idx=turn_idx, chat_id=chat_id, session_id=None, seq=turn_idx, speaker="user", content=content, created_at=None)
+
+
+def collect_pages(search: ChatSearch, query: str, limit: int, **scope) -> list:
+  async def pages():
+    pages, after = [], None
+    while True:
+      response = Response()
+      page = search_page(response, await search.search(None, query, limit, after, **scope), limit)
+      pages.append([result["turn_idx"] for result in page])
+      cursor = response.headers.get("X-Next-Cursor")
+      if cursor is None:
+        return pages
+      after = parse_search_cursor(cursor)
+  return asyncio.run(pages())
+
+
+def test_query_terms_use_prefix_search_for_short_tokens():
+  assert query_terms("고양이 a") == [("고양", False), ("양이", False), ("a", True)]
+
+
+def test_memory_search_ranks_and_pages_through_tied_scores():
+  search = ChatSearch(backend="memory")
+  turns = [make_turn(turn_idx, "고양이 좋아") for turn_idx in range(1, 6)]
+  turns.append(make_turn(6, "강아지 좋아"))
+  turns.append(make_turn(7, "고양이 고양이 좋아"))
+  search._rooms["r1"] = _RoomIndex(turns)
+
+  # 점수가 같은 1~5번이 페이지 경계에 걸쳐도 빠지거나 겹치지 않음
+  assert collect_pages(search, "고양이", 2, room_id="r1") == [[7, 5], [4, 3], [2, 1], []]
+  assert collect_pages(search, "고양이", 3, room_id="r1") == [[7, 5, 4], [3, 2, 1], []]
+
+
+class CapturingSession:
+  def __init__(self, rows):
+    self.rows = rows
+    self.statements = []
+
+  async def execute(self, statement):
+    self.statements.append(statement)
+    return SimpleNamespace(all=lambda: self.rows)
+
+
+def test_postgres_keyset_compares_and_returns_the_double_rank():
+  search = ChatSearch(backend="postgres")
+  db = CapturingSession([(make_turn(3, "고양이"), 0.0607927106320858)])
+
+  results = asyncio.run(search.search(db, "고양이", 2, after=(0.0607927106320858, 5), room_id="r1"))
+  assert results[0]["rank"] == 0.0607927106320858
+
+  sql = str(db.statements[0].compile(dialect=postgresql.dialect()))
+  rank = "CAST(ts_rank(to_tsvector('simple'::regconfig, chat_turns.search_text), to_tsquery('simple'::regconfig, %(to_tsquery_1)s)) AS FLOAT(53))"
+  assert f"{rank} AS rank" in sql
+  assert f"{rank} < %(param_1)s" in sql
+  assert f"{rank} = %(param_2)s" in sql
+  assert f"ORDER BY {rank} DESC" in sql
@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import app.routers.chat as chat_router
+from app.database.session import get_async_db
+from app.services.admission import ChatAdmissionController
+
+
+def parse_events(body: str) -> list:
+  events = []
+  for block in body.strip().split("\n\n"):
+    lines = dict(line.split(": ", 1) for line in block.split("\n"))
+    events.append((lines["event"], json.loads(lines["data"])))
+  return events
+
+
+@pytest.fixture
+def chat(monkeypatch):
+  state = {"messages": [], "completed": []}
+  monkeypatch.setattr(chat_router, "chat_admission", ChatAdmissionController(max_concurrency=4, max_queue=10, room_queue_depth=4, queue_timeout=1))
+
+  async def load_chat_context(db, room_id, user_message):
+    return {"room": {"favorability": 10}, "history": {"last_seq": 4}}
+
+  async def stream_chat_turn(context, room_id, user_message, stream=False):
+    assert stream
+    for message in state["messages"]:
+      if isinstance(message, Exception):
+        raise message
+      yield message
+
+  async def complete_chat_turn(room_id, context, user_message, response_data, streamed_text=""):
+    state["completed"].append((room_id, user_message, response_data, streamed_text))
+    return {"user": user_message, "bot": response_data.get("text") or streamed_text, "updated_favorability": response_data.get("favorability")}
+
+  monkeypatch.setattr(chat_router, "load_chat_context", load_chat_context)
+  monkeypatch.setattr(chat_router, "stream_chat_turn", stream_chat_turn)
+  monkeypatch.setattr(chat_router, "complete_chat_turn", complete_chat_turn)
+  app = FastAPI()
+  app.include_router(chat_router.router)
+
+  async def no_db():
+    yield None
+  app.dependency_overrides[get_async_db] = no_db
+  state["client"] = TestClient(app)
+  return state
+
+
+def send(chat, content: str = "안녕"):
+  return chat["client"].post("/api/chat/r1/stream", json={"sender": "user", "content": content})
+
+
+def test_tokens_are_relayed_as_sse_events_then_done(chat):
+  chat["messages"] = [
+    {"type": "token", "text": "안"},
+    {"type": "token", "text": "녕하세요"},
+    {"type": "response", "emotion": "Happy", "favorability": 12},
+  ]
+  response = send(chat)
+  assert response.status_code == 200
+  assert response.headers["content-type"].startswith("text/event-stream")
+  assert response.headers["cache-control"] == "no-cache"
+  assert parse_events(response.text) == [
+    ("token", {"text": "안"}),
+    ("token", {"text": "녕하세요"}),
+    ("done", {"user": "안녕", "bot": "안녕하세요", "updated_favorability": 12}),
+  ]
+  # 호감도/대화 저장은 마지막 메시지에서 한 번만, 스트리밍한 전체 응답과 함께
+  assert chat["completed"] == [("r1", "안녕", {"type": "response", "emotion": "Happy", "favorability": 12}, "안녕하세요")]
+
+
+def test_backend_timeout_ends_the_stream_with_an_error_event(chat):
+  chat["messages"] = [{"type": "token", "text": "안"}, asyncio.TimeoutError()]
+  events = parse_events(send(chat).text)
+  assert events == [("token", {"text": "안"}), ("error", {"detail": "LangChain 서버 응답 시간 초과."})]
+  assert chat["completed"] == []
+  assert chat_router.chat_admission.stats()["active"] == 0
+
+
+def test_backend_error_ends_the_stream_with_an_error_event(chat):
+  chat["messages"] = [ConnectionError("closed")]
+  assert parse_events(send(chat).text) == [("error", {"detail": "LangChain 서버와 통신 중 오류가 발생했습니다."})]
+  assert chat_router.chat_admission.stats()["rooms"] == 0
@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import app.routers.chat as chat_router
+from app.services.admission import ChatAdmissionController
+
+
+class NoSession:
+  async def __aenter__(self):
+    return None
+
+  async def __aexit__(self, *exc_info):
+    return False
+
+
+@pytest.fixture
+def chat(monkeypatch):
+  state = {"replies": [], "contexts": [], "flushed": [], "room_lookups": 0}
+  monkeypatch.setattr(chat_router, "chat_admission", ChatAdmissionController(max_concurrency=4, max_queue=10, room_queue_depth=4, queue_timeout=1))
+  monkeypatch.setattr(chat_router, "AsyncSessionLocal", NoSession)
+
+  async def get_room_persona(db, room_id):
+    state["room_lookups"] += 1
+    if room_id == "missing":
+      raise HTTPException(status_code=404, detail="해당 채팅방 정보를 찾을 수 없습니다.")
+    return {"favorability": 10}, {"character_name": "루나"}
+
+  async def get_prompt_history(db, room_id, user_message):
+    return {"history": {"last_seq": 0}, "summary": "", "memories": []}
+
+  async def stream_chat_turn(context, room_id, user_message, stream=False):
+    state["contexts"].append(dict(context["room"]))
+    for message in state["replies"].pop(0):
+      if isinstance(message, Exception):
+        raise message
+      yield message
+
+  async def complete_chat_turn(room_id, context, user_message, response_data, streamed_text=""):
+    return {"user": user_message, "bot": streamed_text, "updated_favorability": response_data["favorability"]}
+
+  async def flush_room(room_id):
+    state["flushed"].append(room_id)
+
+  monkeypatch.setattr(chat_router, "get_room_persona", get_room_persona)
+  monkeypatch.setattr(chat_router, "get_prompt_history", get_prompt_history)
+  monkeypatch.setattr(chat_router, "stream_chat_turn", stream_chat_turn)
+  monkeypatch.setattr(chat_router, "complete_chat_turn", complete_chat_turn)
+  monkeypatch.setattr(chat_router.write_behind, "flush_room", flush_room)
+  app = FastAPI()
+  app.include_router(chat_router.router)
+  state["client"] = TestClient(app)
+  return state
+
+
+def receive_until_idle(websocket) -> list:
+  messages = [websocket.receive_json()]
+  while messages[-1] != {"type": "typing", "state": False}:
+    messages.append(websocket.receive_json())
+  return messages
+
+
+def test_each_message_is_pushed_as_typing_tokens_and_the_final_reply(chat):
+  chat["replies"] = [
+    [{"type": "token", "text": "안"}, {"type": "token", "text": "녕"}, {"type": "response", "favorability": 12}],
+    [{"type": "response", "favorability": 15}],
+  ]
+  with chat["client"].websocket_connect("/ws/chat/r1") as websocket:
+    websocket.send_json({"content": "안녕"})
+    assert receive_until_idle(websocket) == [
+      {"type": "typing", "state": True},
+      {"type": "token", "text": "안"},
+      {"type": "token", "text": "녕"},
+      {"type": "message", "user": "안녕", "bot": "안녕", "updated_favorability": 12},
+      {"type": "typing", "state": False},
+    ]
+    websocket.send_json({"content": "또"})
+    assert receive_until_idle(websocket)[-2]["updated_favorability"] == 15
+
+  # 채팅방 정보는 연결할 때 한 번만 조회하고, 바뀐 호감도는 다음 턴에 이어서 사용
+  assert chat["room_lookups"] == 1
+  assert [context["favorability"] for context in chat["contexts"]] == [10, 12]
+  assert chat["flushed"] == ["r1"]
+
+
+def test_bad_messages_and_backend_errors_keep_the_connection_open(chat):
+  chat["replies"] = [[asyncio.TimeoutError()], [{"type": "response", "favorability": 11}]]
+  with chat["client"].websocket_connect("/ws/chat/r1") as websocket:
+    websocket.send_json({"text": "content 없음"})
+    assert websocket.receive_json() == {"type": "error", "detail": "content 필드가 필요합니다."}
+
+    websocket.send_json({"content": "안녕"})
+    assert receive_until_idle(websocket) == [
+      {"type": "typing", "state": True},
+      {"type": "error", "status": 504, "detail": "LangChain 서버 응답 시간 초과."},
+      {"type": "typing", "state": False},
+    ]
+
+    websocket.send_json({"content": "다시"})
+    assert receive_until_idle(websocket)[-2]["type"] == "message"
+  assert chat_router.chat_admission.stats()["rooms"] == 0
+
+
+def test_unknown_room_closes_the_connection(chat):
+  with chat["client"].websocket_connect("/ws/chat/missing") as websocket:
+    with pytest.raises(WebSocketDisconnect) as closed:
+      websocket.receive_json()
+  assert closed.value.code == 4404
@@ -0,0 +1,42 @@
+import json
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql
+
+from app.models.models import Character, CharacterPrompt
+from app.routers.character import list_characters
+from app.services.character_loader import select_current_prompt
+
+STARTED = datetime(2024, 1, 1)
+
+
+def add_prompt(db, char_prompt_id: int, char_idx: int, personality: str, created_at: datetime):
+  db.execute(insert(CharacterPrompt.__table__), [{
+    "char_prompt_id": char_prompt_id, "char_idx": char_idx, "created_at": created_at, "character_appearance": "",
+    "character_personality": personality, "character_background": "", "character_speech_style": "",
+  }])
+
+
+def test_characters_join_their_current_prompt_by_primary_key(catalog_db):
+  catalog_db.execute(insert(Character.__table__), [
+    {"char_idx": 1, "field_idx": 1, "voice_idx": "v", "char_name": "루나", "char_description": "", "created_at": STARTED, "nicknames": json.dumps({}), "current_prompt_id": 11},
+    {"char_idx": 2, "field_idx": 1, "voice_idx": "v", "char_name": "솔", "char_description": "", "created_at": STARTED, "nicknames": json.dumps({}), "current_prompt_id": 20},
+  ])
+  add_prompt(catalog_db, 10, 1, "처음 버전", datetime(2024, 1, 1))
+  add_prompt(catalog_db, 11, 1, "수정한 버전", datetime(2024, 2, 1))
+  # 현재 프롬프트는 만든 시각이 아니라 characters.current_prompt_id로 정해짐
+  add_prompt(catalog_db, 20, 2, "현재 버전", datetime(2024, 1, 1))
+  add_prompt(catalog_db, 21, 2, "같은 시각의 다른 버전", datetime(2024, 1, 1))
+  catalog_db.commit()
+
+  rows = catalog_db.execute(select_current_prompt().order_by(Character.char_idx)).all()
+  assert [(character.char_idx, prompt.char_prompt_id) for character, prompt in rows] == [(1, 11), (2, 20)]
+  assert [character["character_personality"] for character in list_characters(catalog_db, None)] == ["수정한 버전", "현재 버전"]
+
+
+def test_current_prompt_query_has_no_per_character_subquery():
+  sql = str(select_current_prompt().compile(dialect=postgresql.dialect()))
+  assert "JOIN char_prompts ON char_prompts.char_prompt_id = characters.current_prompt_id" in sql
+  assert "max(" not in sql.lower()
+  assert sql.count("SELECT") == 1
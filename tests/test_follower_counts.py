@@ -0,0 +1,76 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import insert, text
+
+import app.reconcile_follower_counts as reconcile_module
+import app.routers.user as user_router
+from app.database.session import get_db
+from app.models.models import Character, Friend
+from app.reconcile_follower_counts import reconcile, reconcile_batch
+from app.services.character_loader import load_follower_counts
+
+
+@pytest.fixture
+def db(catalog_db):
+  catalog_db.execute(insert(Character.__table__), [
+    {"char_idx": char_idx, "field_idx": 1, "voice_idx": "v", "char_name": f"캐릭터{char_idx}", "char_description": ""}
+    for char_idx in (1, 2, 3)
+  ])
+  catalog_db.commit()
+  return catalog_db
+
+
+@pytest.fixture
+def client(db):
+  app = FastAPI()
+  app.include_router(user_router.router)
+  app.dependency_overrides[get_db] = lambda: db
+  return TestClient(app)
+
+
+def follower_counts(db) -> dict:
+  return dict(db.execute(text("SELECT char_idx, follower_count FROM characters")).all())
+
+
+def test_follow_and_unfollow_keep_the_counter_in_step(client, db):
+  assert client.post("/api/friends/follow", json={"user_idx": 1, "char_idx": 1}).status_code == 200
+  assert client.post("/api/friends/follow", json={"user_idx": 2, "char_idx": 1}).status_code == 200
+  assert client.post("/api/friends/follow", json={"user_idx": 1, "char_idx": 1}).status_code == 400
+  assert follower_counts(db) == {1: 2, 2: 0, 3: 0}
+
+  assert client.delete("/api/friends/unfollow/1/1").status_code == 200
+  assert client.delete("/api/friends/unfollow/1/1").status_code == 404
+  assert follower_counts(db) == {1: 1, 2: 0, 3: 0}
+  assert client.get("/api/friends/check/2/1").json() == {"is_following": True}
+
+
+def test_counter_never_goes_below_zero(client, db):
+  db.execute(insert(Friend.__table__), [{"user_idx": 1, "char_idx": 2}])
+  db.commit()
+  # 카운터가 집계보다 작게 틀어져 있어도 음수가 되지 않음
+  assert client.delete("/api/friends/unfollow/1/2").status_code == 200
+  assert follower_counts(db)[2] == 0
+
+
+def test_reconcile_fixes_only_drifted_counters(db, monkeypatch):
+  db.execute(insert(Friend.__table__), [
+    {"user_idx": 1, "char_idx": 1, "is_active": True}, {"user_idx": 2, "char_idx": 1, "is_active": True},
+    {"user_idx": 3, "char_idx": 1, "is_active": False}, {"user_idx": 1, "char_idx": 3, "is_active": True},
+  ])
+  db.execute(text("UPDATE characters SET follower_count = CASE char_idx WHEN 1 THEN 5 WHEN 2 THEN 0 ELSE 1 END"))
+  db.commit()
+  assert load_follower_counts(db, [1, 2, 3]) == {1: 2, 2: 0, 3: 1}
+
+  assert reconcile_batch(db, [1, 2, 3]) == 1
+  db.commit()
+  assert follower_counts(db) == {1: 2, 2: 0, 3: 1}
+
+  # 배치로 나눠 전체 캐릭터를 보정
+  db.execute(text("UPDATE characters SET follower_count = 9"))
+  db.commit()
+  monkeypatch.setattr(reconcile_module, "RECONCILE_BATCH_SIZE", 2)
+  monkeypatch.setattr(reconcile_module, "SessionLocal", lambda: db)
+  monkeypatch.setattr(db, "close", lambda: None)
+  reconcile()
+  assert follower_counts(db) == {1: 2, 2: 0, 3: 1}
@@ -0,0 +1,113 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+
+import app.routers.group_chat as group_chat_router
+from app.database.session import get_async_db
+from app.services.admission import ChatAdmissionController
+from app.services.group_chat import GroupChatEngine
+
+MEMBERS = [
+  {"char_idx": 1, "char_name": "A", "persona": {"character_name": "A"}},
+  {"char_idx": 2, "char_name": "B", "persona": {"character_name": "B"}},
+  {"char_idx": 3, "char_name": "C", "persona": {"character_name": "C"}},
+]
+
+
+def test_replies_arrive_as_they_finish_and_run_sorts_them():
+  async def test():
+    engine = GroupChatEngine(max_concurrency=4, timeout=1)
+    delays = {"A": 0.06, "B": 0.02, "C": 0.04}
+
+    async def request(member):
+      await asyncio.sleep(delays[member["char_name"]])
+      return {"text": f"{member['char_name']}!"}
+
+    streamed = [reply["char_name"] async for reply in engine.fan_out(1, MEMBERS, request)]
+    assert streamed == ["B", "C", "A"]
+    replies = await engine.run(1, MEMBERS, request)
+    assert [(reply["order"], reply["text"], reply["status"]) for reply in replies] == [(0, "A!", "ok"), (1, "B!", "ok"), (2, "C!", "ok")]
+    assert engine.stats()["active_groups"] == 0
+  asyncio.run(test())
+
+
+def test_slow_or_failing_member_does_not_block_the_others():
+  async def test():
+    engine = GroupChatEngine(max_concurrency=4, timeout=0.05)
+
+    async def request(member):
+      if member["char_name"] == "A":
+        await asyncio.sleep(1)
+      if member["char_name"] == "B":
+        raise ConnectionError("backend down")
+      return {"text": "ok"}
+
+    replies = await engine.run(1, MEMBERS, request)
+    assert [reply["status"] for reply in replies] == ["timeout", "error", "ok"]
+    assert (engine.stats()["timeouts"], engine.stats()["errors"], engine.stats()["replies"]) == (1, 1, 1)
+  asyncio.run(test())
+
+
+def test_member_calls_share_the_global_llm_limit(monkeypatch):
+  admission = ChatAdmissionController(max_concurrency=2, max_queue=20, room_queue_depth=4, queue_timeout=1)
+  monkeypatch.setattr(group_chat_router, "chat_admission", admission)
+  running = 0
+  peak = 0
+
+  class Backend:
+    async def request(self, payload):
+      nonlocal running, peak
+      running += 1
+      peak = max(peak, running)
+      await asyncio.sleep(0.02)
+      running -= 1
+      return {"text": payload["character_name"]}
+
+  monkeypatch.setattr(group_chat_router.langchain_balancer, "backend_for", lambda key: Backend())
+
+  async def test():
+    group = SimpleNamespace(group_chat_idx=1, chat_prompt="")
+    history = {"turns": [], "last_seq": 0, "epoch": 0}
+    request = group_chat_router.group_member_request(group, MEMBERS * 2, history, "안녕")
+    engine = GroupChatEngine(max_concurrency=6, timeout=1)
+    # 두 그룹이 동시에 보내도 워커 전체에서 LLM 호출은 max_concurrency개까지만
+    replies = await asyncio.gather(engine.run(1, MEMBERS * 2, request), engine.run(2, MEMBERS * 2, request))
+    assert all(reply["status"] == "ok" for group_replies in replies for reply in group_replies)
+
+  asyncio.run(test())
+  assert peak == 2
+  assert admission.stats()["admitted_total"] == 12
+  assert admission.stats()["active"] == 0
+
+
+@pytest.fixture
+def stream_app(monkeypatch):
+  admission = ChatAdmissionController(max_concurrency=4, max_queue=10, room_queue_depth=4, queue_timeout=1)
+  monkeypatch.setattr(group_chat_router, "chat_admission", admission)
+
+  async def load_group(db, group_chat_idx):
+    return SimpleNamespace(group_chat_idx=group_chat_idx, chat_prompt=""), MEMBERS
+
+  async def get_group_history(db, group_chat_idx):
+    return {"turns": [], "last_seq": 0, "epoch": 0}
+
+  monkeypatch.setattr(group_chat_router, "load_group", load_group)
+  monkeypatch.setattr(group_chat_router, "get_group_history", get_group_history)
+  app = FastAPI()
+  app.include_router(group_chat_router.router)
+
+  async def no_db():
+    yield None
+  app.dependency_overrides[get_async_db] = no_db
+  return app, admission
+
+
+def test_group_stream_releases_the_room_when_the_client_disconnects_before_the_first_chunk(stream_app, run_asgi, http_scope):
+  app, admission = stream_app
+  body = json.dumps({"sender": "user", "content": "안녕"}).encode()
+  run_asgi(app, http_scope("POST", "/api/group-chat/1/stream"), [{"type": "http.request", "body": body, "more_body": False}], disconnected=True)
+  assert admission.stats()["rooms"] == 0
+  assert admission.stats()["active"] == 0
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.idempotency import IdempotencyStore
+
+
+def test_concurrent_requests_with_the_same_key_run_once():
+  async def test():
+    store = IdempotencyStore(ttl=60, max_entries=10)
+    calls = 0
+    release = asyncio.Event()
+
+    async def create_room():
+      nonlocal calls
+      calls += 1
+      await release.wait()
+      return {"chat_id": f"room-{calls}"}
+
+    first = asyncio.create_task(store.run("key", "body", create_room))
+    second = asyncio.create_task(store.run("key", "body", create_room))
+    await asyncio.sleep(0)
+    release.set()
+    assert await first == ({"chat_id": "room-1"}, False)
+    assert await second == ({"chat_id": "room-1"}, True)
+
+    # 끝난 뒤 다시 오면 저장된 결과를 반환
+    assert await store.run("key", "body", create_room) == ({"chat_id": "room-1"}, True)
+    assert calls == 1
+    stats = store.stats()
+    assert (stats["executions"], stats["coalesced"], stats["replayed"], stats["in_flight"]) == (1, 1, 1, 0)
+  asyncio.run(test())
+
+
+def test_same_key_with_a_different_body_is_rejected():
+  async def test():
+    store = IdempotencyStore(ttl=60, max_entries=10)
+    async def create_room():
+      return "room"
+    await store.run("key", "body", create_room)
+    with pytest.raises(HTTPException) as error:
+      await store.run("key", "other body", create_room)
+    assert error.value.status_code == 422
+  asyncio.run(test())
+
+
+def test_failed_request_is_not_stored():
+  async def test():
+    store = IdempotencyStore(ttl=60, max_entries=10)
+    attempts = 0
+
+    async def flaky():
+      nonlocal attempts
+      attempts += 1
+      if attempts == 1:
+        raise RuntimeError("db down")
+      return "room"
+
+    with pytest.raises(RuntimeError):
+      await store.run("key", "body", flaky)
+    assert await store.run("key", "body", flaky) == ("room", False)
+    assert attempts == 2
+  asyncio.run(test())
+
+
+def test_first_client_disconnecting_does_not_cancel_the_work():
+  async def test():
+    store = IdempotencyStore(ttl=60, max_entries=10)
+    release = asyncio.Event()
+
+    async def create_room():
+      await release.wait()
+      return "room"
+
+    first = asyncio.create_task(store.run("key", "body", create_room))
+    await asyncio.sleep(0)
+    first.cancel()
+    second = asyncio.create_task(store.run("key", "body", create_room))
+    await asyncio.sleep(0)
+    release.set()
+    assert await second == ("room", True)
+    assert store.stats()["executions"] == 1
+  asyncio.run(test())
+
+
+def test_expired_entries_run_again():
+  async def test():
+    store = IdempotencyStore(ttl=0, max_entries=10)
+    calls = 0
+
+    async def create_room():
+      nonlocal calls
+      calls += 1
+      return calls
+
+    assert await store.run("key", "body", create_room) == (1, False)
+    await asyncio.sleep(0.01)
+    assert await store.run("key", "body", create_room) == (2, False)
+  asyncio.run(test())
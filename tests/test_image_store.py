@@ -0,0 +1,229 @@
+import asyncio
+import hashlib
+import io
+import os
+import time
+
+import pytest
+
+pytest.importorskip("aiosqlite")
+
+from fastapi import UploadFile
+from sqlalchemy import event, text
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import now
+
+import app.services.image_store as image_store_module
+from app.services.image_store import ImageStore
+
+TABLES = [
+  "CREATE TABLE images (img_idx INTEGER PRIMARY KEY AUTOINCREMENT, file_path VARCHAR(255) NOT NULL, content_hash VARCHAR(64), ref_count INTEGER NOT NULL DEFAULT 0, released_at FLOAT)",
+  "CREATE UNIQUE INDEX uq_images_content_hash ON images (content_hash) WHERE content_hash IS NOT NULL",
+  "CREATE TABLE image_mapping (char_idx INTEGER, img_idx INTEGER, is_active BOOLEAN NOT NULL DEFAULT 1, PRIMARY KEY (char_idx, img_idx))",
+  "CREATE TABLE images_prompts (images_prompts_idx INTEGER PRIMARY KEY, img_idx INTEGER)",
+]
+
+PNG_A = b"\x89PNG\r\n\x1a\n" + b"a" * 100
+PNG_B = b"\x89PNG\r\n\x1a\n" + b"b" * 100
+GIF_C = b"GIF89a" + b"c" * 100
+A, B = hashlib.sha256(PNG_A).hexdigest(), hashlib.sha256(PNG_B).hexdigest()
+
+
+@compiles(now, "sqlite")
+def _compile_now(element, compiler, **kw):
+  # SQLite 방언은 now()를 CURRENT_TIMESTAMP(문자열)로 바꾸므로 FakePostgres의 now()를 호출하도록 함
+  return "now()"
+
+
+class FakePostgres:
+  """
+  SQLite에서 PostgreSQL 함수(now, greatest, advisory lock)를 흉내 냅니다.
+  released_at은 now()가 돌려주는 epoch 초로 저장되고, clock_offset으로 시간을 앞당깁니다.
+  """
+
+  def __init__(self):
+    self.clock_offset = 0.0
+    self.locked = False
+
+  def register(self, connection, record):
+    connection.create_function("now", 0, lambda: time.time() + self.clock_offset)
+    connection.create_function("greatest", 2, max)
+    connection.create_function("pg_try_advisory_lock", 1, lambda key: 0 if self.locked else 1)
+    connection.create_function("pg_advisory_unlock", 1, lambda key: 1)
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+  engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+  postgres = FakePostgres()
+  event.listen(engine.sync_engine, "connect", postgres.register)
+
+  async def create():
+    async with engine.begin() as connection:
+      for statement in TABLES:
+        await connection.execute(text(statement))
+  asyncio.run(create())
+
+  factory = async_sessionmaker(engine, expire_on_commit=False)
+  monkeypatch.setattr(image_store_module, "AsyncSessionLocal", factory)
+  monkeypatch.setattr(image_store_module, "async_engine", engine)
+  monkeypatch.setattr(image_store_module, "insert", sqlite.insert) # ON CONFLICT 문법이 같음
+  monkeypatch.setattr(image_store_module, "timedelta", lambda seconds: seconds) # released_at이 epoch 초
+  directory = str(tmp_path / "characters") + os.sep
+  yield factory, postgres, directory
+  asyncio.run(engine.dispose())
+
+
+def upload(content: bytes) -> UploadFile:
+  return UploadFile(io.BytesIO(content), filename="upload.png")
+
+
+async def images(factory) -> list:
+  async with factory() as db:
+    rows = await db.execute(text("SELECT content_hash, ref_count, released_at IS NOT NULL FROM images ORDER BY img_idx"))
+    return [(content_hash[:8], ref_count, bool(released)) for content_hash, ref_count, released in rows]
+
+
+async def mappings(factory) -> list:
+  async with factory() as db:
+    rows = await db.execute(text(
+      "SELECT image_mapping.char_idx, images.content_hash FROM image_mapping JOIN images USING (img_idx) ORDER BY char_idx"
+    ))
+    return [(char_idx, content_hash[:8]) for char_idx, content_hash in rows]
+
+
+def age_files(directory: str, seconds: float):
+  for name in os.listdir(directory):
+    path = os.path.join(directory, name)
+    modified = os.stat(path).st_mtime - seconds
+    os.utime(path, (modified, modified))
+
+
+def test_same_content_shares_one_row_and_file(env):
+  factory, _, directory = env
+
+  async def test():
+    store = ImageStore(directory=directory, enabled=False, grace=3600)
+    async with factory() as db:
+      first = await store.attach(db, 1, upload(PNG_A))
+      await db.commit()
+      second = await store.attach(db, 2, upload(PNG_A))
+      await db.commit()
+    assert first == second
+    assert os.path.basename(first) == f"{A}.png"
+    assert await images(factory) == [(A[:8], 2, False)]
+    assert await mappings(factory) == [(1, A[:8]), (2, A[:8])]
+    assert os.listdir(directory) == [os.path.basename(first)]
+    assert store.stats()["deduplicated"] == 1
+  asyncio.run(test())
+
+
+def test_replacing_and_reuploading_keep_ref_counts_exact(env):
+  factory, _, directory = env
+
+  async def test():
+    store = ImageStore(directory=directory, enabled=False, grace=3600)
+    async with factory() as db:
+      await store.attach(db, 1, upload(PNG_A))
+      await db.commit()
+      # 같은 이미지를 다시 올려도 참조는 늘지 않음
+      await store.attach(db, 1, upload(PNG_A))
+      await db.commit()
+      assert await images(factory) == [(A[:8], 1, False)]
+
+      # 다른 이미지로 바꾸면 이전 이미지의 참조가 0이 되고 released_at 기록
+      await store.attach(db, 1, upload(PNG_B))
+      await db.commit()
+    assert await images(factory) == [(A[:8], 0, True), (B[:8], 1, False)]
+    assert await mappings(factory) == [(1, B[:8])]
+  asyncio.run(test())
+
+
+def test_sweep_waits_for_grace_and_keeps_referenced_and_unmanaged_files(env):
+  factory, postgres, directory = env
+
+  async def test():
+    store = ImageStore(directory=directory, enabled=False, grace=3600)
+    async with factory() as db:
+      await store.attach(db, 1, upload(PNG_A))
+      await db.commit()
+      await store.attach(db, 1, upload(PNG_B))
+      await db.commit()
+      # 롤백된 업로드는 행 없이 파일만 남음
+      await store.attach(db, 2, upload(GIF_C))
+      await db.rollback()
+    part_file = "." + "0" * 32 + ".part"
+    for name in ("legacy_upload.png", part_file):
+      with open(os.path.join(directory, name), "wb") as file:
+        file.write(b"x")
+
+    # 유예 시간 전에는 아무것도 지우지 않음
+    assert await store.sweep() == (0, 0)
+    assert len(os.listdir(directory)) == 5
+
+    postgres.clock_offset = 7200
+    age_files(directory, 7200)
+    assert await store.sweep() == (1, 2)
+    assert sorted(os.listdir(directory)) == sorted([f"{B}.png", "legacy_upload.png"])
+    assert await images(factory) == [(B[:8], 1, False)]
+    assert store.stats()["swept_images"] == 1
+    assert store.stats()["swept_files"] == 2
+  asyncio.run(test())
+
+
+def test_image_reused_during_grace_is_not_swept(env):
+  factory, postgres, directory = env
+
+  async def test():
+    store = ImageStore(directory=directory, enabled=False, grace=3600)
+    async with factory() as db:
+      await store.attach(db, 1, upload(PNG_A))
+      await db.commit()
+      await store.attach(db, 1, upload(PNG_B))
+      await db.commit()
+      # 참조가 0이 된 이미지를 다른 캐릭터가 다시 씀
+      await store.attach(db, 2, upload(PNG_A))
+      await db.commit()
+
+    postgres.clock_offset = 7200
+    age_files(directory, 7200)
+    assert await store.sweep() == (0, 0)
+    assert await images(factory) == [(A[:8], 1, False), (B[:8], 1, False)]
+    assert len(os.listdir(directory)) == 2
+  asyncio.run(test())
+
+
+def test_sweep_is_skipped_while_another_worker_holds_the_lock(env):
+  factory, postgres, directory = env
+
+  async def test():
+    store = ImageStore(directory=directory, enabled=False, grace=0)
+    async with factory() as db:
+      await store.attach(db, 1, upload(PNG_A))
+      await store.attach(db, 1, upload(PNG_B))
+      await db.commit()
+    postgres.clock_offset = 10
+    age_files(directory, 10)
+
+    postgres.locked = True
+    assert await store.sweep() == (0, 0)
+    assert store.stats()["skipped_sweeps"] == 1
+    assert store.stats()["sweeps"] == 0
+    assert len(os.listdir(directory)) == 2
+
+    postgres.locked = False
+    assert await store.sweep() == (1, 0) # 지운 행의 파일은 행 수로만 셈
+    assert os.listdir(directory) == [f"{B}.png"]
+  asyncio.run(test())
+
+
+def test_start_does_nothing_unless_enabled(env):
+  _, _, directory = env
+
+  async def test():
+    store = ImageStore(directory=directory, enabled=False)
+    store.start()
+    assert store._worker is None
+  asyncio.run(test())
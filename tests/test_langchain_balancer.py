@@ -0,0 +1,118 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.langchain_balancer import ConsistentHashRing, LangChainBalancer
+
+ROOMS = [f"room-{i}" for i in range(500)]
+
+
+class FakePool:
+  def __init__(self):
+    self.fail = False
+    self.closed = False
+
+  async def stream(self, payload):
+    if self.fail:
+      raise ConnectionError("connection refused")
+    yield {"type": "response", "text": "응"}
+
+  async def close(self):
+    self.closed = True
+
+  def stats(self):
+    return {}
+
+
+def make_balancer(uris, eject_failures: int = 2, eject_seconds: float = 30) -> LangChainBalancer:
+  balancer = LangChainBalancer(uris, vnodes=64, eject_failures=eject_failures, eject_seconds=eject_seconds)
+  for backend in balancer.backends.values():
+    backend.pool = FakePool()
+  return balancer
+
+
+def fail(backend, times: int):
+  backend.pool.fail = True
+
+  async def requests():
+    for _ in range(times):
+      with pytest.raises(ConnectionError):
+        await backend.request({"room_id": "r"})
+  asyncio.run(requests())
+  backend.pool.fail = False
+
+
+def test_ring_spreads_rooms_and_moves_only_the_new_nodes_share():
+  ring = ConsistentHashRing(vnodes=64)
+  for node in ["a", "b", "c"]:
+    ring.add(node)
+  before = {room: next(ring.nodes_for(room)) for room in ROOMS}
+  assert all(count > 100 for count in [list(before.values()).count(node) for node in "abc"])
+
+  ring.add("d")
+  after = {room: next(ring.nodes_for(room)) for room in ROOMS}
+  moved = [room for room in ROOMS if before[room] != after[room]]
+  assert moved and all(after[room] == "d" for room in moved)
+
+  ring.remove("d")
+  assert {room: next(ring.nodes_for(room)) for room in ROOMS} == before
+  assert sorted(ring.nodes_for("room-1")) == ["a", "b", "c"]
+
+
+def test_same_room_always_goes_to_the_same_backend():
+  balancer = make_balancer(["ws://a", "ws://b", "ws://c"])
+  assert all(balancer.backend_for(room) is balancer.backend_for(room) for room in ROOMS[:50])
+
+
+def test_failing_backend_is_ejected_and_only_its_rooms_move(monkeypatch):
+  balancer = make_balancer(["ws://a", "ws://b", "ws://c"], eject_failures=2, eject_seconds=30)
+  before = {room: balancer.backend_for(room).uri for room in ROOMS}
+  backend = balancer.backends["ws://a"]
+
+  fail(backend, 1)
+  assert backend.healthy
+  fail(backend, 1)
+  assert not backend.healthy
+  assert backend.stats()["consecutive_failures"] == 2
+
+  after = {room: balancer.backend_for(room).uri for room in ROOMS}
+  assert all(after[room] == before[room] for room in ROOMS if before[room] != "ws://a")
+  assert all(after[room] != "ws://a" for room in ROOMS)
+
+  # 제외 시간이 지나면 원래 채팅방이 돌아오고, 성공하면 실패 횟수가 초기화됨
+  now = time.monotonic()
+  monkeypatch.setattr(time, "monotonic", lambda: now + 31)
+  assert {room: balancer.backend_for(room).uri for room in ROOMS} == before
+  assert asyncio.run(backend.request({"room_id": "r"})) == {"type": "response", "text": "응"}
+  assert backend.consecutive_failures == 0
+
+
+def test_success_between_failures_resets_the_count():
+  balancer = make_balancer(["ws://a"], eject_failures=2)
+  backend = balancer.backends["ws://a"]
+  fail(backend, 1)
+  asyncio.run(backend.request({"room_id": "r"}))
+  fail(backend, 1)
+  assert backend.healthy
+  assert backend.stats()["errors"] == 2
+
+
+def test_all_backends_ejected_falls_back_to_the_primary():
+  balancer = make_balancer(["ws://a", "ws://b"], eject_failures=1)
+  primary = balancer.backend_for("room-1")
+  for backend in balancer.backends.values():
+    fail(backend, 1)
+  assert balancer.backend_for("room-1") is primary
+
+
+def test_removed_backend_is_closed_and_no_longer_routed():
+  balancer = make_balancer(["ws://a", "ws://b"])
+  pool = balancer.backends["ws://a"].pool
+  asyncio.run(balancer.remove_backend("ws://a"))
+  assert pool.closed
+  assert {balancer.backend_for(room).uri for room in ROOMS} == {"ws://b"}
+
+  asyncio.run(balancer.remove_backend("ws://b"))
+  with pytest.raises(RuntimeError):
+    balancer.backend_for("room-1")
@@ -0,0 +1,171 @@
+import asyncio
+import json
+
+import pytest
+
+websockets = pytest.importorskip("websockets")
+
+from app.services.langchain_client import LangChainConnectionPool, LangChainError
+
+
+async def echo_server(websocket):
+  # request_id를 돌려주고, 요청마다 지정한 시간만큼 늦게 응답 (늦게 보낸 요청이 먼저 끝남)
+  async def reply(message):
+    await asyncio.sleep(message.get("delay", 0))
+    if message.get("malformed"):
+      await websocket.send("{not json")
+    await websocket.send(json.dumps({"type": "token", "text": "", "request_id": message["request_id"]}))
+    await websocket.send(json.dumps({"type": "done", "text": message["text"], "request_id": message["request_id"]}))
+  async for raw in websocket:
+    asyncio.create_task(reply(json.loads(raw)))
+
+
+async def plain_server(websocket):
+  # request_id를 돌려주지 않는 서버
+  async def reply(message):
+    await asyncio.sleep(message.get("delay", 0))
+    await websocket.send(json.dumps({"type": "done", "text": message["text"]}))
+  async for raw in websocket:
+    asyncio.create_task(reply(json.loads(raw)))
+
+
+async def dropping_server(websocket):
+  # 첫 요청은 응답 없이 연결을 끊고, 그 뒤로는 정상 응답
+  async for raw in websocket:
+    message = json.loads(raw)
+    if message["text"] == "drop":
+      await websocket.close()
+      return
+    await websocket.send(json.dumps({"type": "done", "text": message["text"], "request_id": message["request_id"]}))
+
+
+def room_query_server(paths):
+  # 기존(v1) 서버처럼 연결 주소의 room_id로 채팅방을 구분
+  async def handler(websocket):
+    paths.append(websocket.request.path)
+    room_id = websocket.request.path.split("room_id=")[-1]
+    async for raw in websocket:
+      message = json.loads(raw)
+      await asyncio.sleep(message.get("delay", 0))
+      await websocket.send(json.dumps({"type": "done", "text": f"{room_id}:{message['text']}"}))
+  return handler
+
+
+def run_with_server(handler, test):
+  async def main():
+    async with websockets.serve(handler, "127.0.0.1", 0) as server:
+      port = server.sockets[0].getsockname()[1]
+      await test(f"ws://127.0.0.1:{port}")
+  asyncio.run(main())
+
+
+def test_replies_are_routed_by_request_id():
+  async def test(uri):
+    pool = LangChainConnectionPool(uri, size=1, max_in_flight=4, timeout=2)
+    try:
+      assert (await pool.request({"text": "first"}))["text"] == "first"
+      assert pool.connections[0].echoes_request_id
+
+      responses = await asyncio.gather(*[pool.request({"text": f"m{i}", "delay": 0.05 * (3 - i)}) for i in range(3)])
+      assert [response["text"] for response in responses] == ["m0", "m1", "m2"]
+      assert pool.stats()["connected"] == 1
+      assert pool.stats()["in_flight"] == 0
+    finally:
+      await pool.close()
+  run_with_server(echo_server, test)
+
+
+def test_malformed_frame_does_not_fail_the_connection():
+  async def test(uri):
+    pool = LangChainConnectionPool(uri, size=1, max_in_flight=4, timeout=2)
+    try:
+      results = await asyncio.gather(
+        pool.request({"text": "bad", "malformed": True}),
+        pool.request({"text": "ok", "delay": 0.05}),
+      )
+      assert [result["text"] for result in results] == ["bad", "ok"]
+      assert pool.stats()["malformed_total"] == 1
+      assert pool.stats()["errors_total"] == 0
+    finally:
+      await pool.close()
+  run_with_server(echo_server, test)
+
+
+def test_server_without_request_id_gets_one_request_per_connection():
+  async def test(uri):
+    pool = LangChainConnectionPool(uri, size=1, max_in_flight=4, timeout=2)
+    try:
+      # 늦게 보낸 요청이 먼저 응답하는 서버라도 한 번에 하나씩 보내므로 응답이 섞이지 않음
+      responses = await asyncio.gather(*[pool.request({"text": f"p{i}", "delay": 0.05 * (3 - i)}) for i in range(3)])
+      assert [response["text"] for response in responses] == ["p0", "p1", "p2"]
+      assert pool.stats()["capacity"] == 1
+      assert not pool.connections[0].echoes_request_id
+    finally:
+      await pool.close()
+  run_with_server(plain_server, test)
+
+
+def test_timed_out_reply_is_not_delivered_to_the_next_request():
+  async def test(uri):
+    pool = LangChainConnectionPool(uri, size=1, max_in_flight=4, timeout=0.2)
+    try:
+      with pytest.raises(asyncio.TimeoutError):
+        await pool.request({"text": "slow", "delay": 0.4})
+      # 시간 초과한 커넥션은 버리고 새로 연결하므로 늦게 온 "slow" 응답을 받지 않음
+      assert (await pool.request({"text": "after"}))["text"] == "after"
+      await asyncio.sleep(0.4)
+      assert pool.stats()["reconnects_total"] == 1
+    finally:
+      await pool.close()
+  run_with_server(plain_server, test)
+
+
+def test_dropped_connection_fails_pending_request_and_reconnects():
+  async def test(uri):
+    pool = LangChainConnectionPool(uri, size=1, max_in_flight=4, timeout=2, backoff_base=0.01)
+    try:
+      with pytest.raises(LangChainError):
+        await pool.request({"text": "drop"})
+      assert not pool.connections[0].connected
+
+      assert (await pool.request({"text": "again"}))["text"] == "again"
+      assert pool.stats()["reconnects_total"] == 1
+      assert pool.stats()["errors_total"] == 1
+    finally:
+      await pool.close()
+  run_with_server(dropping_server, test)
+
+
+def test_room_query_pool_connects_per_room():
+  paths = []
+
+  async def test(uri):
+    pool = LangChainConnectionPool(uri, size=1, max_in_flight=4, timeout=2, room_query=True)
+    try:
+      for room_id in ("a", "a", "b", "a"):
+        response = await pool.request({"room_id": room_id, "text": "hi"})
+        assert response["text"] == f"{room_id}:hi"
+      # 같은 채팅방은 커넥션을 이어 쓰고, 다른 채팅방이면 그 채팅방 주소로 다시 연결
+      assert paths == ["/?room_id=a", "/?room_id=b", "/?room_id=a"]
+      assert pool.stats()["room_switches_total"] == 2
+      assert pool.stats()["reconnects_total"] == 0
+    finally:
+      await pool.close()
+  run_with_server(room_query_server(paths), test)
+
+
+def test_room_query_pool_never_mixes_rooms_on_a_connection():
+  paths = []
+
+  async def test(uri):
+    pool = LangChainConnectionPool(uri, size=2, max_in_flight=4, timeout=2, room_query=True)
+    try:
+      responses = await asyncio.gather(*[
+        pool.request({"room_id": room_id, "text": str(i), "delay": 0.05})
+        for i, room_id in enumerate(["a", "b", "a", "b", "c"])
+      ])
+      assert [response["text"] for response in responses] == ["a:0", "b:1", "a:2", "b:3", "c:4"]
+      assert pool.stats()["in_flight"] == 0
+    finally:
+      await pool.close()
+  run_with_server(room_query_server(paths), test)
@@ -0,0 +1,100 @@
+import asyncio
+
+from app.services.langchain_protocol import PersonaDeltaProtocol, build_full_payload
+
+ROOM = {"char_prompt_id": 5, "char_idx": 1, "user_unique_name": "나", "user_introduction": "학생", "favorability": 40}
+PERSONA = {"character_name": "루나", "character_personality": "밝음"}
+
+
+class FakeBackend:
+  def __init__(self, uri: str = "ws://a", replies=None):
+    self.uri = uri
+    self.sent = []
+    self.replies = replies or {}
+
+  async def stream(self, payload):
+    self.sent.append(payload)
+    for message in self.replies.get(payload.get("type"), [{"type": "response", "text": "응"}]):
+      yield message
+
+  async def request(self, payload):
+    response = None
+    async for message in self.stream(payload):
+      response = message
+    return response
+
+
+def history(epoch: int, turns: list) -> dict:
+  return {"epoch": epoch, "last_seq": len(turns), "turns": turns}
+
+
+def run(protocol, backend, history, message: str = "안녕", **options) -> list:
+  async def collect():
+    return [reply async for reply in protocol.stream(backend, "r1", ROOM, PERSONA, history, message, **options)]
+  return asyncio.run(collect())
+
+
+def test_v1_sends_the_full_persona_and_history_every_turn():
+  protocol = PersonaDeltaProtocol(version=1, max_entries=10)
+  backend = FakeBackend()
+  turns = [("user", "a"), ("chatbot", "b")]
+  assert run(protocol, backend, history(1, turns), stream=True, memories=[("user", "예전")], summary="요약") == [{"type": "response", "text": "응"}]
+  assert backend.sent == [{
+    **build_full_payload("r1", ROOM, PERSONA, history(1, turns), "안녕", [("user", "예전")], "요약"),
+    "stream": True,
+  }]
+  assert backend.sent[0]["chat_history"] == "user: a\nchatbot: b\n"
+  assert protocol.stats()["full_requests"] == 1
+
+
+def test_v2_registers_once_then_sends_only_new_turns():
+  protocol = PersonaDeltaProtocol(version=2, max_entries=10)
+  backend = FakeBackend()
+  turns = [("user", "a"), ("chatbot", "b")]
+  run(protocol, backend, history(1, turns))
+  assert [payload["type"] for payload in backend.sent] == ["register_persona", "chat"]
+  assert backend.sent[0]["persona"] == PERSONA
+  assert backend.sent[1]["history_reset"] is True
+  assert len(backend.sent[1]["history_delta"]) == 2
+  assert "character_personality" not in backend.sent[1]
+
+  # 서버는 이전 요청과 응답까지 알고 있으므로 그 이후의 대화만 보냄
+  turns += [("user", "안녕"), ("chatbot", "응"), ("user", "c"), ("chatbot", "d")]
+  run(protocol, backend, history(1, turns), message="e")
+  assert [payload["type"] for payload in backend.sent] == ["register_persona", "chat", "chat"]
+  assert backend.sent[2]["history_reset"] is False
+  assert backend.sent[2]["history_delta"] == [{"speaker": "user", "text": "c"}, {"speaker": "chatbot", "text": "d"}]
+  assert protocol.stats()["registrations"] == 1
+
+
+def test_v2_resets_history_when_the_cache_epoch_changes():
+  protocol = PersonaDeltaProtocol(version=2, max_entries=10)
+  backend = FakeBackend()
+  run(protocol, backend, history(1, [("user", "a")]))
+  run(protocol, backend, history(2, [("user", "a"), ("user", "안녕"), ("chatbot", "응")]))
+  assert backend.sent[-1]["history_reset"] is True
+  assert len(backend.sent[-1]["history_delta"]) == 3
+
+
+def test_v2_each_backend_gets_its_own_registration():
+  protocol = PersonaDeltaProtocol(version=2, max_entries=10)
+  first, second = FakeBackend("ws://a"), FakeBackend("ws://b")
+  run(protocol, first, history(1, []))
+  run(protocol, second, history(1, []))
+  assert [payload["type"] for payload in second.sent] == ["register_persona", "chat"]
+  assert second.sent[1]["history_reset"] is True
+
+
+def test_v2_cache_miss_falls_back_to_a_full_request_and_registers_again():
+  protocol = PersonaDeltaProtocol(version=2, max_entries=10)
+  backend = FakeBackend(replies={"chat": [{"type": "error", "error": "persona_cache_miss"}]})
+  replies = run(protocol, backend, history(1, [("user", "a")]))
+  assert replies == [{"type": "response", "text": "응"}]
+  assert [payload.get("type") for payload in backend.sent] == ["register_persona", "chat", None]
+  assert backend.sent[2]["character_personality"] == "밝음"
+  assert protocol.stats()["cache_misses"] == 1
+
+  backend.replies = {}
+  run(protocol, backend, history(1, [("user", "a")]))
+  assert [payload.get("type") for payload in backend.sent[3:]] == ["register_persona", "chat"]
+  assert backend.sent[4]["history_reset"] is True
@@ -0,0 +1,76 @@
+import asyncio
+import threading
+
+import numpy as np
+
+from app.services.memory_index import MemoryIndexCache, RoomMemory, hashing_embedding
+
+
+def test_hashing_embedding_rows_are_normalized():
+  matrix = hashing_embedding(["고양이 좋아", "", "강아지"], 64)
+  assert matrix.shape == (3, 64)
+  assert np.allclose(np.linalg.norm(matrix, axis=1), [1.0, 0.0, 1.0])
+
+
+def test_room_memory_drops_oldest_turns_past_max_turns():
+  memory = RoomMemory(8, max_turns=100)
+  rows = [(seq, "user", f"대화 {seq}") for seq in range(1, 151)]
+  memory.add(rows, hashing_embedding([content for _, _, content in rows], 8))
+  assert memory.size == 100
+  assert len(memory.vectors) == 150
+  assert (int(memory.seqs[0]), memory.last_seq) == (51, 150)
+  assert memory.turns[0] == ("user", "대화 51")
+
+
+def test_search_finds_similar_turns_below_max_seq():
+  async def test():
+    index = MemoryIndexCache(hashing_embedding, dim=256, max_rooms=4, max_turns=100, max_bytes=1 << 20)
+    await index.load("r1", [(1, "user", "고양이 이름은 나비야"), (2, "chatbot", "날씨가 좋네요"), (3, "user", "고양이 나비 보고 싶다")])
+    results = await index.search("r1", "고양이 나비", k=2, max_seq=2, min_score=0.1)
+    assert [(seq, turn) for _, seq, turn in results] == [(1, ("user", "고양이 이름은 나비야"))]
+    assert await index.search("r2", "고양이", k=2, max_seq=10) == []
+  asyncio.run(test())
+
+
+def test_add_skips_turns_already_indexed_and_unknown_rooms():
+  async def test():
+    index = MemoryIndexCache(hashing_embedding, dim=16, max_rooms=4, max_turns=100, max_bytes=1 << 20)
+    await index.add("r1", [(1, "user", "무시됨")])
+    assert not index.has("r1")
+    await index.load("r1", [(1, "user", "안녕")])
+    await asyncio.gather(index.add("r1", [(2, "user", "a"), (3, "chatbot", "b")]), index.add("r1", [(2, "user", "a"), (3, "chatbot", "b")]))
+    assert index.stats()["indexed_turns"] == 3
+  asyncio.run(test())
+
+
+def test_cache_is_capped_by_total_bytes():
+  async def test():
+    room_bytes = RoomMemory(64, 1000).nbytes
+    index = MemoryIndexCache(hashing_embedding, dim=64, max_rooms=100, max_turns=1000, max_bytes=room_bytes * 3)
+    for room in range(5):
+      await index.load(f"r{room}", [(1, "user", "안녕")])
+    assert list(index._rooms) == ["r2", "r3", "r4"]
+    assert index.stats()["evictions"] == 2
+
+    # 대화가 늘어 행렬이 커지면 오래 안 쓴 채팅방부터 버림
+    assert index.has("r2")
+    await index.add("r2", [(seq, "user", f"대화 {seq}") for seq in range(2, 200)])
+    assert list(index._rooms) == ["r2"]
+    assert index.stats()["evictions"] == 4
+  asyncio.run(test())
+
+
+def test_embedding_and_search_run_off_the_event_loop():
+  loop_thread = threading.get_ident()
+  threads = set()
+
+  def embed(texts, dim):
+    threads.add(threading.get_ident())
+    return hashing_embedding(texts, dim)
+
+  async def test():
+    index = MemoryIndexCache(embed, dim=16, max_rooms=4, max_turns=100, max_bytes=1 << 20)
+    await index.load("r1", [(1, "user", "안녕")])
+    await index.search("r1", "안녕", k=1, max_seq=1)
+  asyncio.run(test())
+  assert threads and loop_thread not in threads
@@ -0,0 +1,109 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+import app.routers.chat as chat_router
+from app.services.persona_cache import PersonaCache, build_persona
+
+
+def make_prompt(char_prompt_id: int = 1):
+  return SimpleNamespace(
+    char_prompt_id=char_prompt_id,
+    character_appearance="긴 머리",
+    character_personality="밝음",
+    character_background="마을 출신",
+    character_speech_style="반말",
+    example_dialogues=['{"user": "안녕", "chatbot": "응 안녕"}', None],
+  )
+
+
+def make_room(char_prompt_id: int = 1, char_idx: int = 7) -> dict:
+  return {"char_prompt_id": char_prompt_id, "char_idx": char_idx, "user_unique_name": "나", "user_introduction": "", "favorability": 30}
+
+
+def test_build_persona_parses_dialogues_and_nicknames():
+  character = SimpleNamespace(char_name="루나", nicknames='{"30": "너", "70": "친구", "100": "단짝"}')
+  persona = build_persona(make_prompt(), character)
+  assert persona["character_name"] == "루나"
+  assert persona["nickname"] == {"30": "너", "70": "친구", "100": "단짝"}
+  assert persona["example_dialogues"] == [{"user": "안녕", "chatbot": "응 안녕"}, {}]
+
+  character.nicknames = None
+  assert build_persona(make_prompt(), character)["nickname"] == {"30": "", "70": "", "100": ""}
+
+
+def test_rooms_share_the_persona_of_their_prompt():
+  cache = PersonaCache(max_size=10, ttl=60)
+  assert cache.get("r1") is None
+  cache.put("r1", make_room(), {"character_name": "루나"})
+  cache.put("r2", make_room(), {"character_name": "루나"})
+  room, persona = cache.get("r1")
+  assert (room["favorability"], persona) == (30, {"character_name": "루나"})
+  assert cache.stats() == {"personas": 1, "rooms": 2, "hits": 1, "misses": 1}
+
+  # 반환한 채팅방 정보를 고쳐도 캐시는 바뀌지 않음, 호감도는 set_favorability로만 갱신
+  room["favorability"] = 99
+  cache.set_favorability("r1", 40)
+  assert cache.get("r1")[0]["favorability"] == 40
+
+
+def test_invalidation_by_room_and_by_character():
+  cache = PersonaCache(max_size=10, ttl=60)
+  cache.put("r1", make_room(1, 7), {})
+  cache.put("r2", make_room(2, 8), {})
+  cache.invalidate_room("r1")
+  assert cache.get("r1") is None and cache.get("r2") is not None
+
+  cache.put("r1", make_room(1, 7), {})
+  cache.invalidate_character(8)
+  assert cache.get("r2") is None and cache.get("r1") is not None
+  assert cache.stats()["personas"] == 1
+
+
+def test_entries_expire_and_are_bounded(monkeypatch):
+  cache = PersonaCache(max_size=2, ttl=5)
+  for index in range(3):
+    cache.put(f"r{index}", make_room(index), {})
+  assert cache.get("r0") is None
+  assert cache.stats()["personas"] == 2
+
+  now = time.monotonic()
+  monkeypatch.setattr(time, "monotonic", lambda: now + 10)
+  assert cache.get("r2") is None
+
+
+class FakeSession:
+  def __init__(self, row):
+    self.row = row
+    self.queries = 0
+
+  async def execute(self, statement):
+    self.queries += 1
+    return SimpleNamespace(first=lambda: self.row)
+
+
+def test_get_room_persona_queries_the_database_once(monkeypatch):
+  monkeypatch.setattr(chat_router, "persona_cache", PersonaCache(max_size=10, ttl=60))
+
+  async def flush_room(room_id):
+    pass
+  monkeypatch.setattr(chat_router.write_behind, "flush_room", flush_room)
+  chat = SimpleNamespace(user_unique_name="나", user_introduction="소개", favorability=50)
+  character = SimpleNamespace(char_idx=7, char_name="루나", nicknames=None)
+  db = FakeSession((chat, make_prompt(3), character))
+
+  async def test():
+    first = await chat_router.get_room_persona(db, "r1")
+    second = await chat_router.get_room_persona(db, "r1")
+    return first, second
+  first, second = asyncio.run(test())
+  assert first == second
+  assert first[0] == {"char_prompt_id": 3, "char_idx": 7, "user_unique_name": "나", "user_introduction": "소개", "favorability": 50}
+  assert db.queries == 1
+
+  with pytest.raises(HTTPException) as error:
+    asyncio.run(chat_router.get_room_persona(FakeSession(None), "missing"))
+  assert error.value.status_code == 404
@@ -0,0 +1,83 @@
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.services.response_cache import ResponseCache, etag_matches
+
+
+def make_client(cache: ResponseCache, data: dict):
+  app = FastAPI()
+  builds = []
+
+  @app.get("/api/characters")
+  def characters(request: Request):
+    def build(headers):
+      builds.append(request.url.query)
+      headers["X-Next-Cursor"] = "next"
+      return data
+    return cache.respond(request, build)
+
+  return TestClient(app), builds
+
+
+def test_matching_if_none_match_returns_304_without_body():
+  cache = ResponseCache(max_bytes=1024 * 1024, ttl=60)
+  client, builds = make_client(cache, {"characters": ["a"]})
+
+  response = client.get("/api/characters")
+  assert response.status_code == 200
+  assert response.json() == {"characters": ["a"]}
+  etag = response.headers["etag"]
+  assert response.headers["x-next-cursor"] == "next"
+
+  response = client.get("/api/characters", headers={"If-None-Match": etag})
+  assert response.status_code == 304
+  assert response.content == b""
+  assert response.headers["etag"] == etag
+  assert response.headers["x-next-cursor"] == "next"
+
+  # 약한 비교 (W/ 접두어, 여러 값)
+  assert client.get("/api/characters", headers={"If-None-Match": f'"other", W/{etag}'}).status_code == 304
+  assert builds == [""]
+  assert (cache.stats()["hits"], cache.stats()["misses"], cache.stats()["not_modified"]) == (2, 1, 2)
+
+
+def test_query_parameters_are_cached_separately():
+  cache = ResponseCache(max_bytes=1024 * 1024, ttl=60)
+  client, builds = make_client(cache, {"characters": []})
+  client.get("/api/characters?limit=10&sort=new")
+  client.get("/api/characters?sort=new&limit=10")
+  client.get("/api/characters?limit=20")
+  assert len(builds) == 2
+
+
+def test_bump_discards_cached_responses():
+  cache = ResponseCache(max_bytes=1024 * 1024, ttl=60)
+  data = {"characters": ["a"]}
+  client, builds = make_client(cache, data)
+  etag = client.get("/api/characters").headers["etag"]
+
+  data["characters"].append("b")
+  cache.bump()
+  response = client.get("/api/characters", headers={"If-None-Match": etag})
+  assert response.status_code == 200
+  assert response.json() == {"characters": ["a", "b"]}
+  assert response.headers["etag"] != etag
+  assert len(builds) == 2
+
+
+def test_entries_over_max_bytes_are_evicted_oldest_first():
+  cache = ResponseCache(max_bytes=60, ttl=60)
+  client, builds = make_client(cache, {"characters": ["x" * 20]})
+  client.get("/api/characters?page=1")
+  client.get("/api/characters?page=2")
+  client.get("/api/characters?page=1")
+  assert cache.stats()["evictions"] >= 1
+  assert cache.stats()["bytes"] <= 60
+  assert len(builds) == 3
+
+
+def test_etag_matches():
+  assert etag_matches("*", '"a"')
+  assert etag_matches('"b", "a"', '"a"')
+  assert not etag_matches(None, '"a"')
+  assert not etag_matches('"b"', '"a"')
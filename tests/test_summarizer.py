@@ -0,0 +1,70 @@
+import asyncio
+
+import app.services.summarizer as summarizer_module
+from app.services.chat_history import estimate_tokens
+from app.services.langchain_balancer import LangChainBalancer
+from app.services.summarizer import ChatSummarizer, local_summary
+
+
+class SlowPool:
+  """
+  응답 없이 시간 초과만 내는 커넥션 풀
+  """
+
+  async def stream(self, payload):
+    raise asyncio.TimeoutError()
+    yield
+
+  async def close(self):
+    pass
+
+  def stats(self):
+    return {}
+
+
+def test_local_summary_keeps_first_sentences_within_budget():
+  summary = local_summary("", [("user", "안녕하세요. 반가워요!"), ("bot", "네 좋아요? 저도요")], max_tokens=500)
+  assert summary == "user: 안녕하세요.\nbot: 네 좋아요?"
+
+  # 예산을 넘으면 오래된 줄부터 버림
+  trimmed = local_summary(summary, [("user", "잘 가요. 또 봐요")], max_tokens=estimate_tokens("bot: 네 좋아요?") + estimate_tokens("user: 잘 가요."))
+  assert trimmed == "bot: 네 좋아요?\nuser: 잘 가요."
+
+
+def test_default_backend_is_local():
+  assert ChatSummarizer().backend == "local"
+
+
+def test_summarize_timeouts_fall_back_to_local_without_ejecting_the_server(monkeypatch):
+  balancer = LangChainBalancer(["ws://a"], eject_failures=2, eject_seconds=60)
+  backend = balancer.backends["ws://a"]
+  backend.pool = SlowPool()
+  monkeypatch.setattr(summarizer_module, "langchain_balancer", balancer)
+  summarizer = ChatSummarizer(backend="langchain", max_tokens=500)
+
+  async def test():
+    for _ in range(3):
+      summary = await summarizer._summarize("r1", "", [("user", "안녕하세요. 반가워요")])
+      assert summary == "user: 안녕하세요."
+  asyncio.run(test())
+
+  assert summarizer.stats()["local_folds"] == 3
+  assert backend.healthy
+  assert (backend.consecutive_failures, backend.ignored_timeouts) == (0, 3)
+
+
+def test_chat_request_timeouts_still_eject_the_server():
+  balancer = LangChainBalancer(["ws://a"], eject_failures=2, eject_seconds=60)
+  backend = balancer.backends["ws://a"]
+  backend.pool = SlowPool()
+
+  async def test():
+    for _ in range(2):
+      try:
+        await backend.request({"room_id": "r1"})
+      except asyncio.TimeoutError:
+        pass
+  asyncio.run(test())
+
+  assert not backend.healthy
+  assert backend.stats()["errors"] == 2
@@ -0,0 +1,100 @@
+import asyncio
+import io
+import os
+
+import pytest
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.testclient import TestClient
+
+from app.services.upload import UploadLimitMiddleware, UploadService
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"p" * 100
+WEBP = b"RIFF\x00\x00\x00\x00WEBP" + b"w" * 100
+
+
+def upload(content: bytes, filename: str = "image.png") -> UploadFile:
+  return UploadFile(file=io.BytesIO(content), filename=filename)
+
+
+def leftovers(directory) -> list:
+  return [name for name in os.listdir(directory) if name.endswith(".part")]
+
+
+def test_save_image_streams_in_chunks_and_names_by_content(tmp_path):
+  service = UploadService(max_bytes=1024, chunk_size=16)
+  path = asyncio.run(service.save_image(upload(PNG), str(tmp_path), content_addressed=True))
+  assert os.path.basename(path).endswith(".png")
+  with open(path, "rb") as f:
+    assert f.read() == PNG
+  assert asyncio.run(service.save_image(upload(PNG), str(tmp_path), content_addressed=True)) == path
+  assert service.stats()["uploads"] == 2 and service.stats()["bytes"] == 2 * len(PNG)
+  assert leftovers(tmp_path) == []
+
+
+def test_save_image_rejects_unknown_signatures_unless_unchecked(tmp_path):
+  service = UploadService(max_bytes=1024, chunk_size=16)
+  with pytest.raises(HTTPException) as error:
+    asyncio.run(service.save_image(upload(b"<svg>" + b"x" * 50, "image.png"), str(tmp_path)))
+  assert error.value.status_code == 415
+  assert service.stats()["rejected_type"] == 1
+  assert os.listdir(tmp_path) == []
+
+  # 프로필처럼 형식을 확인하지 않는 업로드는 요청한 파일명 그대로 저장 (경로는 제거)
+  path = service.save_image_sync(upload(b"plain text"), str(tmp_path), "../../profile.txt", check_type=False)
+  assert path == os.path.join(str(tmp_path), "profile.txt")
+  assert os.path.basename(asyncio.run(service.save_image(upload(WEBP), str(tmp_path)))).endswith(".webp")
+
+
+@pytest.mark.parametrize("sync", [False, True])
+def test_oversized_upload_leaves_no_partial_file(tmp_path, sync):
+  service = UploadService(max_bytes=64, chunk_size=16)
+  with pytest.raises(HTTPException) as error:
+    if sync:
+      service.save_image_sync(upload(PNG), str(tmp_path))
+    else:
+      asyncio.run(service.save_image(upload(PNG), str(tmp_path)))
+  assert error.value.status_code == 413
+  assert service.stats()["rejected_size"] == 1 and service.stats()["failures"] == 0
+  assert os.listdir(tmp_path) == []
+
+
+@pytest.fixture
+def client():
+  app = FastAPI()
+  received = []
+
+  @app.post("/upload")
+  async def upload_endpoint(file: UploadFile = File(...)):
+    received.append(len(await file.read()))
+    return {"size": received[-1]}
+
+  app.add_middleware(UploadLimitMiddleware, max_bytes=512)
+  client = TestClient(app)
+  client.received = received
+  return client
+
+
+def test_middleware_passes_small_multipart_requests(client):
+  response = client.post("/upload", files={"file": ("a.png", PNG, "image/png")})
+  assert response.status_code == 200 and response.json() == {"size": len(PNG)}
+
+
+def test_middleware_rejects_by_content_length_before_reading(client):
+  response = client.post("/upload", files={"file": ("a.png", PNG * 10, "image/png")})
+  assert response.status_code == 413
+  assert client.received == []
+
+
+def test_middleware_stops_chunked_bodies_over_the_limit(client):
+  boundary = "testboundary"
+  body = (
+    f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.png\"\r\nContent-Type: image/png\r\n\r\n".encode()
+    + PNG * 10 + f"\r\n--{boundary}--\r\n".encode()
+  )
+
+  def chunks():
+    for start in range(0, len(body), 64):
+      yield body[start:start + 64]
+  response = client.post("/upload", content=chunks(), headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+  assert response.status_code == 413
+  assert client.received == []
@@ -0,0 +1,144 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("aiosqlite")
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+import app.services.write_behind as write_behind_module
+from app.services.write_behind import WriteBehindBuffer
+
+TABLES = [
+  "CREATE TABLE chat_rooms (chat_id TEXT PRIMARY KEY, favorability INTEGER)",
+  """CREATE TABLE chat_turns (
+    turn_idx INTEGER PRIMARY KEY, chat_id TEXT, session_id TEXT, seq INTEGER, speaker TEXT, content TEXT,
+    search_text TEXT, created_at DATETIME DEFAULT CURRENT_TIMESTAMP, UNIQUE (chat_id, seq)
+  )""",
+]
+
+
+@pytest.fixture
+def session_factory(tmp_path, monkeypatch):
+  engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+
+  async def create():
+    async with engine.begin() as connection:
+      for statement in TABLES:
+        await connection.execute(text(statement))
+      await connection.execute(text("INSERT INTO chat_rooms VALUES ('a', 0), ('b', 0), ('c', 0)"))
+  asyncio.run(create())
+
+  factory = async_sessionmaker(engine, expire_on_commit=False)
+  monkeypatch.setattr(write_behind_module, "AsyncSessionLocal", factory)
+  yield factory
+  asyncio.run(engine.dispose())
+
+
+def turn(room_id: str, seq: int, content: str) -> dict:
+  return {"chat_id": room_id, "seq": seq, "speaker": "user", "content": content, "search_text": content}
+
+
+async def stored(factory, statement: str) -> list:
+  async with factory() as db:
+    return (await db.execute(text(statement))).all()
+
+
+def test_flush_writes_all_rooms_in_one_batch(session_factory, tmp_path):
+  async def test():
+    buffer = WriteBehindBuffer(interval=60, dead_letter_path=str(tmp_path / "dead.jsonl"))
+    await buffer.add("a", [turn("a", 1, "a1"), turn("a", 2, "a2")], 10)
+    await buffer.add("b", [turn("b", 1, "b1")], 20)
+    await buffer.add("a", [turn("a", 3, "a3")], 15)
+    assert buffer.stats()["pending_rows"] == 4
+
+    await buffer.flush()
+    assert await stored(session_factory, "SELECT chat_id, seq, content FROM chat_turns ORDER BY chat_id, seq") == [
+      ("a", 1, "a1"), ("a", 2, "a2"), ("a", 3, "a3"), ("b", 1, "b1"),
+    ]
+    # 호감도는 채팅방별 마지막 값만 저장
+    assert await stored(session_factory, "SELECT chat_id, favorability FROM chat_rooms ORDER BY chat_id") == [
+      ("a", 15), ("b", 20), ("c", 0),
+    ]
+    stats = buffer.stats()
+    assert (stats["pending_rows"], stats["flushed_rows"], stats["flushed_favorability"]) == (0, 4, 2)
+    await buffer.close()
+  asyncio.run(test())
+
+
+def test_conflicting_room_is_renumbered_after_the_stored_turns(session_factory, tmp_path):
+  async def test():
+    async with session_factory() as db:
+      # 다른 워커가 같은 순번을 먼저 저장함
+      await db.execute(text("INSERT INTO chat_turns (chat_id, seq, speaker, content) VALUES ('a', 1, 'user', 'other'), ('a', 2, 'bot', 'other')"))
+      await db.commit()
+
+    buffer = WriteBehindBuffer(interval=60, dead_letter_path=str(tmp_path / "dead.jsonl"))
+    await buffer.add("a", [turn("a", 1, "mine1"), turn("a", 2, "mine2")], 5)
+    await buffer.add("b", [turn("b", 1, "b1")])
+    await buffer.flush()
+
+    assert await stored(session_factory, "SELECT chat_id, seq, content FROM chat_turns ORDER BY chat_id, seq") == [
+      ("a", 1, "other"), ("a", 2, "other"), ("a", 3, "mine1"), ("a", 4, "mine2"), ("b", 1, "b1"),
+    ]
+    stats = buffer.stats()
+    assert (stats["conflicts"], stats["flushed_rows"], stats["pending_rows"]) == (1, 3, 0)
+    await buffer.close()
+  asyncio.run(test())
+
+
+def test_failed_flush_keeps_rows_in_the_buffer(session_factory, tmp_path):
+  async def test():
+    buffer = WriteBehindBuffer(interval=60, dead_letter_path=str(tmp_path / "dead.jsonl"))
+    await buffer.add("a", [turn("a", 1, "a1")], 7)
+
+    original = buffer._write
+    async def unavailable(db, batch):
+      raise ConnectionError("db down")
+    buffer._write = unavailable
+    with pytest.raises(ConnectionError):
+      await buffer.flush()
+    # 실패하는 동안 들어온 대화도 순서대로 유지
+    await buffer.add("a", [turn("a", 2, "a2")])
+    assert buffer.stats()["pending_rows"] == 2
+    assert buffer.stats()["failures"] == 1
+
+    buffer._write = original
+    await buffer.flush()
+    assert await stored(session_factory, "SELECT seq, content FROM chat_turns ORDER BY seq") == [(1, "a1"), (2, "a2")]
+    assert await stored(session_factory, "SELECT favorability FROM chat_rooms WHERE chat_id = 'a'") == [(7,)]
+    await buffer.close()
+  asyncio.run(test())
+
+
+def test_room_that_keeps_conflicting_is_retried_then_dead_lettered(session_factory, tmp_path):
+  async def test():
+    dead_letter_path = tmp_path / "logs" / "dead.jsonl"
+    buffer = WriteBehindBuffer(interval=60, max_retries=2, dead_letter_path=str(dead_letter_path))
+    original = buffer._write
+    async def conflict_on_c(db, batch):
+      if "c" in batch:
+        raise IntegrityError("INSERT", {}, Exception("duplicate key"))
+      await original(db, batch)
+    buffer._write = conflict_on_c
+
+    await buffer.add("c", [turn("c", 1, "c1")], 3)
+    await buffer.add("b", [turn("b", 1, "b1")])
+    await buffer.flush()
+    # 다른 채팅방은 저장되고, 충돌하는 채팅방은 버퍼에 남음
+    assert await stored(session_factory, "SELECT chat_id FROM chat_turns") == [("b",)]
+    assert buffer.stats()["pending_rows"] == 1
+    assert buffer.stats()["retried_rows"] == 1
+
+    await buffer.flush()
+    assert buffer.stats()["pending_rows"] == 0
+    assert buffer.stats()["dead_letter_rows"] == 1
+    records = [json.loads(line) for line in dead_letter_path.read_text(encoding="utf-8").splitlines()]
+    assert [(record["chat_id"], record["favorability"], [row["content"] for row in record["turns"]]) for record in records] == [
+      ("c", 3, ["c1"]),
+    ]
+    await buffer.close()
+  asyncio.run(test())